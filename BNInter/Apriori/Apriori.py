@@ -80,7 +80,7 @@ class Apriori:
         self.__join_itemsets(joinable)
     def prune_candidates(self):
         """remove candidates with infrequent subsets"""
-        for c in self.cand.keys():
+        for c in list(self.cand.keys()):
             for i in range(len(c) - 2):
                 cc = c[0:i]+c[i+1:]
                 if cc not in  self.freq[-1]:
@@ -1,5 +1,6 @@
 from .Apriori import Apriori
 from ..Utils.Counts import compute_counts_dict_cover
+from .Candidates import generate_candidates, array_to_sets
 
 class AprioriDistr(Apriori):
     
@@ -11,7 +12,9 @@ class AprioriDistr(Apriori):
         self.maxK = 3
         self.minsup = 2
         self.debug = 0
-        self.__negativeBorder = {}
+        self.block_size = None # if set, data is counted in blocks of that many rows
+        self.n_jobs = 1 # number of counting processes
+        self.negativeBorder = {}
     def init_cand(self):
         self.cand = {}
         attrs = self.db.get_attr_set()
@@ -34,7 +37,8 @@ class AprioriDistr(Apriori):
     def count_support(self):
         self.db.rewind()
         domsizes = [len(a.domain) for a in self.db.get_attr_set()]
-        counts, N, missing_counts = compute_counts_dict_cover(self.cand.keys(), self.db, len(self.db.get_attr_set()), domsizes)
+        counts, N, missing_counts = compute_counts_dict_cover(self.cand.keys(), self.db, len(self.db.get_attr_set()), domsizes,
+                                                              block_size = self.block_size, n_jobs = self.n_jobs)
         for aset in self.cand:
             self.cand[aset] = counts[aset]
         return N
@@ -47,28 +51,17 @@ class AprioriDistr(Apriori):
             if supp >= self.minsup:
                 self.freq[-1][attrset] = distr
             else:
-                self.__negativeBorder[attrset] = distr
+                self.negativeBorder[attrset] = distr
     def make_candidates(self):
+        """Generate candidates by joining frequent sets of the last
+        level, pruning those with infrequent subsets."""
         self.cand.clear()
-        tmp = list(self.freq[-1].keys())
-        tmp.sort()
-        it = iter(tmp)
-        first = next(it)
-        joinable = [first]
-        for iset in it:
-            if first[0:self.K-1] == iset[0:self.K-1]:
-                joinable.append(iset)
-            else:
-                self.__join_itemsets(joinable)
-                first = iset
-                joinable = [iset]
-        self.__join_itemsets(joinable)
-    def __join_itemsets(self, joinable):
-        for x in range(len(joinable)):
-            left = joinable[x]
-            for right in joinable[x+1:]:
-                attr_set = left + (right[-1],)
-                self.cand[attr_set] = {}
+        C = generate_candidates(self.freq[-1].keys(), self.K)
+        for attr_set in array_to_sets(C):
+            self.cand[attr_set] = {}
+    def prune_candidates(self):
+        """Candidates are pruned by make_candidates."""
+        pass
     def computePositiveBorder(self):
         """Computes the positive border."""
         self.positiveBorder = {}
@@ -76,7 +69,7 @@ class AprioriDistr(Apriori):
         # treating separately is useful when maxK is used
         self.positiveBorder = self.freq[-1].copy()
         # all direct subsets of sets in neg. border are in pos. border
-        for aset in self.__negativeBorder:
+        for aset in self.negativeBorder:
             for i in range(len(aset)):
                 subset = aset[0:i]+aset[i+1:]
                 if subset not in self.positiveBorder:
@@ -0,0 +1,77 @@
+"""Apriori candidate generation on sorted integer arrays.
+
+A collection of k element sets (sorted tuples of attribute numbers)
+is represented as an (n, k) integer array with rows in lexicographic
+order.  Candidates of size k+1 are joins of pairs of rows sharing the
+first k-1 columns, generated group by group with array operations.
+Candidates having a k element subset outside of the collection are
+removed by encoding rows as mixed radix integers and looking the
+subsets up with searchsorted."""
+
+import numpy as np
+
+
+def sets_to_array(sets, k):
+    """Return sets of size k as a sorted (n, k) array without
+    duplicate rows."""
+    array = np.array(list(sets), dtype = np.intp).reshape(-1, k)
+    return np.unique(array, axis = 0)
+
+def array_to_sets(array):
+    """Return rows of array as a list of tuples."""
+    return [tuple(row) for row in array.tolist()]
+
+def encode_rows(array, base):
+    """Encode rows of array as integers in base base.  The order of
+    codes is the lexicographic order of rows."""
+    codes = np.zeros(array.shape[0], dtype = np.int64)
+    for j in range(array.shape[1]):
+        codes *= base
+        codes += array[:, j]
+    return codes
+
+def join_prefixes(F):
+    """Return the sorted array of joins of all pairs of rows of the
+    sorted (n, k) array F with equal first k-1 columns."""
+    n, k = F.shape
+    if n < 2:
+        return np.empty((0, k + 1), dtype = F.dtype)
+    # position of each row within its group of equal prefixes
+    new_group = np.ones(n, dtype = bool)
+    new_group[1:] = np.any(F[1:, :k-1] != F[:-1, :k-1], axis = 1)
+    starts = np.flatnonzero(new_group)
+    sizes = np.diff(np.append(starts, n))
+    group_end = np.repeat(starts + sizes, sizes)
+    # row i is joined with rows i+1, ..., group_end[i]-1
+    partners = group_end - np.arange(n) - 1
+    total = int(partners.sum())
+    left = np.repeat(np.arange(n), partners)
+    first = np.cumsum(partners) - partners
+    right = left + 1 + np.arange(total) - np.repeat(first, partners)
+    return np.column_stack((F[left], F[right, -1]))
+
+def prune_infrequent(C, F):
+    """Remove rows of the (m, k+1) candidate array C having a k
+    element subset which is not a row of the sorted (n, k) array F.
+
+    Subsets without one of the last two elements are the joined rows
+    of F, so only the remaining k-1 subsets are checked."""
+    m, k1 = C.shape
+    if m == 0 or k1 < 3:
+        return C
+    base = int(max(C.max(), F.max())) + 1
+    if float(base) ** (k1 - 1) >= 2.0 ** 63:
+        raise RuntimeError("Candidates: sets too large to encode")
+    keys = encode_rows(F, base)
+    keep = np.ones(m, dtype = bool)
+    for i in range(k1 - 2):
+        sub = encode_rows(np.delete(C, i, axis = 1), base)
+        pos = np.minimum(np.searchsorted(keys, sub), len(keys) - 1)
+        keep &= keys[pos] == sub
+    return C[keep]
+
+def generate_candidates(sets, k):
+    """Return the sorted (m, k+1) array of candidates generated from
+    the collection sets of size k sets."""
+    F = sets_to_array(sets, k)
+    return prune_infrequent(join_prefixes(F), F)
@@ -0,0 +1,91 @@
+from .AprioriDistr import AprioriDistr
+from ..Utils.Counts import code_array, records_to_codes
+
+import numpy as np
+
+
+class EclatDistr(AprioriDistr):
+
+    """Depth first miner of attribute sets with frequent distributions.
+
+    Gives the same results as AprioriDistr (freq, negativeBorder and
+    positiveBorder) but instead of counting each level with a pass
+    over the data, attribute sets are extended one attribute at a
+    time in a depth first search.  Every node keeps its projected
+    database: the rows with no missing values in the attribute set
+    and the cell of each such row, so the distribution of an
+    extension is a single bincount.
+
+    The set enumeration tree is traversed in reverse order (sets are
+    extended with attributes smaller than all their members) which
+    guarantees that all subsets of a set are visited before the set
+    itself, so full Apriori pruning is possible.
+
+    The data is read once into an integer code array."""
+
+    def run(self):
+        attrs = self.db.get_attr_set()
+        self.domsizes = [len(a.domain) for a in attrs]
+        self.db.rewind()
+        data = code_array(self.db)
+        if data is None:
+            data = records_to_codes(self.db, len(attrs))
+        N = data.shape[0]
+        self.data = data
+        self.freq = [{(): {(): N}}]
+        self.negativeBorder = {}
+        self.__frequent = set([()])
+        self.__visit((), None, np.zeros(N, dtype = np.int64), 1, len(attrs))
+        del self.data
+        # trailing levels as Apriori would leave them: an empty last
+        # level means candidates were counted but none was frequent
+        while len(self.freq) > 1 and len(self.freq[-1]) == 0:
+            k = len(self.freq) - 1
+            if any(len(aset) == k for aset in self.negativeBorder):
+                break
+            self.freq.pop()
+        self.K = len(self.freq) - 1
+        self.N = N
+
+    def __visit(self, aset, rows, cells, ncells, minattr):
+        """Count extensions of aset by attributes smaller than minattr
+        and recurse into frequent ones.
+
+        rows - rows with no missing value in aset (None means all)
+        cells - cell numbers of those rows in aset's distribution"""
+        k = len(aset) + 1
+        if k > self.maxK:
+            return
+        while len(self.freq) <= k:
+            self.freq.append({})
+        for a in range(minattr):
+            new_aset = (a,) + aset
+            # Apriori pruning, all subsets have already been visited
+            if any(new_aset[:i] + new_aset[i+1:] not in self.__frequent
+                   for i in range(1, len(new_aset))):
+                continue
+            d = self.domsizes[a]
+            col = self.data[:, a] if rows is None else self.data[rows, a]
+            col = col.astype(np.int64)
+            valid = (col >= 0) & (col < d)
+            if valid.all():
+                new_rows = rows
+                new_cells = col * ncells + cells
+            else:
+                new_rows = np.flatnonzero(valid) if rows is None else rows[valid]
+                new_cells = col[valid] * ncells + cells[valid]
+            counts = np.bincount(new_cells, minlength = d * ncells)
+            shape = [d] + [self.domsizes[b] for b in aset]
+            nz = np.flatnonzero(counts)
+            distr = {tuple(int(v) for v in values): int(cnt)
+                     for values, cnt in zip(zip(*np.unravel_index(nz, shape)), counts[nz])}
+            # use MAX for now, could use entropy etc.
+            supp = counts.max() if len(counts) > 0 else 0
+            if supp >= self.minsup:
+                self.freq[k][new_aset] = distr
+                self.__frequent.add(new_aset)
+                if self.debug > 1:
+                    print(new_aset, distr)
+                self.__visit(new_aset, new_rows, new_cells, d * ncells, a)
+            else:
+                self.negativeBorder[new_aset] = distr
@@ -2,13 +2,17 @@ import numpy as np
 import random
 
 from ..DataAccess import RecordReader
+from ..Utils import ParallelCounts
+from ..Utils.ParallelCounts import get_pool, n_jobs_to_workers
+from ..Utils.ParallelCounts import shared_empty, share_array, open_shared_array
 
 from .BayesNetGraph import topSort
 
 
-def randUnivDiscr(distr):
-    """Generate a discrete random value from a given distrtibution."""
-    x = random.random()
+def randUnivDiscr(distr, rng = None):
+    """Generate a discrete random value from a given distrtibution.
+    rng is a numpy Generator, the random module is used if None."""
+    x = random.random() if rng is None else rng.random()
     i = 0
     pdf = distr[0]
     while x > pdf and i + 1 < len(distr):
@@ -16,22 +20,120 @@ def randUnivDiscr(distr):
         pdf += distr[i]
     return i
 
+# nodes with larger domains are sampled with searchsorted
+max_compare_values = 16
+
+class SamplerPlan(object):
+    """Forward sampling plan compiled from the distributions of a
+    network.
+
+    For every node not in a joint distribution the conditional
+    distributions are stored as cumulative probabilities with rows
+    indexed by r, the mixed radix number formed by values of parents.
+    A value of a node with a small domain is the number of cumulative
+    probabilities in row r not exceeding a uniform u, obtained by
+    comparing u with each column.  For larger domains the rows are
+    shifted by r and flattened, and the value is found by a single
+    searchsorted of r + u over the whole array.
+
+    The plan does not refer to the network, so it can be sent to
+    worker processes."""
+    def __init__(self, bn, toponodes):
+        self.distrs = [node.distr for node in bn] # to detect relearned distributions
+        self.parents = [tuple(node.parents) for node in bn]
+        self.joints = [(list(jn.nodes), jn.distr) for jn in bn.joint_distrs]
+        self.nnodes = len(bn)
+        self.steps = []
+        for i in toponodes:
+            node = bn[i]
+            if node.in_joint:
+                continue
+            k = node.distr.shape[-1]
+            cum = np.cumsum(np.asarray(node.distr, dtype = float).reshape(-1, k), axis = 1)
+            cum[:, -1] = 1.0
+            nrows = cum.shape[0]
+            if k <= max_compare_values:
+                table = np.ascontiguousarray(cum[:, :-1].T)
+            else:
+                table = (cum + np.arange(nrows)[:, None]).ravel()
+            strides = []
+            stride = 1
+            for p in reversed(node.parents):
+                strides.append(stride)
+                stride *= len(bn[p].domain)
+            strides.reverse()
+            self.steps.append((i, list(node.parents), strides, table, k))
+        maxdom = max([len(node.domain) for node in bn] + [1])
+        self.dtype = np.uint8 if maxdom <= 256 else np.uint16
+
+    def is_current(self, bn):
+        return all(node.distr is d and tuple(node.parents) == p
+                   for node, d, p in zip(bn, self.distrs, self.parents)) \
+            and len(bn.joint_distrs) == len(self.joints) \
+            and all(jn.distr is d for jn, (nodes, d) in zip(bn.joint_distrs, self.joints))
+
+    def __getstate__(self):
+        # distributions are only needed by is_current, don't send them
+        # to workers
+        state = dict(self.__dict__)
+        del state["distrs"]
+        return state
+
+    def sample(self, n, rng, out = None):
+        """Draw n samples using numpy Generator rng, see
+        BayesSampler.draw_n_samples."""
+        if out is None:
+            out = np.empty((n, self.nnodes), dtype = self.dtype, order = "F")
+        # sample nodes in joint distrtibutions
+        for nodes, distr in self.joints:
+            s = distr.sample(n, rng)
+            for i, node in enumerate(nodes):
+                out[:, node] = s[:, i]
+        u = np.empty(n)
+        row = np.empty(n, dtype = np.intp)
+        tmp = np.empty(n, dtype = np.intp)
+        for i, parents, strides, table, k in self.steps:
+            rng.random(out = u)
+            row[:] = 0
+            for p, stride in zip(parents, strides):
+                # mixed radix index of the row of parent values
+                np.multiply(out[:, p], stride, out = tmp, casting = "unsafe")
+                row += tmp
+            if k <= max_compare_values:
+                x = out[:, i]
+                x[:] = 0
+                for column in table:
+                    x += np.take(column, row) <= u
+            else:
+                # position of r + u among cumulative probabilities of row r
+                u += row
+                x = np.searchsorted(table, u, side = "right")
+                x -= row * k
+                np.minimum(x, k - 1, out = x)
+                out[:, i] = x
+        return out
+
+
 class BayesSampler(RecordReader):
-    def __init__(self, bn):
+    def __init__(self, bn, seed = None):
+        """Sampler from Bayesian network bn.  seed initializes the
+        random generator used by next and draw_n_samples, it can be
+        anything accepted by np.random.default_rng (including a
+        Generator, which is then used directly)."""
         super(BayesSampler, self).__init__(bn)
         self.bn = bn
-        self.toponodes = topSort(bn)
         #self.topomap = [bn.attrnames.index(n) for n in self.toponodes] # map topsort order back to original order
         self.values = [None] * len(bn)
-        self.n_in_joint = sum(len(jn.nodes) for jn in self.bn.joint_distrs)
+        self.rng = np.random.default_rng(seed)
+        self.plan = None
 
     def next(self):
+        self.get_plan()
         # sample nodes in joint distrtibutions
-        j = 0
         for jn in self.bn.joint_distrs:
-            s = jn.distr.sample(1)[0]
-            for i in range(len(jn.nodes)):
-                self.values[self.toponodes[j+i]] = int(s[i])
+            s = jn.distr.sample(1, self.rng)[0]
+            for i, node in enumerate(jn.nodes):
+                self.values[node] = int(s[i])
         # sample remaining nodes
         for i in self.toponodes[self.n_in_joint:]:
             node = self.bn[i]
@@ -40,36 +142,88 @@ class BayesSampler(RecordReader):
             else:
                 x = [self.values[p] for p in node.parents]
                 distr = node.distr[tuple(x)]
-            self.values[i] = randUnivDiscr(distr)
+            self.values[i] = randUnivDiscr(distr, self.rng)
         return list(self.values)
-        
+
+    def get_plan(self):
+        """Sampling plan, recompiled if distributions or parents were
+        replaced (e.g. relearned) since it was built.  The topological
+        order used by next is recomputed as well."""
+        if self.plan is None or not self.plan.is_current(self.bn):
+            self.toponodes = topSort(self.bn)
+            self.n_in_joint = sum(len(jn.nodes) for jn in self.bn.joint_distrs)
+            self.plan = SamplerPlan(self.bn, self.toponodes)
+        return self.plan
+
+    def draw_n_samples(self, n, out = None):
+        """Draw n samples from the network.
+
+        Returns a Fortran ordered (n, number of nodes) array of
+        uint8 (uint16 for domains over 256 values).  If out is given,
+        samples are written into it instead."""
+        return self.get_plan().sample(n, self.rng, out)
+
+
+def _sample_blocks(plan, spec, blocks):
+    """Worker: draw blocks given as (start, stop, seed) into rows
+    start:stop of the shared array."""
+    out = open_shared_array(spec, "r+")
+    for start, stop, seed in blocks:
+        plan.sample(stop - start, np.random.default_rng(seed), out[start:stop])
+    out.flush()
+
+class ParallelSampler(object):
+    """Sampler drawing large numbers of samples from a Bayesian
+    network in worker processes.
+
+    Samples are drawn in blocks of block_size rows, each block with
+    its own random stream spawned from a np.random.SeedSequence.  The
+    samples therefore depend only on the seed and on the sizes of
+    successive draws, not on the number of workers.  Workers write
+    their blocks into a shared memory array which is returned without
+    copying and can be passed directly to the counting functions in
+    Utils.Counts (also when they count in parallel)."""
+    def __init__(self, bn, seed = None, n_jobs = 1, block_size = 65536):
+        """seed - seed of the SeedSequence or a SeedSequence (random
+        if None)
+        n_jobs - number of worker processes (all CPUs if < 1)"""
+        self.sampler = BayesSampler(bn)
+        if not isinstance(seed, np.random.SeedSequence):
+            seed = np.random.SeedSequence(seed)
+        self.seed_seq = seed
+        self.n_jobs = n_jobs
+        self.block_size = block_size
+
     def draw_n_samples(self, n):
-        rng = np.random.default_rng()
-        sampled_vars = [None] * len(self.bn)
-        # sample nodes in joint distrtibutions
-        j = 0
-        for jn in self.bn.joint_distrs:
-            s = jn.distr.sample(n)
-            for i in range(len(jn.nodes)):
-                sampled_vars[self.toponodes[j+i]] = s[:,i]
-        for i in self.toponodes[self.n_in_joint:]:
-            node = self.bn[i]
-            if len(node.parents) == 0:
-                distr = node.distr
-                x = rng.choice(len(distr), n, p=node.distr)
-            else:
-                # cumulative distr, skip the last value: it will
-                # always be assigned max cetegory
-                cdistr = node.distr.cumsum(axis=-1)[...,:-1]
-                distr = cdistr[*[sampled_vars[p] for p in node.parents]]
-                u = rng.random(n)
-                x = distr.shape[1] - (u[:,None] <= distr).sum(axis=1)
-
-                # slow attempt 1
-                #x1 = np.array(list(map(lambda a, y: np.searchsorted(a, y, side="right"), distr, u)))
-                # slow attempt 2
-                #distr = np.column_stack([u, distr])
-                #x = np.apply_along_axis(lambda a: np.searchsorted(a[1:], a[0], side="right"), 1, distr)
-            sampled_vars[i] = x
-        sampled_vars = np.column_stack(sampled_vars)
-        return sampled_vars
+        """Draw n samples from the network.
+
+        Returns a Fortran ordered (n, number of nodes) array as
+        BayesSampler.draw_n_samples, in shared memory if workers were
+        used."""
+        plan = self.sampler.get_plan()
+        bounds = list(range(0, n, self.block_size)) + [n]
+        seeds = self.seed_seq.spawn(len(bounds) - 1)
+        blocks = [(bounds[i], bounds[i + 1], seed) for i, seed in enumerate(seeds)]
+        n_workers = min(n_jobs_to_workers(self.n_jobs), len(blocks),
+                        n // ParallelCounts.min_rows_per_job)
+        if n_workers <= 1:
+            out = np.empty((n, plan.nnodes), dtype = plan.dtype, order = "F")
+            for start, stop, seed in blocks:
+                plan.sample(stop - start, np.random.default_rng(seed), out[start:stop])
+            return out
+        out = shared_empty((n, plan.nnodes), plan.dtype)
+        spec = share_array(out)
+        pool = get_pool(n_workers)
+        futures = [pool.submit(_sample_blocks, plan, spec, blocks[w::n_workers])
+                   for w in range(n_workers)]
+        for f in futures:
+            f.result()
+        return out
+
+    def iter_samples(self, n, chunk_size = 1048576):
+        """Draw n samples yielding them in chunks of about chunk_size
+        rows.  Chunks are whole blocks, so together they are equal to
+        draw_n_samples(n)."""
+        chunk_size = max(1, chunk_size // self.block_size) * self.block_size
+        for start in range(0, n, chunk_size):
+            yield self.draw_n_samples(min(chunk_size, n - start))
@@ -24,6 +24,26 @@ def ancestors(bn, nodes):
         seed = parents
     return anc - set(nodes)
 
+def descendants(bn, nodes):
+    """Returns a set of descendants of nodes (numbers or names),
+    not including the nodes themselves."""
+    if len(nodes) > 0 and isinstance(nodes[0], str):
+        nodes = bn.names_to_numbers(nodes)
+    children = [[] for i in range(len(bn))]
+    for i, node in enumerate(bn):
+        for p in node.parents:
+            children[p].append(i)
+    desc = set()
+    seed = set(nodes)
+    while len(seed) > 0:
+        new = set()
+        for i in seed:
+            new |= set(children[i])
+        new = new - desc
+        desc |= new
+        seed = new
+    return desc - set(nodes)
+
 def topSort(bn):
     """Returns names of nodes of bn in topological sort order.
 
@@ -8,44 +8,97 @@ from functools import reduce
 
 from ..Utils import compute_counts_array
 from ..Utils import compute_counts_dict
+from ..Utils.Counts import marginalize_numpy
 
 from ..DataAccess import Attr
 from .BayesNet import BayesNet
 from .BNutils import blockiter, distr_2_str
 
 
-def learnProbabilitiesFromData(bn, dataset, priorN = 1):
-    asets = [n.parents + [i] for (i,n) in enumerate(bn) if not n.in_joint]
-    counts, N, missing_counts = compute_counts_array(asets, bn.get_shape(), dataset)
+class FamilyCounts(object):
+    """Cache of contingency tables of attribute sets counted in one
+    dataset (sufficient statistics for learning distributions).
+
+    A table is obtained by marginalizing a cached superset table when
+    there is one with no missing values in the superset, otherwise
+    tables of all requested sets are counted in a single pass."""
+    def __init__(self):
+        self.tables = {} # frozenset(attrs) -> (attrs, counts, missing count)
+
+    def find_superset(self, aset):
+        """Smallest cached table over a superset of aset without
+        missing values, or None."""
+        best = None
+        key = frozenset(aset)
+        for attrs, table, missing in self.tables.values():
+            if missing == 0 and key <= frozenset(attrs):
+                if best is None or table.size < best[1].size:
+                    best = (attrs, table)
+        return best
+
+    def get_counts(self, asets, domainsizes, dataset):
+        """Return a dictionary of contingency tables (axes in the order
+        of attributes in each set) of attribute sets in asets."""
+        asets = [tuple(aset) for aset in asets]
+        to_count = [aset for aset in asets
+                    if frozenset(aset) not in self.tables and self.find_superset(aset) is None]
+        if len(to_count) > 0:
+            if hasattr(dataset, "rewind"): # allow lists as datasets
+                dataset.rewind()
+            counts, N, missing_counts = compute_counts_array(to_count, domainsizes, dataset)
+            for aset in to_count:
+                self.tables[frozenset(aset)] = (aset, counts[aset], missing_counts[aset])
+        result = {}
+        for aset in asets:
+            if frozenset(aset) in self.tables:
+                attrs, table, missing = self.tables[frozenset(aset)]
+            else:
+                attrs, table = self.find_superset(aset)
+            table = marginalize_numpy(table, attrs, aset)
+            kept = [a for a in attrs if a in aset]
+            result[aset] = np.transpose(table, [kept.index(a) for a in aset])
+        return result
+
+def normalize_counts(counts, priorN = 1):
+    """Conditional distribution of the last axis of counts given the
+    other axes, smoothed with a uniform prior of weight priorN.
+    Distributions with no data and no prior are uniform."""
+    counts = np.asarray(counts, dtype = float)
+    ri = counts.shape[-1]
+    total = counts.sum(axis = -1, keepdims = True)
+    num = counts + float(priorN) / ri
+    den = np.broadcast_to(total + priorN, counts.shape)
+    return np.divide(num, den, out = np.full(counts.shape, 1.0 / ri), where = den > 0)
+
+def learnProbabilitiesFromData(bn, dataset, priorN = 1, changed = None, stats_cache = None):
+    """Learn conditional distributions of bn from dataset.
+
+    If changed is given, only distributions of nodes in changed (and
+    of joint distributions containing them) are learned, other nodes
+    keep their distributions.  stats_cache is a FamilyCounts object
+    for dataset keeping counted tables between calls."""
+    if changed is not None:
+        changed = set(changed)
+    if stats_cache is None:
+        stats_cache = FamilyCounts()
+    learned = [j for (j,n) in enumerate(bn) if not n.in_joint and (changed is None or j in changed)]
+    asets = [bn[j].parents + [j] for j in learned]
+    if len(asets) > 0:
+        counts = stats_cache.get_counts(asets, bn.get_shape(), dataset)
     # single nodes
-    for j, n in enumerate(bn):
-        if n.in_joint:
-            continue
+    for j in learned:
+        n = bn[j]
         c = counts[tuple(n.parents + [j])]
-        ri = len(n.domain)
-        rdistr = np.ravel(n.distr)
-        rcount = np.ravel(c)
-        i = 0
-        while i < len(rdistr):
-            sum = 0
-            for j in range(ri):
-                sum += rcount[i + j]
-            if sum > 0 or priorN > 0:
-                for j in range(ri):
-                    rdistr[i + j] = (priorN / ri + rcount[i + j]) / (priorN + sum)
-            else:
-                #print "Warning: no data about distribution, node ", n.attrname
-                for j in range(ri):
-                    rdistr[i + j] = 1.0 / ri
-            i += ri
-        rdistr.shape = n.distr.shape
-        n.distr = rdistr
+        n.distr = normalize_counts(c, priorN).reshape(n.distr.shape)
     # joint distribution nodes
-    asets = [jn.nodes for jn in bn.joint_distrs]
+    joints = [jn for jn in bn.joint_distrs if changed is None or changed & set(jn.nodes)]
+    if len(joints) == 0:
+        return
+    asets = [jn.nodes for jn in joints]
     if hasattr(dataset, "rewind"): # allow lists as datasets
         dataset.rewind()
     counts, N, missing_counts = compute_counts_dict(asets, dataset)
-    for jn in bn.joint_distrs:
+    for jn in joints:
         c = counts[tuple(jn.nodes)]
         n = N - missing_counts[tuple(jn.nodes)]
         alpha = jn.distr.size * priorN / (n + jn.distr.size * priorN)
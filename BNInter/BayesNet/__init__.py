@@ -1,9 +1,9 @@
 from .BNutils import distr_2_str
 from .BayesNet import BayesNode, BayesNet
 from .BayesHuginFile import read_Hugin_file, write_Hugin_file
-from .BayesNetApprox import BayesSampler
-from .BayesNetGraph import ancestors, topSort
+from .BayesNetApprox import BayesSampler, ParallelSampler
+from .BayesNetGraph import ancestors, descendants, topSort
 
 __all__ = (distr_2_str, BayesNode, BayesNet,
-           read_Hugin_file, write_Hugin_file, BayesSampler,
-           ancestors, topSort)
+           read_Hugin_file, write_Hugin_file, BayesSampler, ParallelSampler,
+           ancestors, descendants, topSort)
@@ -12,7 +12,7 @@ sys.path.append("..")
 from DataAccess import create_arff_reader
 from BayesNet import BayesNet, read_Hugin_file, write_Hugin_file
 import BayesNet.BayesNetLearn
-from ExactInterestingness import BN_interestingness_exact
+from ExactInterestingness import BN_interestingness_exact, BN_interestingness_incremental
 
 
 
@@ -123,20 +123,19 @@ def buildNetworkInteractively(bn, data_scanner):
     must_contain_attr = None # attribute that displayed attrsets must contain
     nattrsets = 10
     maxlen = 1000
+    # keeps data side results and unaffected marginals between edits
+    bn_interestingness = BN_interestingness_incremental(bn, ds, priorN = 0)
     while not quit:
-        bn.validate()
-        ds.rewind()
-        BayesNet.BayesNetLearn.learnProbabilitiesFromData(bn, ds, priorN = 0)
-        print("Interestingness with respect to")
-        print(bn)
-        print(BayesNet.BayesNetLearn.lnP_dataset_cond_network_structure(bn, data))
         t1 = time.clock()
-        bn_interestingness = BN_interestingness_exact(bn, ds)
         attr_sets_w_inter = bn_interestingness.run(minsup = minsup, maxK = maxK, apriori_debug = debug)
         #bn_interestingness = BN_interestingness_sample(bn, ds)
         #attr_sets_w_inter = bn_interestingness.run(maxK = maxK)
         t2 = time.clock()
         print("Inter time=" + str(t2-t1))
+        bn.validate()
+        print("Interestingness with respect to")
+        print(bn)
+        print(BayesNet.BayesNetLearn.lnP_dataset_cond_network_structure(bn, data))
 
 
         #attr_sets_w_inter = topoPrune(bn, attr_sets_w_inter, 0.01)
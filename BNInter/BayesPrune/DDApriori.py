@@ -9,15 +9,13 @@ class DDApriori(AprioriDistr):
         self.maxK = 10
         self.minsup = 0.1
         self.debug = 0
-        self.__negativeBorder = {}
+        self.negativeBorder = {}
     def init_cand(self):
         self.cand = {}
-        for i in range(self.discr_distr.sop.n):
+        for i in range(self.discr_distr.n):
             self.cand[(i,)] = None
     def count_support(self):
-        self.discr_distr.get_positive_border_marginals(self.cand.keys())
-        for attrset in self.cand:
-            self.cand[attrset] = self.discr_distr.get_marginal(attrset)
+        self.cand.update(self.discr_distr.get_marginals(self.cand.keys()))
         return 1.0
     def find_frequent(self):
         self.freq.append({})
@@ -27,5 +25,5 @@ class DDApriori(AprioriDistr):
             if supp >= self.minsup:
                 self.freq[-1][attrset] = distr
             else:
-                self.__negativeBorder[attrset] = distr
+                self.negativeBorder[attrset] = distr
 
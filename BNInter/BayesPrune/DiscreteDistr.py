@@ -4,8 +4,14 @@ import random
 
 import numpy as np
 
-from ..Utils.SEtree import SEtree
+from ..Utils.ArrayCache import ArrayCache
+from ..Utils.AttrSetCover import AttrSetCover
 from ..Utils.Counts import marginalize_numpy
+from ..sop import array_sop
+from ..sop.ordering import greedy_elimination_order, min_fill_score
+
+# default memory budget for cached marginals in bytes
+max_cache_size = 500000000
 
 class DiscreteDistrSOP:
     """A multivariate discrete distribution represented as a sum of
@@ -13,12 +19,22 @@ class DiscreteDistrSOP:
 
     Supports fast generation of marginal distributions, through bucket
     elimination (through sop.py), marginalization, caching."""
-    
-    def __init__(self, sop):
-        """Initialize the distribution from a SOP."""
+
+    prohibitive_cost = 1e18 # query cost of supersets which are too large
+
+    def __init__(self, sop, cache_size = max_cache_size, seed = None):
+        """Initialize the distribution from a SOP.  Marginals are
+        cached in an ArrayCache of cache_size bytes.  seed is the
+        default seed of get_marginals."""
         self.sop = sop
-        self.cache = {} # cache for marginals
+        self.seed = seed
+        self.n = sop.n # number of variables
+        self.cache = ArrayCache(cache_size) # cache for marginals
+        self.store = None # persistent MarginalStore, None if not used
         self.cost_cache = {} # cache for costs of computing marginals
+        self.ordering = None # variable elimination heuristic, see sop.array_sop.prepare
+        self.max_superset_size = 10 # largest superset whose marginal is computed
+        self.max_mem_cost = 50000000 # memory limit for computing a superset
 
 
     def marginalize_subsets(self, vars, distr):
@@ -28,122 +44,342 @@ class DiscreteDistrSOP:
             subset = vars[0:i] + vars[i+1:]
             if subset not in self.cache:
                 subdistr = np.array(np.sum(distr, i))
-                self.cache[subset] = subdistr
+                self.cache.put(subset, subdistr, distr.size)
         
 
     def get_marginal(self, vars):
         """Gets a marginal distribution over given variables."""
         vars = tuple(vars)
-        if vars not in self.cache:
-            self.sop.prepare(list(vars))
+        distr = self.cache.get(vars)
+        if distr is None:
+            distr = self.load_stored(vars)
+        if distr is None:
+            self.sop.prepare(list(vars), self.ordering)
+            cost = sum(self.sop.cost())
             distr = self.sop.compute()
-            self.cache[vars] = distr
-        else:
-            distr = self.cache[vars]
+            self.cache.put(vars, distr, cost)
+        if self.store is not None:
+            self.store.save(vars, distr)
         self.marginalize_subsets(vars, distr)
         # marginalize + insert subsets
         return distr
 
-    def benefit(self, superset, setree):
-        if tuple(superset) not in self.cost_cache:
-            self.sop.prepare(superset)
-            mem_cost = self.sop.mem_cost()
-            res_size = self.sop.result_size()
-            cost = self.sop.cost()
-            self.cost_cache[tuple(superset)] = (cost, mem_cost, res_size)
-        else:
-            cost, mem_cost, res_size = self.cost_cache[tuple(superset)]
-        # dont do too large attribute sets
-        if mem_cost > 450000000: #0.5GB - skip completely
-            return -1000
-        if mem_cost > 50000000: # limit - don't create larger supersets
-            return -10
-        superset_res_size = res_size
-        benefit  = -cost[0] - cost[1]
-        hasSubsets = False
-        for vars in setree.iter_included(tuple(superset)):
-            hasSubsets = True
-            # TODO: make BE cost cache aware
-            if vars not in self.cost_cache:
-                self.sop.prepare(vars)
-                cost = self.sop.cost()
-                mem_cost = self.sop.mem_cost()
-                res_size = self.sop.result_size()
-                self.cost_cache[vars] = (cost, mem_cost, res_size)
+    def load_stored(self, vars):
+        """Move the marginal over vars from the persistent store into
+        the cache.  Returns None if it is not stored."""
+        if self.store is None:
+            return None
+        distr = self.store.load(vars)
+        if distr is not None:
+            self.cache.put(vars, distr, distr.size)
+        return distr
+
+    def sop_cost(self, vars):
+        """Cost (adds, muls), memory cost and result size of computing
+        the marginal over vars by the sop."""
+        vars = tuple(vars)
+        if vars not in self.cost_cache:
+            self.sop.prepare(list(vars), self.ordering)
+            self.cost_cache[vars] = (self.sop.cost(), self.sop.mem_cost(), self.sop.result_size())
+        return self.cost_cache[vars]
+
+    def query_cost(self, vars):
+        """Cost of computing the marginal over vars, used by
+        AttrSetCover.  Marginals needing over max_mem_cost bytes are
+        given a prohibitive cost so they are not used as supersets."""
+        if len(vars) > self.max_superset_size:
+            return self.prohibitive_cost
+        cost, mem_cost, res_size = self.sop_cost(vars)
+        if mem_cost > self.max_mem_cost:
+            return self.prohibitive_cost
+        return cost[0] + cost[1]
+
+    def marginalization_cost(self, superset, vars):
+        """Cost of summing the marginal over superset onto vars."""
+        size = 1
+        for v in superset:
+            size *= self.sop.dim[v]
+        return size
+
+    def marginalize_cover(self, superset, covered_sets):
+        """Compute the marginal over superset and insert marginals
+        over covered_sets (all sorted) into the cache.  Larger sets
+        are done first so that each set is summed from a computed set
+        with one more variable when there is one."""
+        superdistr = self.cache.get(superset)
+        if superdistr is None:
+            self.sop.prepare(list(superset), self.ordering)
+            cost = sum(self.sop.cost())
+            superdistr = self.sop.compute()
+            self.cache.put(superset, superdistr, cost)
+        computed = {frozenset(superset): (superset, superdistr)}
+        for vars in sorted(covered_sets, key = len, reverse = True):
+            vars = tuple(vars)
+            key = frozenset(vars)
+            distr = self.cache.get(vars)
+            if distr is None:
+                src_vars, src_distr = superset, superdistr
+                for v in superset:
+                    if v not in key and key | set([v]) in computed:
+                        src_vars, src_distr = computed[key | set([v])]
+                        break
+                distr = marginalize_numpy(src_distr, src_vars, vars)
+                self.cache.put(vars, distr, src_distr.size)
+                if self.store is not None:
+                    self.store.save(vars, distr)
+            computed[key] = (vars, distr)
+
+    def get_marginals(self, varsets, seed = None):
+        """Compute marginals over all variable sets in varsets.
+
+        The whole batch is planned up front: a family of supersets
+        covering all sets not yet in the cache is chosen with
+        AttrSetCover using sop costs, the marginal of each superset is
+        computed once and the covered marginals are obtained by
+        marginalization.  Candidate variables for extending supersets
+        are tried in sorted order, or shuffled by a random generator
+        seeded with seed (self.seed if not given).
+
+        Returns a dictionary mapping sets in varsets to marginals."""
+        if seed is None:
+            seed = self.seed
+        varsets = [tuple(vars) for vars in varsets]
+        todo = sorted(set(tuple(sorted(vars)) for vars in varsets if vars not in self.cache))
+        todo = [vars for vars in todo if vars not in self.cache and self.load_stored(vars) is None]
+        if len(todo) > 0:
+            U = sorted(set(v for vars in todo for v in vars))
+            if seed is not None:
+                random.Random(seed).shuffle(U)
+            cover, covered, covers, gain = AttrSetCover(U, todo, self.query_cost,
+                                                        self.marginalization_cost)
+            for superset, covered_sets in covers.items():
+                superset = tuple(superset)
+                if len(superset) > self.max_superset_size or \
+                   self.sop_cost(superset)[1] > self.max_mem_cost:
+                    # AttrSetCover may grow a cover past the limits
+                    for vars in covered_sets:
+                        self.get_marginal(vars)
+                else:
+                    self.marginalize_cover(superset, covered_sets)
+        marginals = {}
+        for vars in varsets:
+            key = tuple(sorted(vars))
+            if vars == key or vars in self.cache:
+                marginals[vars] = self.get_marginal(vars)
             else:
-                cost, mem_cost, res_size = self.cost_cache[vars]
-            benefit = benefit + cost[0] + cost[1]
-            benefit -= (superset_res_size / res_size - 1) * res_size
-        # if just the set itself is computed, benefit is 0
-        # this is a hack to compensate for small negative return values
-        if not hasSubsets:
-            benefit = 0
-        return benefit
-
-    def find_best_superset(self, vars, setree):
-        #find most desirable superset
-        bestsuperset = list(vars)
-        bestbenefit = self.benefit(vars, setree)
-        nextiter = True
-        superset = bestsuperset
-        while nextiter and len(superset) < min(self.sop.n, 10): # TODO: remove fixed limit
-            nextiter = False
-            superset = bestsuperset
-            #various strategies for adding attrs:
-            #1. try all attrs
-            #s = xrange(self.sop.n)
-            #2. try a few random ones
-            s = list(range(self.sop.n))
-            random.shuffle(s)
-            s = s[0:10]
-            for v in s:
-                if v in superset:
-                    continue
-                tmp = superset + [v]
-                tmp.sort()
-                benefit = self.benefit(tmp, setree)
-                #print superset, tmp, benefit
-                if benefit > bestbenefit:
-                    bestbenefit = benefit
-                    bestsuperset = tmp
-                    nextiter = True
-        print(bestsuperset, bestbenefit, vars)
-        if bestbenefit <= -1000:
-            print(list(vars), " out of memory")
-        return bestsuperset, bestbenefit
+                # unsorted set, transpose the marginal of the sorted one
+                distr = np.transpose(self.get_marginal(key), [key.index(v) for v in vars])
+                self.cache.put(vars, distr, distr.size)
+                marginals[vars] = distr
+        return marginals
 
     def get_positive_border_marginals(self, border):
         """Gets a marginal for each variable set in a positive border
         of a family of attribute sets generated by Apriori."""
+        self.get_marginals(border)
 
 
-        border2 = [x for x in border if x not in self.cache]
-        print( (len(border) - len(border2)), "sets skipped: already in cache")
-        border = border2
-        
-        ntogo = len(border)
-        ntotal = ntogo
-        setree = SEtree()
-        for vars in border:
-            setree[vars] = None
-            
-        for vars in border:
-            if vars in self.cache:
-                continue
-            bestsuperset, bestbenefit = self.find_best_superset(vars, setree)
-
-            #marginalize marginals included in bestsuperset
-            if bestbenefit > -1000:
-                self.sop.prepare(bestsuperset)
-                superdistr = self.sop.compute()
-            vars_to_remove = []
-            for vars in setree.iter_included(bestsuperset):
-                if bestbenefit > -1000:
-                    distr = marginalize_numpy(superdistr, bestsuperset, vars)
-                    self.cache[vars] = distr
-                vars_to_remove.append(vars)
-            for vars in vars_to_remove:
-                del setree[vars]
-            ntogo -= len(vars_to_remove)
-            print(ntogo, " variable sets to go out of", ntotal)
 
+class DiscreteDistrJT:
+    """A multivariate discrete distribution represented by a calibrated
+    junction tree.
+
+    The tree is built once from the factors (moralization,
+    triangulation by min-fill elimination, maximum spanning tree of
+    cliques) and calibrated with Hugin message passing.  Marginals of
+    variables contained in a clique are then obtained by summing the
+    clique's potential.  Other marginals are computed by variable
+    elimination over the smallest subtree connecting cliques which
+    contain the variables."""
+
+    def __init__(self, factors, n, cache_size = max_cache_size):
+        """factors - list of (variables, array) pairs whose product is
+        the distribution
+        n - number of variables
+        cache_size - memory budget for cached marginals"""
+        self.n = n
+        self.cache = ArrayCache(cache_size) # cache for marginals
+        self.store = None # persistent MarginalStore, None if not used
+        self.dim = [1] * n
+        factors = [(list(vars), np.asarray(a, dtype = float)) for vars, a in factors]
+        for vars, a in factors:
+            for v, d in zip(vars, a.shape):
+                self.dim[v] = d
+        self.build_tree(factors)
+        self.calibrate()
+
+    def build_tree(self, factors):
+        scopes = [vars for vars, a in factors] + [[v] for v in range(self.n)]
+        cliques = []
+        greedy_elimination_order(scopes, range(self.n), self.dim, min_fill_score,
+                                 cliques = cliques)
+        maximal = []
+        for c in sorted(set(cliques), key = len, reverse = True):
+            if not any(set(c) <= set(m) for m in maximal):
+                maximal.append(c)
+        self.cliques = maximal
+        nc = len(self.cliques)
+        # maximum spanning tree over separator sizes (Kruskal)
+        edges = [(len(set(self.cliques[i]) & set(self.cliques[j])), i, j)
+                 for i in range(nc) for j in range(i + 1, nc)]
+        edges.sort(key = lambda e: -e[0])
+        component = list(range(nc))
+        def find(i):
+            while component[i] != i:
+                component[i] = component[component[i]]
+                i = component[i]
+            return i
+        self.neighbors = [[] for i in range(nc)]
+        for w, i, j in edges:
+            ri, rj = find(i), find(j)
+            if ri != rj:
+                component[ri] = rj
+                self.neighbors[i].append(j)
+                self.neighbors[j].append(i)
+        # root the tree at clique 0
+        self.parent = [None] * nc
+        self.order = [0] # preorder
+        for i in self.order:
+            for j in self.neighbors[i]:
+                if j != self.parent[i]:
+                    self.parent[j] = i
+                    self.order.append(j)
+        self.separators = [None] * nc # separator with the parent
+        for i in self.order[1:]:
+            self.separators[i] = tuple(sorted(set(self.cliques[i]) & set(self.cliques[self.parent[i]])))
+        # clique potentials
+        self.potentials = [np.ones([self.dim[v] for v in c]) for c in self.cliques]
+        for vars, a in factors:
+            i = min((len(c), i) for i, c in enumerate(self.cliques) if set(vars) <= set(c))[1]
+            self.potentials[i] = self.potentials[i] * self.expand(a, vars, self.cliques[i])
+
+    def expand(self, a, vars, target):
+        """Transpose and reshape array a over vars so that it
+        broadcasts against an array over variables target."""
+        vars = list(vars)
+        present = [v for v in target if v in vars]
+        a = np.transpose(a, [vars.index(v) for v in present])
+        return a.reshape([self.dim[v] if v in vars else 1 for v in target])
+
+    def sum_to(self, a, vars, target):
+        """Sum array a over vars onto variables in target (a subset of
+        vars); axes of the result are in the order of vars."""
+        axes = tuple(i for i, v in enumerate(vars) if v not in target)
+        return np.sum(a, axis = axes)
+
+    def calibrate(self):
+        """Hugin propagation: collect messages towards the root, then
+        distribute them back."""
+        self.sep_potentials = [None] * len(self.cliques)
+        for i in reversed(self.order[1:]):
+            p = self.parent[i]
+            m = self.sum_to(self.potentials[i], self.cliques[i], self.separators[i])
+            self.potentials[p] = self.potentials[p] * self.expand(m, self.separators[i], self.cliques[p])
+            self.sep_potentials[i] = m
+        for i in self.order[1:]:
+            p = self.parent[i]
+            m = self.sum_to(self.potentials[p], self.cliques[p], self.separators[i])
+            old = self.sep_potentials[i]
+            ratio = np.divide(m, old, out = np.zeros_like(m), where = old != 0)
+            self.potentials[i] = self.potentials[i] * self.expand(ratio, self.separators[i], self.cliques[i])
+            self.sep_potentials[i] = m
+
+    def connecting_subtree(self, vars):
+        """Return cliques of a small subtree whose cliques together
+        contain all variables in vars."""
+        vars = set(vars)
+        first = max(range(len(self.cliques)), key = lambda i: len(vars & set(self.cliques[i])))
+        chosen = set([first])
+        covered = vars & set(self.cliques[first])
+        while covered != vars:
+            # nearest clique containing an uncovered variable
+            queue = list(chosen)
+            seen = set(chosen)
+            for i in queue:
+                if not (vars - covered) & set(self.cliques[i]):
+                    for j in self.neighbors[i]:
+                        if j not in seen:
+                            seen.add(j)
+                            queue.append(j)
+                    continue
+                chosen.add(i)
+                covered |= vars & set(self.cliques[i])
+                break
+        # remove leaves which are not needed
+        subtree = set(range(len(self.cliques)))
+        leaves = [i for i in subtree if len(self.neighbors[i]) <= 1 and i not in chosen]
+        degree = [len(nb) for nb in self.neighbors]
+        while leaves:
+            i = leaves.pop()
+            subtree.remove(i)
+            for j in self.neighbors[i]:
+                if j in subtree:
+                    degree[j] -= 1
+                    if degree[j] <= 1 and j not in chosen:
+                        leaves.append(j)
+        return subtree
+
+    def compute_marginal(self, vars):
+        if len(vars) == 0:
+            return np.array(np.sum(self.potentials[0]))
+        qs = set(vars)
+        containing = [(len(c), i) for i, c in enumerate(self.cliques) if qs <= set(c)]
+        if len(containing) > 0:
+            i = min(containing)[1]
+            c = self.cliques[i]
+            distr = self.sum_to(self.potentials[i], c, qs)
+            present = [v for v in c if v in qs]
+            return np.transpose(distr, [present.index(v) for v in vars])
+        # variable elimination over the connecting subtree:
+        # P(U) = prod clique potentials / prod separator potentials
+        subtree = self.connecting_subtree(vars)
+        factors = []
+        for i in subtree:
+            factors.append((self.cliques[i], self.potentials[i]))
+            if self.parent[i] in subtree:
+                m = self.sep_potentials[i]
+                inv = np.divide(1.0, m, out = np.zeros_like(m), where = m != 0)
+                factors.append((self.separators[i], inv))
+        all_vars = sorted(set(v for vars_, a in factors for v in vars_))
+        local = dict((v, i) for i, v in enumerate(all_vars))
+        asop = array_sop(len(all_vars), fused = True)
+        for fvars, a in factors:
+            if len(fvars) > 0:
+                asop.add_factor([local[v] for v in fvars], a)
+        asop.prepare([local[v] for v in vars], "min_fill")
+        return asop.compute()
+
+    def marginalize_subsets(self, vars, distr):
+        """Marginalize distr over all direct subsets of vars, and
+        insert marginal into the cache."""
+        for i in range(len(vars)):
+            subset = vars[0:i] + vars[i+1:]
+            if subset not in self.cache:
+                self.cache.put(subset, np.array(np.sum(distr, i)), distr.size)
+
+    def get_marginal(self, vars):
+        """Gets a marginal distribution over given variables."""
+        vars = tuple(vars)
+        distr = self.cache.get(vars)
+        if distr is None and self.store is not None:
+            distr = self.store.load(vars)
+            if distr is not None:
+                self.cache.put(vars, distr)
+        if distr is None:
+            distr = self.compute_marginal(vars)
+            self.cache.put(vars, distr)
+        if self.store is not None:
+            self.store.save(vars, distr)
+        self.marginalize_subsets(vars, distr)
+        return distr
+
+    def get_marginals(self, varsets, seed = None):
+        """Returns a dictionary of marginals over all variable sets in
+        varsets.  With a calibrated tree there is no benefit from
+        shared supersets, seed is accepted for compatibility with
+        DiscreteDistrSOP."""
+        return dict((tuple(vars), self.get_marginal(vars)) for vars in varsets)
+
+    def get_positive_border_marginals(self, border):
+        """Computes marginals of all variable sets in border."""
+        self.get_marginals(border)
@@ -2,23 +2,52 @@ import itertools
 import numpy
 
 from ..sop.cached_sop import cached_array_sop
-from .DiscreteDistr import DiscreteDistrSOP
+from ..Utils.Counts import compute_counts_dict_cover
+from ..BayesNet.BayesNetGraph import descendants
+from ..BayesNet.BayesNetLearn import learnProbabilitiesFromData, FamilyCounts
+from .DiscreteDistr import DiscreteDistrSOP, DiscreteDistrJT
 
 from ..Apriori.AprioriDistr import AprioriDistr
+from ..Apriori.EclatDistr import EclatDistr
 from .DDApriori import DDApriori
+from .MarginalStore import MarginalStore
 
 
-def create_sop(bn):
-    """create sum of products for Bayesian network BN."""
-    #asop = sop.sop.array_sop(bn.n)
-    asop = cached_array_sop(len(bn))
+# algorithms for finding attribute sets frequent in data
+miners = {"apriori": AprioriDistr, "eclat": EclatDistr}
+
+def bn_factors(bn):
+    """List of (variables, array) factors whose product is the joint
+    distribution of Bayesian network BN."""
+    factors = []
     for jn in bn.joint_distrs:
-        asop.add_factor(jn.nodes, jn.distr.to_array())
+        factors.append((jn.nodes, jn.distr.to_array()))
     for i, node in enumerate(bn):
         if not node.in_joint:
-            asop.add_factor(node.parents + [i], node.distr)
+            factors.append((node.parents + [i], node.distr))
+    return factors
+
+def create_sop(bn):
+    """create sum of products for Bayesian network BN."""
+    #asop = sop.sop.array_sop(bn.n)
+    asop = cached_array_sop(len(bn), fused = True)
+    for vars, distr in bn_factors(bn):
+        asop.add_factor(vars, distr)
     return asop
 
+def create_joint(bn, inference = "sop", ordering = None):
+    """Create the distribution of Bayesian network BN used to compute
+    its marginals: "sop" - variable elimination for each marginal,
+    "jt" - calibrated junction tree."""
+    if inference == "sop":
+        joint = DiscreteDistrSOP(create_sop(bn))
+        joint.ordering = ordering
+    elif inference == "jt":
+        joint = DiscreteDistrJT(bn_factors(bn), len(bn))
+    else:
+        raise RuntimeError("Unknown inference method: " + str(inference))
+    return joint
+
 
 # #compute interestingness from joint
 # joint = bn.jointP()
@@ -55,13 +84,18 @@ class BN_interestingness_exact(object):
         if self.bn.get_attr_names() != self.ds.attrset.get_attr_names():
             raise RuntimeError("Attribute lists don't match. Dataset and BayesNet must have the same attribute names in the same order.")
 
-    def compute_frequent_attr_sets_in_data(self, minsup, maxK, apriori_debug):
+    def compute_frequent_attr_sets_in_data(self, minsup, maxK, apriori_debug, block_size = None,
+                                           n_jobs = 1, miner = "apriori"):
         self.ds.rewind()
-        self.apriori = AprioriDistr(self.ds)
+        if miner not in miners:
+            raise RuntimeError("Unknown miner: " + str(miner))
+        self.apriori = miners[miner](self.ds)
+        self.apriori.block_size = block_size
+        self.apriori.n_jobs = n_jobs
         self.apriori.minsup = minsup
         self.apriori.maxK = maxK
         self.apriori.debug = apriori_debug
-        print("Running Apriori")
+        print("Running", self.apriori.__class__.__name__)
         self.apriori.run()
         #combine all attrsets
         self.attrsets = {}
@@ -89,17 +123,53 @@ class BN_interestingness_exact(object):
         #inter = sum(numpy.ravel(diff))
         return inter, distr, edistr
 
-    def run(self, minsup = 10, maxK = 5, apriori_debug = 1):
-        self.compute_frequent_attr_sets_in_data(minsup, maxK, apriori_debug)
-        
-        self.thesop = create_sop(self.bn)
+    def run(self, minsup = 10, maxK = 5, apriori_debug = 1, block_size = None, n_jobs = 1,
+            miner = "apriori", ordering = None, inference = "sop", marginal_store = None):
+        """Find interesting attribute sets.
+
+        If block_size is given, data is counted in one streaming pass
+        per level of the search, in blocks of block_size rows, instead
+        of being loaded into memory.  n_jobs is the number of processes counting row shards
+        of the data (all CPUs if smaller than 1).  miner selects the
+        algorithm finding sets frequent in data: "apriori" (level
+        wise) or "eclat" (depth first, data held in memory).
+        ordering is the variable elimination heuristic used for
+        computing marginals of the network (see sop.array_sop).
+        inference selects how marginals of the network are computed:
+        "sop" (variable elimination) or "jt" (junction tree, faster
+        when many marginals are needed).  marginal_store is a
+        MarginalStore (or its directory) from which marginals of the
+        network are reused across runs; marginals of sets whose
+        ancestors' distributions did not change are not recomputed."""
+        self.compute_frequent_attr_sets_in_data(minsup, maxK, apriori_debug, block_size, n_jobs,
+                                                miner)
+        self.joint = create_joint(self.bn, inference, ordering)
+        if marginal_store is not None:
+            if not isinstance(marginal_store, MarginalStore):
+                marginal_store = MarginalStore(marginal_store)
+            marginal_store.attach(self.bn)
+            self.joint.store = marginal_store
+        return self.compute_interestingness(block_size, n_jobs)
+
+    def count_attr_sets(self, asets, block_size = None, n_jobs = 1):
+        """Count distributions of attribute sets asets in data."""
+        self.ds.rewind()
+        domsizes = [len(a.domain) for a in self.ds.attrset]
+        counts, n, missing_counts = compute_counts_dict_cover(list(asets), self.ds,
+                                                              len(self.ds.attrset), domsizes,
+                                                              block_size = block_size, n_jobs = n_jobs)
+        return counts
+
+    def compute_interestingness(self, block_size = None, n_jobs = 1):
+        """Network side of the algorithm: find sets frequent in the
+        network (self.joint), count those not frequent in data and
+        compute interestingness of all sets."""
         self.attr_sets_w_inter = []
         N = self.attrsets[()][()]
 
         attrsetslist = self.attrsets.keys()
 
         # compute expected distributions
-        self.joint = DiscreteDistrSOP(self.thesop)
         self.joint.get_positive_border_marginals(self.apriori.positiveBorder.keys())
         for free_vars in attrsetslist:
             edistr = self.joint.get_marginal(free_vars)
@@ -111,6 +181,9 @@ class BN_interestingness_exact(object):
         dda.maxK = self.apriori.maxK
         print("DDApriori, maxK =", dda.maxK)
         dda.run()
+        print("Marginal cache:", self.joint.cache)
+        if self.joint.store is not None:
+            print("Marginal store:", self.joint.store)
         #print(dda.freq)
         #find attr sets frequent in BN, whose distr in data is not known:
         attr_sets_to_count = {}
@@ -118,13 +191,8 @@ class BN_interestingness_exact(object):
             if aset not in self.attrsets:
                 attr_sets_to_count[aset] = {}
         # count supports of those attrsets
-        self.ds.rewind()
-        n = 0
-        for rec in self.ds:
-            n += 1
-            for attrset, distr in attr_sets_to_count.items():
-                vals = [rec[attrno] for attrno in attrset]
-                distr[tuple(vals)] = distr.get(tuple(vals), 0) + 1
+        counts = self.count_attr_sets(attr_sets_to_count.keys(), block_size, n_jobs)
+        attr_sets_to_count.update(counts)
         self.attrsets.update(attr_sets_to_count)
         attrsetslist = self.attrsets.keys()
 
@@ -138,3 +206,89 @@ class BN_interestingness_exact(object):
         self.attr_sets_w_inter.sort(key = lambda x: -x[1])
         return self.attr_sets_w_inter
 
+
+class BN_interestingness_incremental(BN_interestingness_exact):
+    """Interestingness computation for interactive editing of a
+    network on fixed data.
+
+    Sets frequent in data and all counts are kept between runs, since
+    they do not depend on the network.  Before each run the structure
+    of the network is compared with a snapshot taken at the previous
+    run; only distributions of changed nodes are relearned and only
+    marginals of sets containing a changed node or its descendant
+    (i.e. whose ancestral set contains a changed node) are
+    recomputed."""
+    def __init__(self, bn, ds, priorN = 0):
+        super().__init__(bn, ds)
+        self.priorN = priorN # prior used when learning distributions
+        self.structure = None # network structure at the last run
+        self.data_params = None # parameters of the last search in data
+        self.data_attrsets = None # sets frequent in data
+        self.counted = {} # distributions in data of other sets
+        self.stats_cache = FamilyCounts() # family tables for learning distributions
+        self.joint = None
+
+    def network_structure(self):
+        """Snapshot of the network structure: parents of each node and
+        nodes of joint distributions."""
+        return ([tuple(node.parents) for node in self.bn],
+                [tuple(jn.nodes) for jn in self.bn.joint_distrs])
+
+    def changed_nodes(self):
+        """Nodes whose parents or joint distribution changed since the
+        last run, all nodes before the first run."""
+        parents, joints = self.network_structure()
+        if self.structure is None:
+            return set(range(len(self.bn)))
+        old_parents, old_joints = self.structure
+        changed = set(i for i in range(len(self.bn)) if parents[i] != old_parents[i])
+        for jn in set(joints) ^ set(old_joints):
+            changed |= set(jn)
+        return changed
+
+    def count_attr_sets(self, asets, block_size = None, n_jobs = 1):
+        asets = list(asets)
+        new_asets = [aset for aset in asets if aset not in self.counted]
+        if len(new_asets) > 0:
+            self.counted.update(BN_interestingness_exact.count_attr_sets(self, new_asets,
+                                                                          block_size, n_jobs))
+        return dict((aset, self.counted.get(aset, {})) for aset in asets)
+
+    def run(self, minsup = 10, maxK = 5, apriori_debug = 1, block_size = None, n_jobs = 1,
+            miner = "apriori", ordering = None, inference = "sop", marginal_store = None):
+        """Find interesting attribute sets, reusing the results of the
+        previous run.  Parameters are the same as for
+        BN_interestingness_exact.run."""
+        changed = self.changed_nodes()
+        print(len(changed), "changed nodes")
+        if len(changed) > 0:
+            self.ds.rewind()
+            learnProbabilitiesFromData(self.bn, self.ds, priorN = self.priorN, changed = changed,
+                                       stats_cache = self.stats_cache)
+
+        data_params = (minsup, maxK, block_size, miner)
+        if data_params != self.data_params:
+            self.compute_frequent_attr_sets_in_data(minsup, maxK, apriori_debug, block_size,
+                                                    n_jobs, miner)
+            self.data_params = data_params
+            self.data_attrsets = dict(self.attrsets)
+        self.attrsets = dict(self.data_attrsets)
+
+        old_joint = self.joint
+        self.joint = create_joint(self.bn, inference, ordering)
+        if old_joint is not None and type(old_joint) is type(self.joint):
+            # keep marginals not affected by the changes
+            affected = changed | descendants(self.bn, list(changed))
+            cache = old_joint.cache
+            for vars in list(cache.keys()):
+                if affected & set(vars):
+                    del cache[vars]
+            print(len(cache), "marginals reused")
+            self.joint.cache = cache
+        if marginal_store is not None:
+            if not isinstance(marginal_store, MarginalStore):
+                marginal_store = MarginalStore(marginal_store)
+            marginal_store.attach(self.bn)
+            self.joint.store = marginal_store
+        self.structure = self.network_structure()
+        return self.compute_interestingness(block_size, n_jobs)
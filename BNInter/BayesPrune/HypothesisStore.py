@@ -0,0 +1,168 @@
+"""Memory mapped store of counts of attribute sets used by the
+sampling algorithm when hypotheses are kept on disk.
+
+All counts live in a single file of integers mapped with np.memmap.
+The attribute set over attributes with domain sizes d1, ..., dk
+occupies a slot of 2 * d1 * ... * dk values: the model counts followed
+by the data counts.  Slots are found by attribute set through an
+in-memory index holding their offsets and the numbers of samples
+counted, and are updated in place.  Counts are stored as uint32 (see
+Utils.Counts.count_dtype) and the whole file is widened to uint64 if
+more samples are counted.  Removed slots are left as tombstones and
+the file is compacted once more than half of it is dead.
+
+The store works on Windows, which doesn't allow truncating or
+replacing a mapped file: the mapping is dropped before the file is
+resized, and widening writes a new file, removing the old one once
+nothing maps it."""
+
+import math
+import os
+import tempfile
+import weakref
+
+import numpy as np
+
+from ..Utils.Counts import count_dtype
+
+
+def _remove_file(fname):
+    try:
+        os.remove(fname)
+    except OSError:
+        pass
+
+
+class HypothesisStore(object):
+    """Counts of attribute sets in a memory mapped temporary file.
+
+    Arrays returned by get() are views of the file, so updating them
+    updates the store.  They stay valid until the next add(),
+    remove(), retain() or compact(); update() copies counts which are
+    not views of the store."""
+    def __init__(self, domainsizes, directory = None, capacity = 1048576):
+        """domainsizes - sizes of domains of all attributes
+        directory - where the file is created (system default if None)
+        capacity - initial size of the file in counts"""
+        self.domainsizes = domainsizes
+        fd, self.filename = tempfile.mkstemp(prefix = "bprune-", suffix = ".hyp", dir = directory)
+        os.close(fd)
+        self.finalizer = weakref.finalize(self, _remove_file, self.filename)
+        self.index = {} # attribute set -> (offset of its slot, number of cells, N_model, N_data)
+        self.end = 0 # first unused value
+        self.dead = 0 # values in removed slots
+        self.dtype = count_dtype(0)
+        self.capacity = 0
+        self.mmap = None
+        self.data = None # plain array view of mmap, slicing memmaps is slow
+        self.resize(capacity)
+
+    def __len__(self):
+        return len(self.index)
+    def __contains__(self, key):
+        return key in self.index
+
+    def domsize(self, key):
+        return math.prod(self.domainsizes[a] for a in key)
+
+    def __map(self):
+        self.mmap = np.memmap(self.filename, dtype = self.dtype, mode = "r+", shape = (self.capacity,))
+        self.data = self.mmap.view(np.ndarray)
+
+    def resize(self, capacity):
+        """Grow the file to capacity values."""
+        if capacity <= self.capacity:
+            return
+        if self.mmap is not None:
+            self.mmap.flush()
+            self.mmap = self.data = None
+        os.truncate(self.filename, capacity * self.dtype.itemsize)
+        self.capacity = capacity
+        self.__map()
+
+    def widen(self, dtype):
+        """Convert all counts to integer type dtype.  Arrays returned
+        by get() before remain valid, but are no longer views of the
+        store."""
+        dtype = np.dtype(dtype)
+        fd, filename = tempfile.mkstemp(prefix = "bprune-", suffix = ".hyp",
+                                        dir = os.path.dirname(self.filename))
+        os.close(fd)
+        wide = np.memmap(filename, dtype = dtype, mode = "w+", shape = (self.capacity,))
+        step = 1048576
+        for start in range(0, self.end, step):
+            wide[start:min(start + step, self.end)] = self.data[start:min(start + step, self.end)]
+        wide.flush()
+        del wide
+        # the old file is removed once existing views are freed
+        self.finalizer.detach()
+        weakref.finalize(self.mmap.base, _remove_file, self.filename)
+        self.finalizer = weakref.finalize(self, _remove_file, filename)
+        self.filename = filename
+        self.dtype = dtype
+        self.mmap = self.data = None
+        self.__map()
+
+    def add(self, h):
+        """Add attribute set h (with key, N_model, N_data, counts_model
+        and counts_data fields) to the store."""
+        if h.key in self.index:
+            self.remove([h.key])
+        cnt = self.domsize(h.key)
+        size = 2 * cnt
+        if self.end + size > self.capacity:
+            self.resize(max(2 * self.capacity, self.end + size))
+        self.index[h.key] = (self.end, cnt, 0, 0)
+        self.end += size
+        self.update(h)
+
+    def get(self, key):
+        """Return N_model, N_data and views of the model and data
+        counts of attribute set key."""
+        offset, cnt, N_model, N_data = self.index[key]
+        shape = tuple(self.domainsizes[a] for a in key)
+        counts_model = self.data[offset:offset + cnt].reshape(shape)
+        counts_data = self.data[offset + cnt:offset + 2 * cnt].reshape(shape)
+        return N_model, N_data, counts_model, counts_data
+
+    def update(self, h):
+        """Write sample numbers and counts of h into its slot.  Counts
+        which are views of the slot are not copied."""
+        offset, cnt, N_model, N_data = self.index[h.key]
+        dtype = count_dtype(max(h.N_model, h.N_data))
+        if dtype.itemsize > self.dtype.itemsize:
+            self.widen(dtype)
+        self.index[h.key] = (offset, cnt, h.N_model, h.N_data)
+        model = self.data[offset:offset + cnt]
+        if not np.may_share_memory(model, h.counts_model):
+            model[:] = np.ravel(h.counts_model)
+        data = self.data[offset + cnt:offset + 2 * cnt]
+        if not np.may_share_memory(data, h.counts_data):
+            data[:] = np.ravel(h.counts_data)
+
+    def remove(self, keys):
+        """Remove attribute sets in keys, compacting the file if more
+        than half of it is unused."""
+        for key in keys:
+            offset, cnt, N_model, N_data = self.index.pop(key)
+            self.dead += 2 * cnt
+        if self.dead > self.end // 2:
+            self.compact()
+
+    def retain(self, keys):
+        """Remove all attribute sets not in keys."""
+        keys = set(keys)
+        self.remove([key for key in self.index if key not in keys])
+
+    def compact(self):
+        """Move live slots to the beginning of the file in their
+        current order."""
+        pos = 0
+        for key, (offset, cnt, N_model, N_data) in sorted(self.index.items(), key = lambda x: x[1][0]):
+            size = 2 * cnt
+            if offset != pos:
+                self.data[pos:pos + size] = self.data[offset:offset + size]
+                self.index[key] = (pos, cnt, N_model, N_data)
+            pos += size
+        self.end = pos
+        self.dead = 0
@@ -0,0 +1,228 @@
+"""Persistent store of marginal distributions of Bayesian networks.
+
+The marginal of a set of variables depends only on the conditional
+distributions of the variables and their ancestors.  Each marginal is
+saved in a directory as a .npy file named by a SHA1 hash of the query
+(names of variables in order) and of the structure and distributions
+of all nodes in its ancestral closure.  After an edit of the network,
+marginals of sets whose ancestral closure did not change are found
+under the same key and reused, also in later sessions.
+
+The directory is created when the first marginal is saved.  If it
+can't be written, a directory in the per-user cache is used instead,
+and if that fails as well, marginals are not stored.  The total size
+of stored files is bounded; least recently used files are removed
+first."""
+
+import hashlib
+import os
+
+import numpy as np
+
+from ..BayesNet.BayesNetGraph import ancestors
+
+
+store_suffix = ".bnmarginals"
+# default bound on the total size of a store in bytes
+max_store_bytes = 1000000000
+
+
+def node_digests(bn):
+    """SHA1 digest of each node of bn describing its domain, parents
+    and distribution.  Nodes in a joint distribution are described by
+    the joint."""
+    joint_of = {}
+    for jn in bn.joint_distrs:
+        for i in jn.nodes:
+            joint_of[i] = jn
+    digests = []
+    for i, node in enumerate(bn):
+        h = hashlib.sha1()
+        h.update(repr((node.name, list(node.domain))).encode())
+        if node.in_joint:
+            jn = joint_of[i]
+            distr = np.ascontiguousarray(jn.distr.to_array(), dtype = float)
+            h.update(repr(("joint", [bn[j].name for j in jn.nodes], distr.shape)).encode())
+        else:
+            distr = np.ascontiguousarray(node.distr, dtype = float)
+            h.update(repr(([bn[j].name for j in node.parents], distr.shape)).encode())
+        h.update(distr.tobytes())
+        digests.append(h.hexdigest())
+    return digests
+
+def ancestral_closure(bn, vars):
+    """vars together with all their ancestors (including other
+    members of joint distributions)."""
+    closure = set(vars)
+    if len(vars) > 0:
+        closure |= ancestors(bn, list(vars))
+    for jn in bn.joint_distrs:
+        if closure & set(jn.nodes):
+            closure |= set(jn.nodes)
+    return closure
+
+
+def user_cache_dir(directory):
+    """Directory in the per-user cache standing in for directory."""
+    if os.name == "nt":
+        base = os.environ.get("LOCALAPPDATA") or os.path.expanduser("~")
+    else:
+        base = os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache")
+    name = hashlib.sha1(os.path.abspath(directory).encode()).hexdigest()
+    return os.path.join(base, "bninter", "marginals", name)
+
+
+class MarginalStore(object):
+    """Directory of marginal distributions keyed by the part of the
+    network they depend on.
+
+    attach() must be called with the network before marginals are
+    loaded or saved, and again after the network is changed."""
+    def __init__(self, directory, max_bytes = max_store_bytes):
+        """directory - where marginals are stored, created when needed
+        max_bytes - bound on the total size of stored marginals"""
+        self.requested = directory
+        if not os.path.isdir(directory) and os.path.isdir(user_cache_dir(directory)):
+            directory = user_cache_dir(directory) # used in an earlier session
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.writable = None # None until the directory is created
+        self.nbytes = None # total size of stored files, None if unknown
+        self.bn = None
+        self.keys = {} # variable tuple -> key for the attached network
+        self.present = set() # keys known to be stored
+        self.hits = 0
+        self.misses = 0
+        self.saved = 0
+
+    def attach(self, bn):
+        """Use the store for marginals of network bn."""
+        self.bn = bn
+        self.digests = node_digests(bn)
+        self.keys = {}
+        self.present = set() # keys known to be stored
+
+    def key(self, vars):
+        vars = tuple(vars)
+        if vars not in self.keys:
+            if self.bn is None:
+                raise RuntimeError("MarginalStore: no network attached")
+            h = hashlib.sha1()
+            h.update(repr([self.bn[v].name for v in vars]).encode())
+            for v in sorted(ancestral_closure(self.bn, vars)):
+                h.update(self.digests[v].encode())
+            self.keys[vars] = h.hexdigest()
+        return self.keys[vars]
+
+    def filename(self, vars):
+        return os.path.join(self.directory, self.key(vars) + ".npy")
+
+    def __contains__(self, vars):
+        return self.directory is not None and os.path.exists(self.filename(vars))
+
+    def make_directory(self):
+        """Create the directory, falling back to the per-user cache.
+        Returns False if marginals can't be stored."""
+        if self.writable is None:
+            self.writable = False
+            for directory in (self.directory, user_cache_dir(self.requested)):
+                try:
+                    os.makedirs(directory, exist_ok = True)
+                except OSError:
+                    continue
+                if os.access(directory, os.W_OK):
+                    self.directory = directory
+                    self.writable = True
+                    break
+            if not self.writable:
+                print("cannot write marginal store", self.requested + ", marginals are not stored")
+                self.directory = None
+        return self.writable
+
+    def load(self, vars):
+        """Return the stored marginal over vars or None."""
+        if self.directory is None:
+            return None
+        fname = self.filename(vars)
+        try:
+            distr = np.load(fname)
+        except (OSError, ValueError):
+            self.misses += 1
+            return None
+        try:
+            os.utime(fname) # mark as recently used
+        except OSError:
+            pass
+        self.hits += 1
+        self.present.add(self.key(vars))
+        return distr
+
+    def save(self, vars, distr):
+        """Store the marginal distr over vars."""
+        key = self.key(vars)
+        if key in self.present:
+            return
+        self.present.add(key)
+        if not self.make_directory():
+            return
+        fname = self.filename(vars)
+        if os.path.exists(fname):
+            return
+        # write to a temporary file first so that readers never see
+        # partially written marginals
+        tmpname = fname + "." + str(os.getpid()) + ".tmp"
+        try:
+            with open(tmpname, "wb") as f:
+                np.save(f, np.asarray(distr))
+            os.replace(tmpname, fname)
+        except OSError as e:
+            print("could not store marginal:", e)
+            return
+        self.saved += 1
+        if self.nbytes is None:
+            self.nbytes = sum(size for fname, size, mtime in self.stored_files())
+        else:
+            self.nbytes += os.path.getsize(fname)
+        if self.nbytes > self.max_bytes:
+            self.evict()
+
+    def stored_files(self):
+        """List of (file name, size, modification time) of stored
+        marginals."""
+        files = []
+        if self.directory is None or not os.path.isdir(self.directory):
+            return files
+        for name in os.listdir(self.directory):
+            if name.endswith(".npy"):
+                fname = os.path.join(self.directory, name)
+                try:
+                    st = os.stat(fname)
+                except OSError:
+                    continue
+                files.append((fname, st.st_size, st.st_mtime))
+        return files
+
+    def evict(self):
+        """Remove least recently used files until the store takes at
+        most 3/4 of max_bytes."""
+        files = sorted(self.stored_files(), key = lambda f: f[2])
+        self.nbytes = sum(size for fname, size, mtime in files)
+        for fname, size, mtime in files:
+            if self.nbytes <= self.max_bytes * 3 // 4:
+                break
+            try:
+                os.remove(fname)
+            except OSError:
+                continue
+            self.nbytes -= size
+        self.present = set()
+
+    def clear(self):
+        """Remove all stored marginals."""
+        for fname, size, mtime in self.stored_files():
+            os.remove(fname)
+        self.nbytes = 0
+        self.present = set()
+
+    def __str__(self):
+        return "%d loaded, %d not found, %d saved" % (self.hits, self.misses, self.saved)
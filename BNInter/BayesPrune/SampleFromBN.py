@@ -1,60 +1,68 @@
 #!/usr/bin/env python
 
-"""Helper program for generating samples from a Bayesian network."""
+"""Helper program for generating samples from a Bayesian network.
+
+usage: python -m BNInter.BayesPrune.SampleFromBN network N outfile [n_jobs [seed]]
+
+Samples are written as an ARFF file if outfile ends with .arff and
+as tab separated values otherwise ("-" writes to standard output).
+They are drawn in chunks by worker processes (see
+BayesNet.ParallelSampler), so the output only depends on the seed."""
 
 
 import sys
-import itertools
-import random
 
-import BayesNet.BayesNet
-import BayesNet.BayesHuginFile
-import BayesNet.BayesNetApprox
+import numpy as np
+
+from ..BayesNet import read_Hugin_file, ParallelSampler
+from ..DataAccess.ArffFileWriter import make_arff_header
+
 
+chunk_size = 1048576 # rows sampled and written at once
 
-#filename = "data/Munin1.hugin.gz"
-filename = "data/Munin2.hugin.gz"
-filename = "/home/szymon/dmining/data/Borreliosis/borrelia.net"
-N = 30000
-sep = '\t'
-outfile = "/tmp/borelia.tabsep"
-#outfile = "/mnt/data/Munin2.arff"
-#outfile = "data/Munin1.arff"
-#outfile = "data/Munin_final.arff"
-#outfile = "-"
-arff=False
 
-random.seed(0)
+def write_samples(sampler, bn, N, of, sep = "\t", quote_char = "'"):
+    """Write N samples drawn by sampler from bn to file of."""
+    labels = [np.array([quote_char + str(v) + quote_char for v in node.domain], dtype = object)
+              for node in bn]
+    written = 0
+    for X in sampler.iter_samples(N, chunk_size):
+        columns = [labels[j][X[:, j]] for j in range(len(bn))]
+        of.write("\n".join(map(sep.join, zip(*columns))))
+        of.write("\n")
+        written += X.shape[0]
+        print("row", written, file = sys.stderr)
+
 
 if __name__ == "__main__":
+    if len(sys.argv) < 4:
+        print(__doc__)
+        sys.exit(1)
+    filename = sys.argv[1]
+    N = int(sys.argv[2])
+    outfile = sys.argv[3]
+    n_jobs = int(sys.argv[4]) if len(sys.argv) > 4 else 1
+    seed = int(sys.argv[5]) if len(sys.argv) > 5 else 0
+    arff = outfile.endswith(".arff")
+
+    bn = read_Hugin_file(filename)
+    print(len(bn), "nodes", file = sys.stderr)
+    bn.normalizeProbabilities()
+    bn.validate()
+
     if outfile == "-":
         of = sys.stdout
     else:
         of = open(outfile, "w")
-    bn = BayesNet.BayesHuginFile.read_Hugin_file(filename)
-    print(len(bn), "nodes")
-    #print(bn)
-    bn.normalizeProbabilities()
-    bn.validate()
-
     # header
     if arff:
-        print("@RELATION no-name", file=of)
-        for a in bn:
-            print("@ATTRIBUTE", a.attrname, "{", ",".join(a.attrdomain), "}", file=of)
-        print("@DATA", file=of)
+        of.write(make_arff_header(bn, "'"))
         sep = ","
     else:
-        print(sep.join(bn.attrnames), file=of)
-
-
+        print("\t".join(node.name for node in bn), file = of)
+        sep = "\t"
     # data
-    sampler = BayesNet.BayesNetApprox.BayesSampler(bn)
-    for i in range(N):
-        row = sampler.next()
-        rowstr = ["'"+attr.attrdomain[x]+"'" for attr, x in itertools.izip(bn, row)]
-        print(sep.join(rowstr), file=of)
-        if i % 1000 == 0:
-            print("row", i)
-            sys.stdout.flush()
-    of.close()
+    sampler = ParallelSampler(bn, seed = seed, n_jobs = n_jobs)
+    write_samples(sampler, bn, N, of, sep)
+    if of is not sys.stdout:
+        of.close()
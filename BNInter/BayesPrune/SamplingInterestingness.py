@@ -1,15 +1,16 @@
 import math
 import itertools
 import tempfile
-import os
 
 import numpy as np
 
 from ..Utils.gaussinv import cdf_ugaussian_Pinv
-from ..Utils.Counts import compute_counts_array_cover
+from ..Utils.Counts import compute_counts_array_cover, count_dtype, add_counts
 from ..DataAccess import ProjectionReader
 from ..DataAccess import SelectionReader
-from ..BayesNet import BayesSampler
+from ..BayesNet import BayesSampler, ParallelSampler
+from .HypothesisStore import HypothesisStore
+from ..Apriori.Candidates import generate_candidates, array_to_sets
 
 
 
@@ -47,18 +48,17 @@ class small_attr_set(object):
     full version is not needed.
 
     __slots__ are used to conserve memory."""
-    __slots__ = ['key', 'inter', 'inter_ci', 'supp', 'supp_ci', 'offset']
+    __slots__ = ['key', 'inter', 'inter_ci', 'supp', 'supp_ci']
     def __init__(self, attr_set):
         self.key = attr_set.key
         self.inter = attr_set.inter
         self.inter_ci = attr_set.inter_ci
         self.supp = attr_set.supp
         self.supp_ci = attr_set.supp_ci
-    def fromfile(self, file):
-        """Read and return the corresponding full attribute set from
-        file"""
-        fullh = attr_set(self.key)
-        fullh.fromfile(file)
+    def load(self, store):
+        """Return the corresponding full attribute set with counts in
+        HypothesisStore store"""
+        fullh = attr_set.from_store(store, self.key)
         fullh.inter = self.inter
         fullh.inter_ci = self.inter_ci
         fullh.supp = self.supp
@@ -83,9 +83,9 @@ class attr_set(object):
         self.__update_fields()
 
         self.N_data = 0 #how many samples used to count from data
-        self.counts_data = np.zeros(self.shape)
+        self.counts_data = np.zeros(self.shape, dtype = count_dtype(0))
         self.N_model = 0 #how many samples used to count from model
-        self.counts_model = np.zeros(self.shape)
+        self.counts_model = np.zeros(self.shape, dtype = count_dtype(0))
 
         self.inter = None
         self.inter_ci = None
@@ -93,28 +93,28 @@ class attr_set(object):
         self.supp_ci = None
 
     def update_model_counts(self, distr, N):
-        """Update counts from model"""
+        """Update counts from model (widening their dtype if needed)"""
         self.N_model += N
-        self.counts_model += distr
+        self.counts_model = add_counts(self.counts_model, distr, self.N_model)
     def update_data_counts(self, distr, N):
-        """Update counts from data"""
+        """Update counts from data (widening their dtype if needed)"""
         self.N_data += N
-        self.counts_data += distr
-
-    def tofile(self, file):
-        file.write(str(self.N_model).encode().rjust(12))
-        file.write(str(self.N_data).encode().rjust(12))
-        self.counts_model.tofile(file)
-        self.counts_data.tofile(file)
-    def fromfile(self, f):
+        self.counts_data = add_counts(self.counts_data, distr, self.N_data)
+
+    @classmethod
+    def from_store(cls, store, aset):
+        """Attribute set aset with counts in HypothesisStore store.
+        The counts are views of the store, so they are updated in
+        place."""
+        self = cls.__new__(cls)
+        self.key = aset
         self.__update_fields()
-        #self.N_model = int(f.readline())
-        #self.N_data = int(f.readline())
-        self.N_model = int(f.read(12))
-        self.N_data = int(f.read(12))
-        cnt = math.prod(self.shape)
-        self.counts_model = np.reshape(np.fromfile(f, float, cnt), self.shape)
-        self.counts_data  = np.reshape(np.fromfile(f, float, cnt), self.shape)
+        self.N_model, self.N_data, self.counts_model, self.counts_data = store.get(aset)
+        self.inter = None
+        self.inter_ci = None
+        self.supp = None
+        self.supp_ci = None
+        return self
     def clear_data(self):
         del self.shape
         del self.domsize
@@ -125,86 +125,23 @@ class attr_set(object):
         
 
     def compute_interestingness(self, delta):
-        self.inter = (np.abs(self.counts_model/self.N_model - self.counts_data/self.N_data)).max()
-        if self.sample_from_data:
-            z = cdf_ugaussian_Pinv(1.0 - 0.5*delta/self.domsize)
-            pM = self.counts_model / self.N_model
-            stddevM = pM * (1.0 - pM) / self.N_model
-            pD = self.counts_data / self.N_data
-            stddevD = pD * (1.0 - pD) / self.N_data * (self.ND - self.N_data) / (self.ND - 1)
-            stddev = stddevM + stddevD
-            self.inter_ci = z * math.sqrt(stddev.max())
-        else:
-            #self.inter_ci = E_Chernoff(N_model, delta/self.domsize)
-            #self.inter_ci = Utils.gaussinv.cdf_ugaussian_Pinv(1.0 - 0.5*delta/self.domsize) * 1.0 / (2*math.sqrt(N_model))
-            # normal approx using different variances
-            z = cdf_ugaussian_Pinv(1.0 - 0.5*delta/self.domsize)
-            p = self.counts_model / self.N_model
-            stddev = p * (1.0 - p)
-            self.inter_ci = z * math.sqrt(stddev.max() / self.N_model)
+        inter, inter_ci = attr_set_batch([self]).interestingness(delta)
+        self.inter = float(inter[0])
+        self.inter_ci = float(inter_ci[0])
 
     def compute_support(self, delta):
-        self.supp = max(float(self.counts_data.max()) / self.N_data,
-                        float(self.counts_model.max()) / self.N_model)
-        if self.sample_from_data:
-            z = cdf_ugaussian_Pinv(1.0 - 0.25*delta/self.domsize)
-            pM = self.counts_model / self.N_model
-            stddevM = pM * (1.0 - pM) / self.N_model
-            pD = self.counts_data / self.N_data
-            stddevD = pD * (1.0 - pD) / self.N_data * (self.ND - self.N_data) / (self.ND - 1)
-            stddev = max(stddevM.max(), stddevD.max())
-            self.supp_ci = z * math.sqrt(stddev)
-        else:
-            #self.supp_ci = E_Chernoff(self.N_model, delta/self.domsize)
-            #self.supp_ci = Utils.gaussinv.cdf_ugaussian_Pinv(1.0 - 0.5*delta/self.domsize) * 1.0 / (2*math.sqrt(self.N_model))
-            # normal approx using different variances
-            z = cdf_ugaussian_Pinv(1.0 - 0.5*delta/self.domsize)
-            p = self.counts_model / self.N_model
-            stddev = p * (1.0 - p)
-            self.supp_ci = z * math.sqrt(stddev.max() / self.N_model)
+        supp, supp_ci = attr_set_batch([self]).support(delta)
+        self.supp = float(supp[0])
+        self.supp_ci = float(supp_ci[0])
 
     def n_samples_required_inter(self, E, delta):
         """Returns the number of samples needed to get confidence
         interval for interestingness within E."""
-        if self.sample_from_data:
-            # normal approx using different variances
-            cdf_inv = cdf_ugaussian_Pinv(1.0 - 0.5*delta/self.domsize)
-            pM = self.counts_model / self.N_model
-            stddevM = pM * (1.0 - pM)
-            pD = self.counts_data / self.N_data
-            stddevD = pD * (1.0 - pD) * (self.ND - self.N_data) / (self.ND - 1)
-            N = cdf_inv * cdf_inv * (stddevM + stddevD).max() / (E * E)
-        else:
-            N = N_Chernoff(E, delta/self.domsize)
-            cdf_inv = cdf_ugaussian_Pinv(1.0 - 0.5*delta/self.domsize)
-            N = 0.25 * cdf_inv * cdf_inv / (E * E)
-            # normal approx using different variances
-            cdf_inv = cdf_ugaussian_Pinv(1.0 - 0.5*delta/self.domsize)
-            pM = self.counts_model / self.N_model
-            stddev = pM * (1.0 - pM)
-            N = cdf_inv * cdf_inv * stddev.max() / (E * E)
-        return N
+        return float(attr_set_batch([self]).n_samples_required_inter(E, delta)[0])
     def n_samples_required_supp(self, E, delta):
         """Returns the number of samples needed to get confidence
         interval for support within E."""
-        if self.sample_from_data:
-            # normal approx using different variances
-            cdf_inv = cdf_ugaussian_Pinv(1.0 - 0.25*delta/self.domsize)
-            pM = self.counts_model / self.N_model
-            stddevM = pM * (1.0 - pM)
-            pD = self.counts_data / self.N_data
-            stddevD = pD * (1.0 - pD) * (self.ND - self.N_data) / (self.ND - 1)
-            N = cdf_inv * cdf_inv * (stddevM.max(), stddevD.max()) / (E * E)
-        else:
-            N = N_Chernoff(E, delta/self.domsize)
-            cdf_inv = cdf_ugaussian_Pinv(1.0 - 0.5*delta/self.domsize)
-            N = 0.25 * cdf_inv * cdf_inv / (E * E)
-            # normal approx using different variances
-            cdf_inv = cdf_ugaussian_Pinv(1.0 - 0.5*delta/self.domsize)
-            pM = self.counts_model / self.N_model
-            stddev = pM * (1.0 - pM)
-            N = cdf_inv * cdf_inv * stddev.max() / (E * E)
-        return N
+        return float(attr_set_batch([self]).n_samples_required_supp(E, delta)[0])
 
     @staticmethod
     def sort_key_inter(aset):
@@ -220,6 +157,104 @@ class attr_set(object):
         return -aset.supp
 
 
+class attr_set_batch(object):
+    """Counts of a list of full attribute sets concatenated into flat
+    buffers, so that statistics of all of them are computed with a
+    few array operations.
+
+    Cells of the i-th attribute set are at offsets[i]:offsets[i] +
+    domsize[i], maxima over attribute sets are computed with
+    np.maximum.reduceat.  Normal quantiles are computed once for each
+    distinct domain size."""
+    def __init__(self, hyp):
+        self.domsize = np.array([h.domsize for h in hyp], dtype = np.intp)
+        self.offsets = np.zeros(len(hyp), dtype = np.intp)
+        np.cumsum(self.domsize[:-1], out = self.offsets[1:])
+        self.N_model = np.array([h.N_model for h in hyp], dtype = float)
+        self.N_data = np.array([h.N_data for h in hyp], dtype = float)
+        self.pM = np.concatenate([h.counts_model.ravel() for h in hyp], dtype = float)
+        self.pM /= np.repeat(self.N_model, self.domsize)
+        self.pD = np.concatenate([h.counts_data.ravel() for h in hyp], dtype = float)
+        self.pD /= np.repeat(self.N_data, self.domsize)
+
+    def cell_max(self, x):
+        """Maximum of cell values x within each attribute set."""
+        return np.maximum.reduceat(x, self.offsets)
+
+    def z(self, P):
+        """Quantiles of the standard normal distribution at
+        probabilities 1 - P."""
+        P, inverse = np.unique(P, return_inverse = True)
+        return np.array([cdf_ugaussian_Pinv(1.0 - x) for x in P])[inverse]
+
+    def variances(self):
+        """Variance factors p(1-p) of cells of the model and of the
+        data (the latter with finite population correction)."""
+        stddevM = self.pM * (1.0 - self.pM)
+        stddevD = self.pD * (1.0 - self.pD)
+        stddevD *= np.repeat((attr_set.ND - self.N_data) / (attr_set.ND - 1), self.domsize)
+        return stddevM, stddevD
+
+    def interestingness(self, delta):
+        """Interestingness and its confidence interval of each
+        attribute set."""
+        inter = self.cell_max(np.abs(self.pM - self.pD))
+        z = self.z(0.5 * delta / self.domsize)
+        if attr_set.sample_from_data:
+            stddevM, stddevD = self.variances()
+            stddevM /= np.repeat(self.N_model, self.domsize)
+            stddevD /= np.repeat(self.N_data, self.domsize)
+            inter_ci = z * np.sqrt(self.cell_max(stddevM + stddevD))
+        else:
+            # normal approx using different variances
+            stddev = self.pM * (1.0 - self.pM)
+            inter_ci = z * np.sqrt(self.cell_max(stddev) / self.N_model)
+        return inter, inter_ci
+
+    def support(self, delta):
+        """Support and its confidence interval of each attribute
+        set."""
+        supp = np.maximum(self.cell_max(self.pD), self.cell_max(self.pM))
+        if attr_set.sample_from_data:
+            z = self.z(0.25 * delta / self.domsize)
+            stddevM, stddevD = self.variances()
+            stddevM /= np.repeat(self.N_model, self.domsize)
+            stddevD /= np.repeat(self.N_data, self.domsize)
+            supp_ci = z * np.sqrt(np.maximum(self.cell_max(stddevM), self.cell_max(stddevD)))
+        else:
+            # normal approx using different variances
+            z = self.z(0.5 * delta / self.domsize)
+            stddev = self.pM * (1.0 - self.pM)
+            supp_ci = z * np.sqrt(self.cell_max(stddev) / self.N_model)
+        return supp, supp_ci
+
+    def n_samples_required_inter(self, E, delta):
+        """Number of samples needed to get confidence intervals for
+        interestingness within E."""
+        if attr_set.sample_from_data:
+            cdf_inv = self.z(0.5 * delta / self.domsize)
+            stddevM, stddevD = self.variances()
+            stddev = self.cell_max(stddevM + stddevD)
+        else:
+            # normal approx using different variances
+            cdf_inv = self.z(0.5 * delta / self.domsize)
+            stddev = self.cell_max(self.pM * (1.0 - self.pM))
+        return cdf_inv * cdf_inv * stddev / (E * E)
+
+    def n_samples_required_supp(self, E, delta):
+        """Number of samples needed to get confidence intervals for
+        support within E."""
+        if attr_set.sample_from_data:
+            cdf_inv = self.z(0.25 * delta / self.domsize)
+            stddevM, stddevD = self.variances()
+            stddev = np.maximum(self.cell_max(stddevM), self.cell_max(stddevD))
+        else:
+            # normal approx using different variances
+            cdf_inv = self.z(0.5 * delta / self.domsize)
+            stddev = self.cell_max(self.pM * (1.0 - self.pM))
+        return cdf_inv * cdf_inv * stddev / (E * E)
+
+
 
 class BN_interestingness_sample(object):
     """Class for encapsulating the algorithm for fidning n most
@@ -227,6 +262,7 @@ class BN_interestingness_sample(object):
     data and Bayesian network.
 
     if sample_from_data is False whole database will be read.""" 
+    sample_block_size = 65536 # rows drawn from one random stream, see ParallelSampler
     #def __init__(self, bn, ds, sample_from_data = False, ND = None):
     def __init__(self, bn, ds, sample_from_data = False, ND = 1000000):
         self.bn = bn
@@ -240,9 +276,12 @@ class BN_interestingness_sample(object):
         self.sample_from_data = sample_from_data
         if self.sample_from_data:
             if ND is None: # find database size
-                ND = 0
-                for x in self.ds:
-                    ND += 1
+                if hasattr(self.ds, "as_array"):
+                    ND = len(self.ds)
+                else:
+                    ND = 0
+                    for x in self.ds:
+                        ND += 1
                 self.ds.rewind()
         self.ND = ND
         attr_set.sample_from_data = self.sample_from_data
@@ -262,7 +301,16 @@ class BN_interestingness_sample(object):
         #self.temp_dir = "/mnt/data"
 
     def run(self, n = 5, delta = 0.05, epsilon = 0.01, maxK = 4, disk_storage = True,
-            excluded_attrs = [], selectionCond = None):
+            excluded_attrs = [], selectionCond = None, n_jobs = 1, seed = None):
+        """Find n most interesting attribute sets.  Samples from the
+        network are drawn by random generators derived from seed, so
+        runs with the same seed give the same results (random if
+        seed is None).
+
+        n_jobs processes sample and count, but only for batches of at
+        least ParallelCounts.min_rows_per_job rows per process.  The
+        first batches of 1000 rows are smaller and are processed in
+        the calling process."""
         ### parameters
         self.batch_size = 1000 # draw this number of samples at once
         self.n = n
@@ -271,6 +319,8 @@ class BN_interestingness_sample(object):
         self.k = 1 # candidate attrset size.  used like apriori
         self.maxK = maxK # maximum attrset size
         self.disk_storage = disk_storage # should hypotheses be stored on disk (currently only distributions)
+        self.n_jobs = n_jobs # number of processes counting row shards
+        self.seed = seed # seed of all random generators
         self.debug = 1
 
         self.initialize(excluded_attrs, selectionCond)
@@ -289,49 +339,42 @@ class BN_interestingness_sample(object):
             hyp_batch = 30000 # how many hypotheses simultaneously?
             seg_begin = 0
             if self.sample_from_data:
-                it = itertools.islice(self.ds, self.batch_size)
-                sample_data = list(it)
+                if hasattr(self.ds, "next_block"):
+                    sample_data = self.ds.next_block(self.batch_size)
+                else:
+                    it = itertools.islice(self.ds, self.batch_size)
+                    sample_data = list(it)
             else:
-                self.ds.rewind()
-                sample_data = list(self.ds)
+                sample_data = None # whole dataset is counted in update_counts
             # use iterative sampler
             #it = itertools.islice(self.sampler, self.batch_size)
             #sample_bn = list(it)
             # use array sampler (warning: record Selection is ignored)
-            sample_bn = self.sampler1.draw_n_samples(self.batch_size).take(self.network_attrs_used, axis=1).tolist()
+            sample_bn = self.block_sampler.draw_n_samples(self.batch_size)
+            if self.network_attrs_used != list(range(len(self.bn))):
+                sample_bn = sample_bn.take(self.network_attrs_used, axis=1)
             
-            if self.disk_storage:
-                self.tmp_file.flush() ### needed on Windows!
-                self.tmp_file.seek(0)
             while seg_begin < len(self.A):
                 print("Counting hypotheses", seg_begin, "to", seg_begin + hyp_batch)
                 if self.disk_storage:
-                    offset = self.tmp_file.tell()
-                    hyp = []
-                    for h in self.A[seg_begin: seg_begin+hyp_batch]:
-                        fullh = h.fromfile(self.tmp_file)
-                        hyp.append(fullh)
+                    hyp = [h.load(self.store) for h in self.A[seg_begin: seg_begin+hyp_batch]]
                 else:
-                    hyp = self.A
+                    hyp = self.A[seg_begin: seg_begin+hyp_batch]
                 N = self.update_counts(hyp, sample_bn, sample_data)
-                self.compute_interestingness(hyp, delta)
-                self.compute_supports(hyp, delta)
+                batch = attr_set_batch(hyp)
+                self.compute_interestingness(hyp, batch, delta)
+                self.compute_supports(hyp, batch, delta)
                 if self.disk_storage:
-                    self.tmp_file.seek(offset) # assume hypotheses didn't change sizes
                     for i, fullh in enumerate(hyp):
                         h = self.A[seg_begin + i]
                         h.inter = fullh.inter
                         h.inter_ci = fullh.inter_ci
                         h.supp = fullh.supp
                         h.supp_ci = fullh.supp_ci
-                        h.offset = self.tmp_file.tell()
-                        fullh.tofile(self.tmp_file)
+                        self.store.update(fullh) # counts were updated in place
                         fullh.clear_data()
                 seg_begin += hyp_batch
-                self.tmp_file.flush() ### needed on Windows!
 
-            if self.disk_storage:
-                oldA = [h for h in self.A]
             #del sample_data
             #del sample_bn
             #del hyp
@@ -370,7 +413,7 @@ class BN_interestingness_sample(object):
 
             ### remove pruned/rejected attr sets from disk
             if self.disk_storage:
-                self.remove_pruned_rejected_from_disk(oldA)
+                self.remove_pruned_rejected_from_disk()
 
             ### Generate new candidates
             self.candidates_generated = False
@@ -389,21 +432,10 @@ class BN_interestingness_sample(object):
         return [(h.key, h.inter) for h in self.H]
         #return self.H
 
-    def remove_pruned_rejected_from_disk(self, oldA):
-        Adict = {}
-        for h in self.A:
-            Adict[h.key] = None
-        self.tmp_file.seek(0)
-        tmp_file2 = open(self.temp_dir + "/bprune"+str(self.niter), "w+b")
-        for h in oldA:
-            fullh = h.fromfile(self.tmp_file)
-            if h.key in Adict:
-                h.offset = tmp_file2.tell()
-                fullh.tofile(tmp_file2)
-        self.tmp_file.close()
-        os.remove(self.tmp_file.name)
-        self.tmp_file = tmp_file2
-        self.tmp_file.flush() ### needed on Windows!
+    def remove_pruned_rejected_from_disk(self):
+        """Remove counts of attribute sets no longer in A from the
+        store."""
+        self.store.retain(h.key for h in self.A)
 
     def new_batch_size(self):
         """Compute how many samples to draw now."""
@@ -416,18 +448,16 @@ class BN_interestingness_sample(object):
                 self.generate_cand = True
             return
 
-        def samples_required_inter(h1, h2, epsilon = 0.0, tmp_file = None):
+        def samples_required_inter(h1, h2, epsilon = 0.0, store = None):
             """How many samples are required (including extra margin)
             to make hypotheses i and j distinguishable by
             interestingness.
 
             a tolerance margin of epsilon is allowed."""
             # read distributions from disk if necessary
-            if tmp_file is not None:
-                tmp_file.seek(h1.offset)
-                h1 = h1.fromfile(tmp_file)
-                tmp_file.seek(h2.offset)
-                h2 = h2.fromfile(tmp_file)
+            if store is not None:
+                h1 = h1.load(store)
+                h2 = h2.load(store)
             E = (h1.inter - h2.inter + epsilon)/2
             bs1 = h1.n_samples_required_inter(E, self.delta*f(self.niter)/(3.0*len(self.H)))
             bs2 = h2.n_samples_required_inter(E, self.delta*f(self.niter)/(3.0*len(self.H)))
@@ -436,14 +466,14 @@ class BN_interestingness_sample(object):
             return bs
 
         if self.disk_storage:
-            tmp_file = self.tmp_file
+            store = self.store
         else:
-            tmp_file = None
+            store = None
         if len(self.C) == 0:
             ind = self.n + int((len(self.H) - self.n) * .75)
-            bs_reject = samples_required_inter(self.H[self.n-1], self.H[ind], tmp_file = tmp_file)
+            bs_reject = samples_required_inter(self.H[self.n-1], self.H[ind], store = store)
             print("new batch size needed to reject", bs_reject)
-            bs_accept = samples_required_inter(self.H[self.n-1], self.H[self.n], self.epsilon, tmp_file = tmp_file)
+            bs_accept = samples_required_inter(self.H[self.n-1], self.H[self.n], self.epsilon, store = store)
             print("new batch size needed to accept", bs_accept)
             new_bs = max(10000, min(bs_accept, bs_reject))
         elif len(self.C) > 0:
@@ -455,14 +485,12 @@ class BN_interestingness_sample(object):
             if Hs[ind].supp < self.H[self.n-1].inter:
                 h1 = self.H[self.n-1]
                 h2 = Hs[ind]
-                if tmp_file is not None:
-                    tmp_file.seek(h1.offset)
-                    h1 = h1.fromfile(tmp_file)
-                    tmp_file.seek(h2.offset)
-                    h2 = h2.fromfile(tmp_file)
+                if store is not None:
+                    h1 = h1.load(store)
+                    h2 = h2.load(store)
                 E = (h1.inter - h2.supp)/2
-                bs1 = h1.n_samples_required_inter(E, self.delta*f(self.niter)/(3.0*len(self.H)))#, tmp_file = tmp_file)
-                bs2 = h2.n_samples_required_supp(E, self.delta*f(self.niter)/(3.0*len(self.H)))#, tmp_file = tmp_file)
+                bs1 = h1.n_samples_required_inter(E, self.delta*f(self.niter)/(3.0*len(self.H)))
+                bs2 = h2.n_samples_required_supp(E, self.delta*f(self.niter)/(3.0*len(self.H)))
                 del Hs
                 bs = max(bs1, bs2)
                 bs = int(bs*margin) - self.minN_bn
@@ -500,12 +528,12 @@ class BN_interestingness_sample(object):
 
         # initial candidates
         if self.disk_storage:
-            self.tmp_file = open(self.temp_dir + "/bprunedata", "w+b")
+            self.store = HypothesisStore(self.domainsizes, self.temp_dir)
         for i, a in enumerate(self.ds.attrset):
             if a.name not in excluded_attrs:
                 h = attr_set((i,))
                 if self.disk_storage:
-                    h.tofile(self.tmp_file)
+                    self.store.add(h)
                     h = small_attr_set(h)
                 self.A.append(h)
                 self.C.append(h.key)
@@ -515,7 +543,10 @@ class BN_interestingness_sample(object):
         #self.counted_on_all_data = False # whether we completed counting from data
 
         #self.sampler = BayesSampler(self.bn)  # class for sampling from bayesian network
-        self.sampler1 = BayesSampler(self.bn)
+        seeds = np.random.SeedSequence(self.seed).spawn(2)
+        self.sampler1 = BayesSampler(self.bn, seeds[0])
+        self.block_sampler = ParallelSampler(self.bn, seeds[1], n_jobs = self.n_jobs,
+                                             block_size = self.sample_block_size)
         self.sampler2 = SelectionReader(self.sampler1, selectionCond)
         self.sampler3 = ProjectionReader(self.sampler2, self.network_attrs_used)
         self.sampler = self.sampler3 # class for sampling from bayesian network
@@ -533,42 +564,54 @@ class BN_interestingness_sample(object):
         if self.sample_from_data:
             print("sampling from data")
             #counts, N, missing_counts = Utils.Counts.compute_counts_array_cover(asets, self.ds, self.nattrs, domsizes, maxN = self.batch_size)
-            counts, N, missing_counts = compute_counts_array_cover(asets, sample_data, self.nattrs, domsizes, maxN = self.batch_size)
+            counts, N, missing_counts = compute_counts_array_cover(asets, sample_data, self.nattrs, domsizes, maxN = self.batch_size,
+                                                                 n_jobs = self.n_jobs)
             for h in hyp:
                 h.update_data_counts(counts[h.key], N - missing_counts[h.key])
             #self.minN_data += N
             #self.N_data += N
         else:
             if self.candidates_generated:
-                self.ds.rewind()
-                sample_data = list(self.ds)
-                counts_data, N_data, missing_counts = compute_counts_array_cover(asets, sample_data, self.nattrs, domsizes, maxN = -1)
+                if hasattr(self.ds, "as_array"):
+                    sample_data = self.ds.as_array()
+                else:
+                    self.ds.rewind()
+                    sample_data = list(self.ds)
+                counts_data, N_data, missing_counts = compute_counts_array_cover(asets, sample_data, self.nattrs, domsizes, maxN = -1,
+                                                                                n_jobs = self.n_jobs)
                 for h in hyp:
                     h.N_data = N_data - missing_counts[h.key]
                     h.counts_data = counts_data[h.key]
 
         ### count from BN
         #counts, N = Utils.Counts.compute_counts_array_cover(asets, self.sampler, self.nattrs, domsizes, maxN = self.batch_size)
-        counts, N, missing_counts = compute_counts_array_cover(asets, sample_bn, self.nattrs, domsizes, maxN = self.batch_size)
+        counts, N, missing_counts = compute_counts_array_cover(asets, sample_bn, self.nattrs, domsizes, maxN = self.batch_size,
+                                                               n_jobs = self.n_jobs)
         for h in hyp:
             h.update_model_counts(counts[h.key], N - missing_counts[h.key])
         #self.minN_bn += N
         #self.N_bn += N
         return N
 
-    def compute_interestingness(self, hyp, delta):
-        """Compute interestingness of attribute sets in hyp"""
+    def compute_interestingness(self, hyp, batch, delta):
+        """Compute interestingness of attribute sets in hyp, batch is
+        attr_set_batch(hyp)"""
         if self.debug >= 1:
             print("Computing interestingness")
-        for h in hyp:
-            h.compute_interestingness(delta*f(self.niter)/(3.0*len(self.H)))
-
-    def compute_supports(self, hyp, delta):
-        """compute supports of attribute sets in hyp."""
+        inter, inter_ci = batch.interestingness(delta*f(self.niter)/(3.0*len(self.H)))
+        for h, i, ci in zip(hyp, inter.tolist(), inter_ci.tolist()):
+            h.inter = i
+            h.inter_ci = ci
+
+    def compute_supports(self, hyp, batch, delta):
+        """compute supports of attribute sets in hyp, batch is
+        attr_set_batch(hyp)."""
         if self.debug >= 1:
             print("Computing supports")
-        for h in hyp:
-            h.compute_support(delta*f(self.niter)/(3.0*len(self.H)))
+        supp, supp_ci = batch.support(delta*f(self.niter)/(3.0*len(self.H)))
+        for h, x, ci in zip(hyp, supp.tolist(), supp_ci.tolist()):
+            h.supp = x
+            h.supp_ci = ci
 
 
     def compute_interestingness_bounds(self, n, delta, epsilon):
@@ -639,48 +682,17 @@ class BN_interestingness_sample(object):
     def generate_new_candidates(self, k):
         if self.debug >= 1:
             print("Generating new candidates")
-        def join_itemsets(joinable, newC):
-            for x in range(len(joinable)):
-                left = joinable[x]
-                for right in joinable[x+1:]:
-                    newC.append(left + (right[-1],))
-
         self.minN_bn = 0 # new candidates are not counted at all
-        newC = []
-        it = iter(self.C)
-        first = next(it)
-        joinable = [first]
-        for iset in it:
-            if first[0:self.k-1] == iset[0:self.k-1]:
-                joinable.append(iset)
-            else:
-                join_itemsets(joinable, newC)
-                first = iset
-                joinable = [iset]
-        join_itemsets(joinable, newC)
-        ### Prune new candidates with infrequent subests
-        deleted = {}
-        Cdict = {}
-        for c in self.C:
-            Cdict[c] = None
-        for c in newC:
-            for i in range(len(c) - 2):
-                cc = c[0:i]+c[i+1:]
-                if cc not in Cdict:
-                    deleted[c] = None
-                    break
-        del Cdict
-        newC = [x for x in newC if x not in deleted]
+        ### join sets in C and prune new candidates with infrequent subsets
+        newC = array_to_sets(generate_candidates(self.C, self.k))
 
         #print newC
-        if self.disk_storage:
-            self.tmp_file.seek(0, 2)
         self.C = newC
         i = 0
         for aset in newC:
             h = attr_set(aset)
             if self.disk_storage:
-                h.tofile(self.tmp_file)
+                self.store.add(h)
                 h.clear_data()
                 h = small_attr_set(h)
             self.H.append(h)
@@ -689,7 +701,6 @@ class BN_interestingness_sample(object):
             if i % 10000 == 0:
                 print(i)
 
-        self.tmp_file.flush() ### needed on Windows!
         self.k = self.k + 1
         
     ### supplementary functions
@@ -722,12 +733,7 @@ class BN_interestingness_sample(object):
             raise RuntimeError("attrset not found")
 
         if self.disk_storage:
-            tmp_file = self.tmp_file
-        else:
-            tmp_file = None
-        if tmp_file is not None:
-            tmp_file.seek(h.offset)
-            h = h.fromfile(tmp_file)
+            h = h.load(self.store)
 
         h.compute_interestingness(0.05)
         return h.inter, h.counts_data / h.N_data, h.counts_model / h.N_model
@@ -1,5 +1,5 @@
 from .AttrSet import Attr, AttrSet
-from .DelimitedFileReader import DelimitedFileReader
+from .DelimitedFileReader import DelimitedFileReader, read_delimited_columnar
 
 
 def read_arff_attrset(arfffile):
@@ -52,6 +52,21 @@ def create_arff_reader(arfffile):
     dfr.relname = aset.name
     return dfr
 
+def load_arff_columnar(arfffile, chunk_size = 1 << 24):
+    """Read a whole ARFF file with categorical attributes into a
+    ColumnarReader in one pass."""
+    if isinstance(arfffile, str):
+        f = open(arfffile, "r")
+    else:
+        f = arfffile
+    aset, offset = read_arff_attrset(f)
+    cr = read_delimited_columnar(aset, f, offset, strip = "'", chunk_size = chunk_size)
+    if isinstance(arfffile, str):
+        f.close()
+        cr.filename = arfffile
+    cr.relname = aset.name
+    return cr
+
 if __name__ == "__main__":
     fname = "data/iris.arff"
     aset, offset = read_arff_attrset(fname)
@@ -0,0 +1,180 @@
+"""Binary cache files for parsed datasets.
+
+A cache file holds a JSON header describing the attribute set
+followed by the integer code array of a ColumnarReader, one packed
+column per attribute.  The header also records size, modification
+time and SHA1 hash of the source file; the cache is used only if they
+still match.  If only the modification time changed, the recorded one
+is updated in place so the hash isn't computed again.  Cached data is
+reopened with np.memmap, so loading is almost instant and datasets
+larger than memory are read column by column from the page cache."""
+
+import hashlib
+import json
+import os
+
+import numpy as np
+
+from .AttrSet import Attr, AttrSet
+from .ColumnarReader import ColumnarReader
+from .ArffFileReader import load_arff_columnar
+
+
+magic = b"BNINTER-COLUMNS\n"
+cache_version = 1
+data_alignment = 64
+header_slack = 32 # spaces after the header, room for updating it in place
+cache_suffix = ".bncache"
+
+
+def file_key(fname):
+    """Return a dictionary identifying the contents of file fname."""
+    st = os.stat(fname)
+    return {"size": st.st_size, "mtime": st.st_mtime_ns, "sha1": file_hash(fname)}
+
+def file_hash(fname, block_size = 1 << 20):
+    h = hashlib.sha1()
+    with open(fname, "rb") as f:
+        while True:
+            block = f.read(block_size)
+            if not block:
+                break
+            h.update(block)
+    return h.hexdigest()
+
+def source_matches(key, fname):
+    """Check whether file fname is the one described by key.  The hash
+    is computed only if the size matches but mtime differs."""
+    st = os.stat(fname)
+    if st.st_size != key["size"]:
+        return False
+    if st.st_mtime_ns == key["mtime"]:
+        return True
+    return file_hash(fname) == key["sha1"]
+
+
+def write_binary_cache(reader, cachefile, source = None):
+    """Write the dataset in ColumnarReader reader to cachefile.
+
+    source - name of the file the data was read from, its key is
+             stored in the header"""
+    data = reader.as_array()
+    header = {"version": cache_version,
+              "relname": getattr(reader, "relname", ""),
+              "attrs": [{"name": a.name, "type": a.type, "domain": a.domain}
+                        for a in reader.get_attr_set()],
+              "dtype": data.dtype.str,
+              "nrows": data.shape[0],
+              "source": file_key(source) if source is not None else None}
+    hbytes = json.dumps(header).encode("utf-8") + b" " * header_slack
+    offset = len(magic) + 8 + len(hbytes)
+    offset += -offset % data_alignment
+    tmpfile = cachefile + ".tmp" + str(os.getpid())
+    try:
+        with open(tmpfile, "wb") as f:
+            f.write(magic)
+            f.write(len(hbytes).to_bytes(8, "little"))
+            f.write(hbytes)
+            f.write(b"\0" * (offset - f.tell()))
+            # column major order: each attribute is a contiguous block
+            for i in range(data.shape[1]):
+                f.write(np.ascontiguousarray(data[:, i]).tobytes())
+        os.replace(tmpfile, cachefile)
+    finally:
+        if os.path.exists(tmpfile):
+            os.remove(tmpfile)
+
+def read_cache_header(cachefile):
+    """Return the header of cachefile and the offset of data."""
+    with open(cachefile, "rb") as f:
+        if f.read(len(magic)) != magic:
+            raise RuntimeError("not a dataset cache file: " + cachefile)
+        hlen = int.from_bytes(f.read(8), "little")
+        header = json.loads(f.read(hlen).decode("utf-8"))
+    if header.get("version") != cache_version:
+        raise RuntimeError("unsupported cache file version: " + cachefile)
+    offset = len(magic) + 8 + hlen
+    offset += -offset % data_alignment
+    return header, offset
+
+def update_cache_mtime(cachefile, header, offset, mtime):
+    """Record mtime as the modification time of the source file in
+    the header of cachefile.  Returns False if the new header doesn't
+    fit before the data."""
+    header = dict(header, source = dict(header["source"], mtime = mtime))
+    hbytes = json.dumps(header).encode("utf-8")
+    if len(magic) + 8 + len(hbytes) > offset:
+        return False
+    with open(cachefile, "r+b") as f:
+        f.seek(len(magic))
+        # the header keeps its length, data stays at offset
+        hlen = int.from_bytes(f.read(8), "little")
+        if len(hbytes) > hlen:
+            f.seek(len(magic))
+            f.write(len(hbytes).to_bytes(8, "little"))
+            hlen = len(hbytes)
+        f.write(hbytes + b" " * (hlen - len(hbytes)))
+    return True
+
+def open_binary_cache(cachefile, source = None):
+    """Open a dataset cache file as a memory mapped ColumnarReader.
+
+    If source is given and does not match the file recorded in the
+    header, None is returned."""
+    header, offset = read_cache_header(cachefile)
+    if source is not None:
+        if header["source"] is None or not source_matches(header["source"], source):
+            return None
+        mtime = os.stat(source).st_mtime_ns
+        if mtime != header["source"]["mtime"]:
+            try:
+                update_cache_mtime(cachefile, header, offset, mtime)
+            except OSError as e:
+                print("could not update cache file", cachefile + ":", e)
+    aset = AttrSet(header["relname"], [Attr(a["name"], a["type"], a["domain"])
+                                       for a in header["attrs"]])
+    shape = (header["nrows"], len(aset))
+    dtype = np.dtype(header["dtype"])
+    if shape[0] * shape[1] == 0:
+        data = np.empty(shape, dtype = dtype, order = "F")
+    else:
+        data = np.memmap(cachefile, dtype = dtype, mode = "r", offset = offset,
+                         shape = shape, order = "F")
+    cr = ColumnarReader(aset, data, source if source is not None else cachefile)
+    cr.relname = header["relname"]
+    return cr
+
+
+def load_arff_cached(arfffile, cachefile = None):
+    """Load an ARFF file using a binary cache.
+
+    The cache file (by default arfffile with suffix .bncache) is
+    used if it matches the ARFF file, otherwise the ARFF file is
+    parsed and the cache is (re)written.  Failure to write the cache
+    is not an error."""
+    if cachefile is None:
+        cachefile = arfffile + cache_suffix
+    if os.path.exists(cachefile):
+        try:
+            cr = open_binary_cache(cachefile, arfffile)
+        except (RuntimeError, ValueError, KeyError, OSError) as e:
+            print("ignoring cache file", cachefile + ":", e)
+            cr = None
+        if cr is not None:
+            return cr
+    cr = load_arff_columnar(arfffile)
+    try:
+        write_binary_cache(cr, cachefile, arfffile)
+    except OSError as e:
+        print("could not write cache file", cachefile + ":", e)
+    return cr
+
+
+if __name__ == "__main__":
+    import sys
+    import time
+    fname = sys.argv[1] if len(sys.argv) > 1 else "data/ksl_discr.arff"
+    for i in range(2):
+        t1 = time.time()
+        ds = load_arff_cached(fname)
+        print(len(ds), "records loaded in", time.time() - t1, "s")
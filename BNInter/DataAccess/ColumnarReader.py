@@ -0,0 +1,122 @@
+"""Datasets stored in memory as columns of small integer codes."""
+
+import itertools
+
+import numpy as np
+
+from .AttrSet import Attr, AttrSet
+from .RecordReader import RecordReader
+
+
+def code_dtype(domainsizes):
+    """Return the smallest unsigned integer type able to hold codes of
+    all domains.  The largest value of the type is reserved for the
+    missing value sentinel."""
+    maxd = max(domainsizes, default = 0)
+    for dt in (np.uint8, np.uint16, np.uint32):
+        if maxd < np.iinfo(dt).max:
+            return np.dtype(dt)
+    raise RuntimeError("domain too large")
+
+
+class ColumnarReader(RecordReader):
+    """A categorical dataset held in memory.
+
+    Values are stored as positions in attribute domains in a single
+    column major array so each attribute occupies a contiguous block
+    of memory.  The element type is the smallest unsigned integer
+    type which fits all domains (usually uint8).  Missing values are
+    coded as missing_code, the largest value of the type.
+
+    Iteration returns records as lists with None for missing values,
+    just like other readers.  as_array() gives the code array
+    itself, which is used by the counting routines."""
+    def __init__(self, attrset, data, filename = "Unknown"):
+        """attrset - set of attributes, all must be categorical
+        data - integer code array of shape (N, len(attrset)) with
+               missing values coded as missing_code of its type"""
+        super(ColumnarReader, self).__init__(attrset)
+        for a in self.attrset:
+            if a.type != "CATEG":
+                raise RuntimeError("ColumnarReader: attribute " + a.name + " is not categorical")
+        if data.ndim != 2 or data.shape[1] != len(self.attrset):
+            raise RuntimeError("ColumnarReader: data shape does not match attributes")
+        self.data = data
+        self.missing_code = np.iinfo(self.data.dtype).max
+        self.filename = filename
+        self.block_size = 4096 # records converted to lists at once
+        self.rewind()
+
+    def rewind(self):
+        self.pos = 0 # first row not yet converted
+        self.buf = []
+        self.buf_pos = 0
+
+    def __len__(self):
+        return self.data.shape[0]
+
+    def __next__(self):
+        if self.buf_pos >= len(self.buf):
+            if self.pos >= len(self):
+                raise StopIteration
+            block = self.data[self.pos:self.pos + self.block_size]
+            self.pos += block.shape[0]
+            self.buf = block.tolist()
+            self.buf_pos = 0
+            m = self.missing_code
+            if (block == m).any():
+                self.buf = [[None if v == m else v for v in row] for row in self.buf]
+        row = self.buf[self.buf_pos]
+        self.buf_pos += 1
+        return row
+    next = __next__
+
+    def next_block(self, n):
+        """Return the next n (or fewer at the end) records as a code
+        array and advance past them."""
+        start = self.pos - (len(self.buf) - self.buf_pos)
+        block = self.data[start:start + n]
+        self.pos = start + block.shape[0]
+        self.buf = []
+        self.buf_pos = 0
+        return block
+
+    def as_array(self):
+        """Return the (N, nattrs) code array without copying."""
+        return self.data
+
+    def column(self, attrno):
+        """Return codes of a single attribute (a contiguous view)."""
+        return self.data[:, attrno]
+
+
+def create_columnar_reader(reader, block_size = 65536):
+    """Read all records of reader into a ColumnarReader."""
+    aset = reader.get_attr_set()
+    domainsizes = [len(a.domain) for a in aset]
+    dtype = code_dtype(domainsizes)
+    missing = np.iinfo(dtype).max
+    reader.rewind()
+    it = iter(reader)
+    columns = [[] for a in aset]
+    while True:
+        block = list(itertools.islice(it, block_size))
+        if len(block) == 0:
+            break
+        for i, col in enumerate(zip(*block)):
+            columns[i].append(np.fromiter((missing if v is None else v for v in col),
+                                          dtype, len(block)))
+    N = sum(len(b) for b in columns[0]) if len(columns) > 0 else 0
+    data = np.empty((N, len(aset)), dtype = dtype, order = "F")
+    for i, blocks in enumerate(columns):
+        if N > 0:
+            data[:, i] = np.concatenate(blocks)
+    return ColumnarReader(aset, data, getattr(reader, "filename", "Unknown"))
+
+
+if __name__ == "__main__":
+    aset = AttrSet("list", [Attr("a1", "CATEG", ["x", "y"]), Attr("a2", "CATEG", ["u", "v", "w"])])
+    cr = ColumnarReader(aset, np.array([[0, 2], [1, 255], [1, 0]], dtype = np.uint8, order = "F"))
+    for r in cr:
+        print(cr.str_record(r))
+    print(cr.as_array())
@@ -3,13 +3,18 @@
 
 from .AttrSet import Attr, AttrSet
 from .RecordReader import RecordReader
-from .DelimitedFileReader import DelimitedFileReader
-from .ArffFileReader import read_arff_attrset, create_arff_reader
+from .DelimitedFileReader import DelimitedFileReader, read_delimited_columnar
+from .ArffFileReader import read_arff_attrset, create_arff_reader, load_arff_columnar
 from .ArffFileWriter import make_arff_header
 from .ListOfRecordsReader import ListOfRecordsReader
 from .ProjectionReader import ProjectionReader
 from .SelectionReader import SelectionReader
+from .ColumnarReader import ColumnarReader, create_columnar_reader
+from .BinaryCache import write_binary_cache, open_binary_cache, load_arff_cached
 
 __all__ = (Attr, AttrSet, RecordReader, DelimitedFileReader,
-           read_arff_attrset, create_arff_reader, make_arff_header,
-           ListOfRecordsReader, ProjectionReader, SelectionReader)
+           read_delimited_columnar, read_arff_attrset, create_arff_reader,
+           load_arff_columnar, make_arff_header,
+           ListOfRecordsReader, ProjectionReader, SelectionReader,
+           ColumnarReader, create_columnar_reader,
+           write_binary_cache, open_binary_cache, load_arff_cached)
@@ -0,0 +1,123 @@
+"""Memory bounded cache of numpy arrays.
+
+Sizes of entries are taken from ndarray.nbytes.  When the total size
+exceeds the budget, entries are evicted using the GreedyDual-Size
+policy: each entry has a priority L + cost / size, where cost is the
+cost of recomputing the entry and L is the priority of the last
+evicted entry.  A hit renews the priority of an entry.  The entry
+with the lowest priority is evicted first, so small entries which are
+expensive to recompute are kept longest.  If costs are not given they
+are taken to be equal to sizes, and the policy becomes LRU."""
+
+import heapq
+import itertools
+
+
+class ArrayCache(object):
+    """Dictionary like cache of numpy arrays with a budget on their
+    total size in bytes.
+
+    hits and misses count lookups through get() and [], evictions
+    counts entries removed to stay within the budget."""
+    def __init__(self, max_bytes = 100000000, max_item_bytes = None):
+        """max_bytes - budget on the total size of cached arrays
+        max_item_bytes - larger arrays are not cached (defaults to
+        max_bytes)"""
+        self.max_bytes = max_bytes
+        if max_item_bytes is None:
+            max_item_bytes = max_bytes
+        self.max_item_bytes = max_item_bytes
+        self.entries = {} # key -> (array, cost, heap item)
+        self.heap = [] # (priority, counter, key), stale items skipped
+        self.counter = itertools.count()
+        self.L = 0.0 # inflation value
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self.entries)
+    def __contains__(self, key):
+        return key in self.entries
+    def __iter__(self):
+        return iter(self.entries)
+    def keys(self):
+        return self.entries.keys()
+
+    def __priority(self, array, cost):
+        return self.L + float(cost) / max(array.nbytes, 1)
+    def __touch(self, key, array, cost):
+        # ties are broken by the counter, i.e. least recently used first
+        item = (self.__priority(array, cost), next(self.counter), key)
+        self.entries[key] = (array, cost, item)
+        heapq.heappush(self.heap, item)
+        # drop stale heap items if they accumulate
+        if len(self.heap) > 4 * len(self.entries) + 64:
+            self.heap = [e[2] for e in self.entries.values()]
+            heapq.heapify(self.heap)
+
+    def get(self, key, default = None):
+        """Return the cached array, or default if key is not cached."""
+        if key not in self.entries:
+            self.misses += 1
+            return default
+        self.hits += 1
+        array, cost, item = self.entries[key]
+        self.__touch(key, array, cost)
+        return array
+
+    def __getitem__(self, key):
+        array = self.get(key)
+        if array is None:
+            raise KeyError(key)
+        return array
+
+    def put(self, key, array, cost = None):
+        """Insert array with given recompute cost (defaults to its
+        size).  Returns False if the array is too large to be cached."""
+        if key in self.entries:
+            self.__delitem__(key)
+        if array.nbytes > self.max_item_bytes:
+            return False
+        if cost is None:
+            cost = array.nbytes
+        self.nbytes += array.nbytes
+        self.__touch(key, array, cost)
+        self.evict()
+        return key in self.entries
+
+    def __setitem__(self, key, array):
+        self.put(key, array)
+
+    def __delitem__(self, key):
+        array, cost, item = self.entries.pop(key)
+        self.nbytes -= array.nbytes
+
+    def evict(self):
+        """Evict entries with lowest priorities until the cache fits
+        within its budget."""
+        while self.nbytes > self.max_bytes and len(self.heap) > 0:
+            item = heapq.heappop(self.heap)
+            key = item[2]
+            if key not in self.entries or self.entries[key][2] is not item:
+                continue # stale heap item
+            self.L = item[0]
+            self.__delitem__(key)
+            self.evictions += 1
+
+    def clear(self):
+        self.entries.clear()
+        self.heap = []
+        self.L = 0.0
+        self.nbytes = 0
+
+    def stats(self):
+        """Dictionary of cache statistics."""
+        return {"entries": len(self.entries), "nbytes": self.nbytes,
+                "hits": self.hits, "misses": self.misses,
+                "evictions": self.evictions}
+
+    def __str__(self):
+        return "%d arrays, %d bytes, %d hits, %d misses, %d evictions" % \
+            (len(self.entries), self.nbytes, self.hits, self.misses, self.evictions)
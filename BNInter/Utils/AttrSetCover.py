@@ -1,6 +1,6 @@
 import itertools
 
-from .SEtree import SEtree
+from .SEtree import FlatSEtree
 
 def compute_gain(s, setree, included_sets, query_cost_function, marginalization_cost_function):
     gain = -query_cost_function(s)
@@ -32,9 +32,7 @@ def AttrSetCover(U, sets, query_cost_function, marginalization_cost_function, me
     covers = {}
     tot_gain = 0
     #print("creating SEtree")
-    setree = SEtree()
-    for s in sets:
-        setree[s] = None
+    setree = FlatSEtree(sorted(dict.fromkeys(tuple(s) for s in sets)))
     while len(setree) > 0:
         seed = setree.popitem()[0]
         setree[seed] = None
@@ -0,0 +1,117 @@
+"""Vertical bitmap index of attribute value occurrences.
+
+For each attribute and each value in its domain the index stores a
+bitset of rows in which the attribute takes this value, packed into
+uint64 words.  Support of a cell of an attribute set is the popcount
+of the AND of the bitsets of its values, so counts can be obtained
+without rescanning the data, e.g. in depth first (Eclat style) mining
+or when drilling down to individual cells."""
+
+import numpy as np
+
+from .Counts import code_array, count_array
+
+
+if hasattr(np, "bitwise_count"):
+    def popcount(words):
+        """Number of set bits in an array of uint64 words."""
+        return int(np.bitwise_count(words).sum())
+else:
+    _byte_popcounts = np.array([bin(i).count("1") for i in range(256)], dtype = np.uint8)
+    def popcount(words):
+        """Number of set bits in an array of uint64 words."""
+        return int(_byte_popcounts[words.view(np.uint8)].sum(dtype = np.int64))
+
+def pack_rows(mask):
+    """Pack a boolean row mask into a bitset of uint64 words."""
+    nwords = -(-len(mask) // 64)
+    packed = np.zeros(nwords * 8, dtype = np.uint8)
+    packed[:-(-len(mask) // 8)] = np.packbits(mask, bitorder = "little")
+    return packed.view(np.uint64)
+
+def unpack_rows(bitset, nrows):
+    """Return row numbers of set bits in bitset."""
+    return np.flatnonzero(np.unpackbits(bitset.view(np.uint8), count = nrows,
+                                        bitorder = "little"))
+
+
+class BitmapIndex(object):
+    """Bitmap index of an integer coded dataset.
+
+    bits[a] is a (domainsize, nwords) array, row v holding the bitset
+    of rows where attribute a has value v.  Rows with a missing value
+    of a are not in any of its bitsets."""
+    def __init__(self, data, domainsizes):
+        """data - integer coded 2-D array or reader providing one
+        through as_array() (codes outside domains are missing)
+        domainsizes - sizes of attribute domains"""
+        data = code_array(data)
+        if data is None:
+            raise RuntimeError("BitmapIndex: integer coded data required")
+        self.N = data.shape[0]
+        self.domainsizes = list(domainsizes)
+        self.nwords = -(-self.N // 64)
+        self.bits = []
+        for a, d in enumerate(self.domainsizes):
+            col = data[:, a]
+            abits = np.empty((d, self.nwords), dtype = np.uint64)
+            for v in range(d):
+                abits[v] = pack_rows(col == v)
+            self.bits.append(abits)
+        self.all_rows = pack_rows(np.ones(self.N, dtype = bool))
+
+    def nbytes(self):
+        return sum(b.nbytes for b in self.bits)
+
+    def rows(self, aset, values):
+        """Bitset of rows where attributes in aset take values."""
+        bitset = self.all_rows
+        for a, v in zip(aset, values):
+            bitset = bitset & self.bits[a][v]
+        return bitset
+
+    def support(self, aset, values):
+        """Number of rows where attributes in aset take values."""
+        if len(aset) == 0:
+            return self.N
+        return popcount(self.rows(aset, values))
+
+    def counts(self, aset):
+        """Contingency table of aset (axes in aset order) and the
+        number of rows with a missing value of some attribute in
+        aset.  Cells are enumerated depth first reusing ANDs of
+        common prefixes."""
+        aset = tuple(aset)
+        distr = np.zeros([self.domainsizes[a] for a in aset], dtype = np.int64)
+        def fill(i, bitset, cell):
+            a = aset[i]
+            for v in range(self.domainsizes[a]):
+                b = bitset & self.bits[a][v]
+                if i == len(aset) - 1:
+                    distr[cell + (v,)] = popcount(b)
+                elif b.any():
+                    fill(i + 1, b, cell + (v,))
+        if len(aset) == 0:
+            distr[()] = self.N
+        else:
+            fill(0, self.all_rows, ())
+        return distr, self.N - int(distr.sum())
+
+    def compute_counts(self, asets):
+        """Counts for a collection of attribute sets, returned like by
+        Counts.compute_counts_array_cover."""
+        counts = {}
+        missing_counts = {}
+        for aset in asets:
+            aset = tuple(aset)
+            distr, missing_counts[aset] = self.counts(aset)
+            counts[aset] = count_array(distr, self.N)
+        return counts, self.N, missing_counts
+
+
+if __name__ == "__main__":
+    X = np.array([[0, 1], [1, 1], [0, 255], [0, 0]], dtype = np.uint8)
+    bi = BitmapIndex(X, [2, 2])
+    print(bi.support((0, 1), (0, 1)))
+    print(bi.counts((0, 1)))
+    print(unpack_rows(bi.rows((0,), (0,)), bi.N))
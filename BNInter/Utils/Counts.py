@@ -2,6 +2,7 @@
 
 
 import itertools
+import math
 import sys
 import time
 
@@ -9,14 +10,45 @@ import numpy as np
 
 from .AttrSetCover import AttrSetCover
 
+
+def count_dtype(N):
+    """Narrowest integer dtype used for counts over at most N rows:
+    uint32, or uint64 if N doesn't fit in it."""
+    if N <= np.iinfo(np.uint32).max:
+        return np.dtype(np.uint32)
+    return np.dtype(np.uint64)
+
+def count_array(distr, N):
+    """Return counts distr over at most N rows as a new array of
+    count_dtype(N)."""
+    return np.array(distr, dtype = count_dtype(N))
+
+def add_counts(counts, distr, N):
+    """Add distr to the count array counts in place, N is the number
+    of rows counted after adding.  Returns counts, or a copy widened
+    to count_dtype(N) if its dtype could overflow."""
+    dtype = count_dtype(N)
+    if dtype.itemsize > counts.dtype.itemsize:
+        counts = counts.astype(dtype)
+    np.add(counts, distr, out = counts, casting = "unsafe")
+    return counts
+
 def dict_to_numpy(shape, distr):
     """Convert a dictionary counts for an attribute set to a numpy
     counts."""
-    ndistr = np.zeros(shape)
+    ndistr = np.zeros(shape, dtype = count_dtype(sum(distr.values())))
     for values, P in distr.items():
         ndistr[values] = P
     return ndistr
 
+def numpy_to_dict(distr):
+    """Convert numpy counts for an attribute set to a dictionary
+    containing the nonzero cells."""
+    if distr.ndim == 0:
+        return {(): int(distr)} if distr > 0 else {}
+    return {tuple(int(v) for v in values): int(distr[values])
+            for values in zip(*np.nonzero(distr))}
+
 def compute_counts_dict(asets, database, maxN = -1):
     """Compute counts for attribute sets in asets based on database.
 
@@ -25,7 +57,20 @@ def compute_counts_dict(asets, database, maxN = -1):
     returned as a dictionary of dictionaries.  The missing counts are
     returned as a dictionary containing number of missing values for
     each aset.  'None' in a database record is treated as missing
-    value."""
+    value.
+
+    If database is an integer coded 2-D numpy array, negative codes
+    and the largest value of its type (the missing value code of
+    ColumnarReader) are treated as missing values and counting is
+    vectorized.  The same happens for readers providing as_array(),
+    where all codes outside attribute domains are missing values."""
+
+    data = code_array(database)
+    if data is not None:
+        domainsizes = None
+        if not isinstance(database, np.ndarray):
+            domainsizes = [len(a.domain) for a in database.get_attr_set()]
+        return _compute_counts_dict_numpy(asets, data, maxN, domainsizes)
 
     #initialization of helper arrays/dicts
     counts_helper = [(tuple(aset), {}) for aset in asets]
@@ -68,6 +113,10 @@ def compute_counts_array(asets, domainsizes, database, maxN = -1):
 
     Returns a tuple with counts and number of rows in database.
     The coutns are returned as a dictionary of numpy arrays."""
+    data = code_array(database)
+    if data is not None:
+        return compute_counts_numpy(asets, data, domainsizes, maxN,
+                                    use_cover = False)
     counts, N, missing_counts = compute_counts_dict(asets, database, maxN)
     ncounts = convert_counts_dicts2numpyarrays(domainsizes, counts)
     return ncounts, N, missing_counts
@@ -101,16 +150,280 @@ class cost_functions(object):
         #return (len(set)-len(subset)+1)*min(self.N, 2**len(set)) # FIX: use correct attribute domain sizes, not 2
 
 
-def compute_counts_array_cover(asets, database, nattrs, domainsizes, maxN = -1):
+### vectorized counting on integer coded numpy arrays
+
+# covers with contingency tables larger than this (in cells) are not
+# materialized, their subsets are counted directly from data
+max_cover_table_size = 2**24
+
+def code_array(database):
+    """Return the integer coded 2-D array behind database or None if
+    database is not array based.
+
+    Accepts numpy arrays and readers providing as_array() (like
+    DataAccess.ColumnarReader)."""
+    if isinstance(database, np.ndarray):
+        return database
+    if hasattr(database, "as_array"):
+        return database.as_array()
+    return None
+
+def _missing_mask(col, domsize):
+    """Rows of an integer coded column holding a missing value, that
+    is a code outside of [0, domsize)."""
+    return (col < 0) | (col >= domsize)
+
+def count_table(data, attrs, domainsizes, has_missing):
+    """Compute the contingency table of attributes attrs in data.
+
+    data is an integer coded 2-D numpy array with a column for each
+    attribute.  Axes of attributes for which has_missing is true get
+    an extra last cell counting rows where the attribute is missing.
+    The table is computed with a single bincount over mixed radix
+    indices of the cells."""
+    if len(attrs) == 0:
+        return np.array(data.shape[0])
+    shape = tuple(domainsizes[a] + int(has_missing[a]) for a in attrs)
+    codes = []
+    for a in attrs:
+        col = data[:, a]
+        if has_missing[a]:
+            col = np.where(_missing_mask(col, domainsizes[a]), domainsizes[a], col)
+        codes.append(col.astype(np.intp, copy = False))
+    idx = np.ravel_multi_index(tuple(codes), shape)
+    size = math.prod(shape)
+    return np.bincount(idx, minlength = size).reshape(shape)
+
+def marginalize_table(table, attrs, aset, domainsizes):
+    """Marginalize a contingency table over attrs (as returned by
+    count_table) onto aset.
+
+    Returns the counts for aset (with axes in the order of aset) and
+    the number of rows in which some attribute in aset is missing."""
+    attrs = list(attrs)
+    axes = tuple(i for i, a in enumerate(attrs) if a not in aset)
+    sub = np.sum(table, axis = axes)
+    kept = [a for a in attrs if a in aset]
+    sub = np.transpose(sub, [kept.index(a) for a in aset])
+    distr = sub[tuple(slice(0, domainsizes[a]) for a in aset)]
+    return distr, int(sub.sum() - distr.sum())
+
+def _count_plan(asets, nattrs, domainsizes, N, has_missing, use_cover = True):
+    """Decide which contingency tables to build.
+
+    Returns a list of pairs (attrs, covered_sets): the table over
+    attrs is computed and all attribute sets in covered_sets are
+    marginalized from it.  Covers whose tables would exceed
+    max_cover_table_size cells are replaced by their subsets."""
+    if use_cover:
+        cf = cost_functions(domainsizes, N)
+        cover, covered, covers, gain = AttrSetCover(range(nattrs), asets,
+                                                    cf.query_cost, cf.marginalization_cost)
+        del cover, covered
+    else:
+        covers = {aset: [aset] for aset in asets}
+    plan = []
+    for c, covered_sets in covers.items():
+        shape = [domainsizes[a] + int(has_missing[a]) for a in c]
+        if math.prod(shape) > max_cover_table_size:
+            # cover too large to materialize, count subsets directly
+            plan.extend((aset, [aset]) for aset in covered_sets)
+        else:
+            plan.append((c, covered_sets))
+    return plan
+
+def compute_counts_numpy(asets, data, domainsizes, maxN = -1, use_cover = True,
+                         n_jobs = 1, parallel = "rows"):
+    """Compute counts for attribute sets in asets based on an integer
+    coded 2-D numpy array data.
+
+    Returns the same tuple as compute_counts_array_cover: counts as a
+    dictionary of numpy arrays, the number of rows and a dictionary of
+    missing counts.  Codes outside of the attribute's domain
+    (e.g. -1) are treated as missing values.
+
+    If use_cover is true, attribute sets are grouped into covering
+    supersets (see AttrSetCover), the contingency table of each cover
+    is computed with one bincount and the subsets are obtained by
+    summing over axes.  Otherwise each attribute set is counted
+    directly.
+
+    If n_jobs is not 1, counting is done by a pool of n_jobs worker
+    processes (all CPUs if n_jobs < 1), see ParallelCounts.  If
+    parallel is "rows" the rows are split into shards, if it is
+    "covers" the covering sets are distributed among workers."""
+    if data.ndim != 2:
+        raise RuntimeError("Counts: data must be a 2-D array")
+    N = data.shape[0] if maxN < 0 else min(maxN, data.shape[0])
+    nattrs = data.shape[1]
+    asets = [tuple(aset) for aset in asets]
+    has_missing = [bool(_missing_mask(data[:N, a], domainsizes[a]).any())
+                   for a in range(nattrs)]
+
+    plan = _count_plan(asets, nattrs, domainsizes, N, has_missing, use_cover)
+    if n_jobs != 1 and parallel == "covers":
+        from .ParallelCounts import count_covers_parallel
+        cf = cost_functions(domainsizes, N)
+        costs = [cf.query_cost(attrs) + sum(cf.marginalization_cost(attrs, aset)
+                                            for aset in covered_sets)
+                 for attrs, covered_sets in plan]
+        counts = {}
+        missing_counts = {}
+        for aset, distr, missing in count_covers_parallel(data, plan, costs, domainsizes,
+                                                          has_missing, n_jobs, N):
+            counts[aset] = count_array(distr, N)
+            missing_counts[aset] = missing
+        return counts, N, missing_counts
+    if parallel not in ("rows", "covers"):
+        raise RuntimeError("Counts: unknown parallel mode " + str(parallel))
+    if n_jobs != 1:
+        from .ParallelCounts import count_tables_parallel
+        tables = count_tables_parallel(data, [attrs for attrs, covered_sets in plan],
+                                       domainsizes, has_missing, n_jobs, N)
+    else:
+        tables = (count_table(data[:N], attrs, domainsizes, has_missing)
+                  for attrs, covered_sets in plan)
+    counts = {}
+    missing_counts = {}
+    for (attrs, covered_sets), table in zip(plan, tables):
+        for aset in covered_sets:
+            counts[aset], missing_counts[aset] = marginalize_table(table, attrs, aset, domainsizes)
+    for aset in counts:
+        counts[aset] = count_array(counts[aset], N)
+    return counts, N, missing_counts
+
+def iter_code_blocks(database, block_size, maxN = -1):
+    """Iterate over database in blocks of at most block_size rows,
+    each given as an integer coded 2-D numpy array.
+
+    Array based databases are sliced without copying, records of other
+    readers are converted block by block with None coded as -1."""
+    data = code_array(database)
+    if data is not None:
+        N = data.shape[0] if maxN < 0 else min(maxN, data.shape[0])
+        for start in range(0, N, block_size):
+            yield data[start:min(start + block_size, N)]
+        return
+    if maxN >= 0:
+        it = itertools.islice(iter(database), maxN)
+    else:
+        it = iter(database)
+    while True:
+        block = list(itertools.islice(it, block_size))
+        if len(block) == 0:
+            break
+        yield np.array([[-1 if v is None else v for v in row] for row in block],
+                       dtype = np.int32)
+
+def records_to_codes(database, nattrs, maxN = -1):
+    """Convert records of database to an integer coded 2-D array,
+    None is coded as -1."""
+    blocks = list(iter_code_blocks(database, 65536, maxN))
+    if len(blocks) == 0:
+        return np.empty((0, nattrs), dtype = np.int32)
+    return np.concatenate(blocks)
+
+def compute_counts_streaming(asets, database, domainsizes, block_size = 65536,
+                             maxN = -1, use_cover = True):
+    """Compute counts for attribute sets in asets in a single pass
+    over database, reading block_size rows at a time.
+
+    database may be any record reader, list of records or integer
+    coded array.  Contingency tables of covering sets are accumulated
+    over blocks, so memory use is bounded by the block size and the
+    sizes of the tables, not by the number of rows.  Since it is not
+    known in advance which attributes have missing values, all tables
+    have a missing value cell on every axis.  Returns the same tuple
+    as compute_counts_numpy."""
+    asets = [tuple(aset) for aset in asets]
+    nattrs = len(domainsizes)
+    has_missing = [True] * nattrs
+    blocks = iter_code_blocks(database, block_size, maxN)
+    first = next(blocks, None)
+    try:
+        N = len(database)
+    except TypeError:
+        # unknown length, the first block gives a lower bound
+        N = first.shape[0] if first is not None else 0
+    if maxN >= 0:
+        N = min(N, maxN)
+    plan = _count_plan(asets, nattrs, domainsizes, N, has_missing, use_cover)
+    tables = [None] * len(plan)
+    N = 0
+    for block in itertools.chain([first] if first is not None else [], blocks):
+        N += block.shape[0]
+        for i, (attrs, covered_sets) in enumerate(plan):
+            table = count_table(block, attrs, domainsizes, has_missing)
+            if tables[i] is None:
+                tables[i] = table
+            else:
+                tables[i] += table
+        sys.stdout.write(".")
+        sys.stdout.flush()
+    print()
+    counts = {}
+    missing_counts = {}
+    for (attrs, covered_sets), table in zip(plan, tables):
+        if table is None:
+            shape = tuple(domainsizes[a] + 1 for a in attrs)
+            table = np.zeros(shape, dtype = np.intp)
+        for aset in covered_sets:
+            distr, missing_counts[aset] = marginalize_table(table, attrs, aset, domainsizes)
+            counts[aset] = count_array(distr, N)
+    return counts, N, missing_counts
+
+def _compute_counts_dict_numpy(asets, data, maxN = -1, domainsizes = None):
+    """compute_counts_dict for integer coded numpy arrays.  Codes
+    outside of [0, domainsizes) are treated as missing values.  If
+    domainsizes is not given, negative codes and the largest value of
+    the type of data are."""
+    if maxN >= 0:
+        data = data[:maxN]
+    N = data.shape[0]
+    counts = {}
+    missing_counts = {}
+    for aset in asets:
+        aset = tuple(aset)
+        sub = data[:, list(aset)]
+        if domainsizes is None:
+            present = ((sub >= 0) & (sub != np.iinfo(sub.dtype).max)).all(axis = 1)
+        else:
+            present = ((sub >= 0) & (sub < [domainsizes[a] for a in aset])).all(axis = 1)
+        values, cnts = np.unique(sub[present], axis = 0, return_counts = True)
+        counts[aset] = {tuple(int(v) for v in vals): int(cnt)
+                        for vals, cnt in zip(values, cnts)}
+        missing_counts[aset] = int(N - present.sum())
+    return counts, N, missing_counts
+
+
+def compute_counts_array_cover(asets, database, nattrs, domainsizes, maxN = -1,
+                               block_size = None, n_jobs = 1, parallel = "rows"):
     """Compute counts for attribute sets in asets based on database.
 
     Returns a tuple with counts, number of rows in database and the
     number of missing values for each attribute set.  The coutns are
-    returned as a dictionary of numpy arrays.  The missing counts are
+    returned as a dictionary of integer numpy arrays (see
+    count_dtype).  The missing counts are
     returned as a dictionary containing number of missing values for
     each aset.  'None' in a database record is treated as missing
-    value."""
-
+    value.
+
+    If database is an integer coded 2-D numpy array (or a reader
+    providing one through as_array()) the vectorized engine
+    (compute_counts_numpy) is used.  If block_size is given, database
+    is read in blocks of that many rows (compute_counts_streaming).
+    Otherwise, if n_jobs is not 1, records are converted to a code
+    array and counted in parallel by n_jobs processes, splitting rows
+    or covering sets depending on parallel ("rows" or "covers")."""
+
+    if block_size is not None:
+        return compute_counts_streaming(asets, database, domainsizes, block_size, maxN)
+    data = code_array(database)
+    if data is None and n_jobs != 1:
+        data = records_to_codes(database, nattrs, maxN)
+    if data is not None:
+        return compute_counts_numpy(asets, data, domainsizes, maxN, n_jobs = n_jobs,
+                                    parallel = parallel)
     if not isinstance(database, list):
         print("Counts: iterator given, converting to list")
         if maxN >= 0:
@@ -165,7 +478,8 @@ def compute_counts_array_cover(asets, database, nattrs, domainsizes, maxN = -1):
 
 ### TODO: this function should be called from previous one which
 ### should be very short
-def compute_counts_dict_cover(asets, database, nattrs, domainsizes, maxN = -1):
+def compute_counts_dict_cover(asets, database, nattrs, domainsizes, maxN = -1,
+                              block_size = None, n_jobs = 1, parallel = "rows"):
     """Compute counts for attribute sets in asets based on database.
 
     Returns a tuple with counts, number of rows in database and the
@@ -173,8 +487,29 @@ def compute_counts_dict_cover(asets, database, nattrs, domainsizes, maxN = -1):
     returned as a dictionary of dictionarys.  The missing counts are
     returned as a dictionary containing number of missing values for
     each aset.  'None' in a database record is treated as missing
-    value."""
-
+    value.
+
+    If database is an integer coded 2-D numpy array (or a reader
+    providing one through as_array()) the vectorized engine
+    (compute_counts_numpy) is used.  If block_size is given, database
+    is read in blocks of that many rows (compute_counts_streaming).
+    Otherwise, if n_jobs is not 1, records are converted to a code
+    array and counted in parallel by n_jobs processes, splitting rows
+    or covering sets depending on parallel ("rows" or "covers")."""
+
+    if block_size is not None:
+        counts, N, missing_counts = compute_counts_streaming(asets, database, domainsizes,
+                                                             block_size, maxN)
+        counts = {aset: numpy_to_dict(distr) for aset, distr in counts.items()}
+        return counts, N, missing_counts
+    data = code_array(database)
+    if data is None and n_jobs != 1:
+        data = records_to_codes(database, nattrs, maxN)
+    if data is not None:
+        counts, N, missing_counts = compute_counts_numpy(asets, data, domainsizes, maxN,
+                                                         n_jobs = n_jobs, parallel = parallel)
+        counts = {aset: numpy_to_dict(distr) for aset, distr in counts.items()}
+        return counts, N, missing_counts
     if not isinstance(database, list):
         print("Counts: iterator given, converting to list")
         if maxN >= 0:
@@ -0,0 +1,222 @@
+"""Counting on integer coded data using a pool of worker processes.
+
+Two kinds of parallelism are available.  With row sharding the
+dataset is split into row shards, every worker counts the contingency
+tables of all covering sets on its shard and the tables are summed.
+With cover parallelism each worker gets a group of covering sets,
+counts their tables on all rows and returns the marginalized subsets;
+groups are balanced by estimated cost.
+
+Data is not pickled: workers map the code array from a file, either
+the file behind an np.memmap (see DataAccess.BinaryCache) or a
+temporary copy placed in shared memory (/dev/shm) if available."""
+
+import atexit
+import concurrent.futures
+import heapq
+import mmap
+import os
+import tempfile
+import weakref
+
+import numpy as np
+
+
+# don't start processes for fewer rows per worker than this, read at
+# call time so it can be lowered
+min_rows_per_job = 65536
+
+_pool = None
+_pool_size = 0
+_shared_files = {} # buffer key of an array -> (file spec of its shared copy,
+                   # whether the array was made read-only)
+
+
+def n_jobs_to_workers(n_jobs):
+    """Number of worker processes for n_jobs; values smaller than 1
+    mean all CPUs."""
+    if n_jobs is None or n_jobs < 1:
+        return os.cpu_count() or 1
+    return n_jobs
+
+def get_pool(n_workers):
+    """Return a process pool with n_workers workers.  The pool is
+    reused between calls."""
+    global _pool, _pool_size
+    if _pool is None or _pool_size != n_workers:
+        shutdown_pool()
+        _pool = concurrent.futures.ProcessPoolExecutor(n_workers)
+        _pool_size = n_workers
+    return _pool
+
+def shutdown_pool():
+    global _pool, _pool_size
+    if _pool is not None:
+        _pool.shutdown()
+    _pool = None
+    _pool_size = 0
+atexit.register(shutdown_pool)
+
+
+def _remove_file(fname):
+    try:
+        os.remove(fname)
+    except OSError:
+        pass
+
+def _buffer_key(data):
+    return (data.__array_interface__["data"][0], data.shape, data.strides, data.dtype.str)
+
+def share_array(data):
+    """Return a description (filename, offset, shape, dtype, order)
+    allowing worker processes to map array data.
+
+    Memory mapped arrays are shared through their own file.  Other
+    arrays are copied into a temporary file, which is removed when
+    data is garbage collected or unshare_array(data) is called.  While
+    it is shared, data is made read-only, so modifying it raises an
+    error instead of counting stale data; the copy is reused only for
+    the same read-only buffer."""
+    if isinstance(data, np.memmap) and isinstance(data.base, mmap.mmap) \
+           and (data.flags.f_contiguous or data.flags.c_contiguous):
+        order = "F" if data.flags.f_contiguous else "C"
+        return (data.filename, data.offset, data.shape, data.dtype.str, order)
+    key = _buffer_key(data)
+    if key in _shared_files and not data.flags.writeable:
+        return _shared_files[key][0]
+    unshare_array(data)
+    tmpdir = "/dev/shm" if os.path.isdir("/dev/shm") else None
+    fd, fname = tempfile.mkstemp(prefix = "bninter-", suffix = ".codes", dir = tmpdir)
+    os.close(fd)
+    copy = np.memmap(fname, dtype = data.dtype, mode = "w+", shape = data.shape, order = "F")
+    copy[...] = data
+    copy.flush()
+    del copy
+    spec = (fname, 0, data.shape, data.dtype.str, "F")
+    _shared_files[key] = (spec, data.flags.writeable)
+    data.flags.writeable = False
+    weakref.finalize(data, _unshare, key, spec)
+    return spec
+
+def _unshare(key, spec):
+    if key in _shared_files and _shared_files[key][0] == spec:
+        del _shared_files[key]
+    _remove_file(spec[0])
+
+def unshare_array(data):
+    """Remove the shared copy of data made by share_array and make
+    data writeable again."""
+    key = _buffer_key(data)
+    if key in _shared_files:
+        spec, made_readonly = _shared_files.pop(key)
+        _remove_file(spec[0])
+        if made_readonly:
+            data.flags.writeable = True
+
+def shared_empty(shape, dtype):
+    """Return an uninitialized Fortran ordered array in shared memory
+    which worker processes can fill through open_shared_array(spec,
+    "r+") with spec given by share_array.  The file behind the array
+    is removed when the array and all its views are garbage
+    collected."""
+    if shape[0] * shape[1] == 0:
+        return np.empty(shape, dtype = dtype, order = "F")
+    tmpdir = "/dev/shm" if os.path.isdir("/dev/shm") else None
+    fd, fname = tempfile.mkstemp(prefix = "bninter-", suffix = ".codes", dir = tmpdir)
+    os.close(fd)
+    data = np.memmap(fname, dtype = dtype, mode = "w+", shape = shape, order = "F")
+    weakref.finalize(data.base, _remove_file, fname)
+    return data
+
+def open_shared_array(spec, mode = "r"):
+    fname, offset, shape, dtype, order = spec
+    if shape[0] * shape[1] == 0:
+        return np.empty(shape, dtype = dtype, order = order)
+    return np.memmap(fname, dtype = dtype, mode = mode, offset = offset,
+                     shape = tuple(shape), order = order)
+
+
+def _count_shard(spec, start, stop, table_attrs, domainsizes, has_missing):
+    """Worker: count tables over table_attrs in rows start:stop."""
+    from .Counts import count_table
+    data = open_shared_array(spec)[start:stop]
+    return [count_table(data, attrs, domainsizes, has_missing) for attrs in table_attrs]
+
+def count_tables_parallel(data, table_attrs, domainsizes, has_missing, n_jobs, N = None):
+    """Compute contingency tables (see Counts.count_table) over each
+    attribute list in table_attrs on the first N rows of data using
+    row shards processed by n_jobs worker processes.
+
+    Falls back to counting in the calling process when there are too
+    few rows to make starting workers worthwhile."""
+    from .Counts import count_table
+    if N is None:
+        N = data.shape[0]
+    n_workers = min(n_jobs_to_workers(n_jobs), N // min_rows_per_job)
+    if n_workers <= 1:
+        return [count_table(data[:N], attrs, domainsizes, has_missing) for attrs in table_attrs]
+    spec = share_array(data)
+    bounds = np.linspace(0, N, n_workers + 1).astype(int)
+    pool = get_pool(n_workers)
+    futures = [pool.submit(_count_shard, spec, int(bounds[i]), int(bounds[i + 1]),
+                           table_attrs, domainsizes, has_missing)
+               for i in range(n_workers)]
+    tables = None
+    for f in futures:
+        shard_tables = f.result()
+        if tables is None:
+            tables = shard_tables
+        else:
+            for t, st in zip(tables, shard_tables):
+                t += st
+    return tables
+
+
+def schedule_covers(tasks, costs, n_groups):
+    """Split tasks into n_groups groups of similar total cost using
+    the longest processing time first rule.  Groups are returned in
+    order of decreasing cost."""
+    heap = [(0, i, []) for i in range(n_groups)]
+    for t in sorted(range(len(tasks)), key = lambda t: -costs[t]):
+        cost, i, group = heapq.heappop(heap)
+        group.append(tasks[t])
+        heapq.heappush(heap, (cost + costs[t], i, group))
+    heap.sort(reverse = True)
+    return [group for cost, i, group in heap if len(group) > 0]
+
+def _count_covers(spec, N, tasks, domainsizes, has_missing):
+    """Worker: count tables of covers in tasks and marginalize their
+    subsets."""
+    from .Counts import count_table, marginalize_table
+    data = open_shared_array(spec)[:N]
+    results = []
+    for attrs, covered_sets in tasks:
+        table = count_table(data, attrs, domainsizes, has_missing)
+        for aset in covered_sets:
+            distr, missing = marginalize_table(table, attrs, aset, domainsizes)
+            results.append((aset, distr, missing))
+    return results
+
+def count_covers_parallel(data, plan, costs, domainsizes, has_missing, n_jobs, N = None):
+    """Count the tables of all covers in plan (see Counts._count_plan)
+    on the first N rows of data with covers distributed among n_jobs
+    worker processes, balancing estimated costs.
+
+    Yields triples (aset, counts, number of missing values)."""
+    from .Counts import count_table, marginalize_table
+    if N is None:
+        N = data.shape[0]
+    n_workers = min(n_jobs_to_workers(n_jobs), len(plan))
+    if n_workers <= 1:
+        for attrs, covered_sets in plan:
+            table = count_table(data[:N], attrs, domainsizes, has_missing)
+            for aset in covered_sets:
+                distr, missing = marginalize_table(table, attrs, aset, domainsizes)
+                yield aset, distr, missing
+        return
+    spec = share_array(data)
+    pool = get_pool(n_workers)
+    futures = [pool.submit(_count_covers, spec, N, group, domainsizes, has_missing)
+               for group in schedule_covers(plan, costs, n_workers)]
+    for f in futures:
+        yield from f.result()
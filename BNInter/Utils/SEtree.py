@@ -1,5 +1,6 @@
 from __future__ import generators
 from copy import copy
+from bisect import bisect_left
 
 class SEtree(object):
     """Set Enumeration tree class"""
@@ -182,7 +183,7 @@ class SEtree(object):
         try:
             for e in set:
                 cur = cur.children[e]
-        except (KeyError, AttributeError):
+        except (KeyError, TypeError):
             raise KeyError("SEtree: " + repr(set))
         return cur
     def __ensure_sorted(self, seq):
@@ -193,6 +194,292 @@ class SEtree(object):
 
         
 
+class FlatSEtree(object):
+    """Set Enumeration tree stored in flat lists.
+
+    Nodes are numbered level by level, with the children of node i
+    occupying nodes first[i] to first[i]+nchildren[i]-1 in increasing
+    order of their labels, so a child is found by bisecting labels.
+    Sets are kept in item slots of their nodes, together with the set
+    itself, so iterators don't build tuples.  live[i] is the number of
+    sets stored in the subtree of i, subtrees without sets are
+    skipped.
+
+    Sets present when the tree was built are deleted and added again
+    in place.  Adding a new set, or deleting more sets than remain,
+    rebuilds the arrays on the next access, so the tree suits
+    collections known in advance which shrink, like the one processed
+    by AttrSetCover."""
+    __slots__ = ("label", "first", "nchildren", "parent", "live",
+                 "has_item", "keys_", "items_", "dead", "pending")
+
+    def __init__(self, keys = (), items = None):
+        """keys - sorted sets in lexicographic order
+        items - values of the sets (None for all if not given)"""
+        self.__build(keys, items)
+        self.pending = None # sets added outside of the arrays
+
+    def __build(self, keys, items):
+        keys = [tuple(key) for key in keys]
+        for j, key in enumerate(keys):
+            self.__ensure_sorted(key)
+            if j > 0 and key <= keys[j - 1]:
+                raise KeyError("key " + repr(key) + " is not in order")
+        label = [-1]
+        first = [1]
+        nchildren = [0]
+        parent = [-1]
+        live = [len(keys)]
+        has_item = bytearray(1)
+        node_keys = [None]
+        node_items = [None]
+        # node of the prefix of each key at the current level, in
+        # lexicographic order of keys the prefixes are sorted as well
+        node_of = [0] * len(keys)
+        todo = list(range(len(keys)))
+        d = 0
+        while len(todo) > 0:
+            next_todo = []
+            last = None
+            for j in todo:
+                key = keys[j]
+                if len(key) == d:
+                    i = node_of[j]
+                    has_item[i] = 1
+                    node_keys[i] = key
+                    node_items[i] = None if items is None else items[j]
+                    continue
+                p = node_of[j]
+                if (p, key[d]) != last:
+                    last = (p, key[d])
+                    if nchildren[p] == 0:
+                        first[p] = len(label)
+                    nchildren[p] += 1
+                    label.append(key[d])
+                    first.append(0)
+                    nchildren.append(0)
+                    parent.append(p)
+                    live.append(0)
+                    has_item.append(0)
+                    node_keys.append(None)
+                    node_items.append(None)
+                i = len(label) - 1
+                live[i] += 1
+                node_of[j] = i
+                next_todo.append(j)
+            todo = next_todo
+            d += 1
+        self.label, self.first, self.nchildren, self.parent = label, first, nchildren, parent
+        self.live, self.has_item, self.keys_, self.items_ = live, has_item, node_keys, node_items
+        self.dead = 0 # sets deleted since the build
+
+    def __flush(self):
+        """Rebuild the arrays if sets were added or most were
+        deleted."""
+        if self.pending or self.dead > max(self.live[0], 64):
+            pending = self.pending
+            self.pending = None
+            self.dead = 0
+            merged = dict(self.items())
+            if pending:
+                merged.update(pending)
+            keys = sorted(merged)
+            self.__build(keys, [merged[k] for k in keys])
+
+    def __child(self, i, e):
+        """Return the child of node i labeled e or -1."""
+        lo = self.first[i]
+        hi = lo + self.nchildren[i]
+        c = bisect_left(self.label, e, lo, hi)
+        if c < hi and self.label[c] == e:
+            return c
+        return -1
+
+    def __find(self, set):
+        """Return the node of set or -1."""
+        i = 0
+        for e in set:
+            i = self.__child(i, e)
+            if i < 0:
+                break
+        return i
+
+    def __len__(self):
+        return self.live[0] + (len(self.pending) if self.pending else 0)
+    def __setitem__(self, set, item):
+        self.__ensure_sorted(set)
+        set = tuple(set)
+        if self.pending and set in self.pending:
+            self.pending[set] = item
+            return
+        i = self.__find(set)
+        if i < 0:
+            if self.pending is None:
+                self.pending = {}
+            self.pending[set] = item
+            return
+        self.items_[i] = item
+        if not self.has_item[i]:
+            self.has_item[i] = 1
+            self.keys_[i] = set
+            self.dead = max(self.dead - 1, 0)
+            while i >= 0:
+                self.live[i] += 1
+                i = self.parent[i]
+    def __getitem__(self, set):
+        self.__ensure_sorted(set)
+        set = tuple(set)
+        if self.pending and set in self.pending:
+            return self.pending[set]
+        i = self.__find(set)
+        if i < 0 or not self.has_item[i]:
+            raise KeyError("SEtree: " + repr(set))
+        return self.items_[i]
+    def __contains__(self, set):
+        try:
+            self.__getitem__(set)
+        except KeyError:
+            return False
+        return True
+    def __delitem__(self, set):
+        self.__ensure_sorted(set)
+        set = tuple(set)
+        if self.pending and set in self.pending:
+            del self.pending[set]
+            return
+        i = self.__find(set)
+        if i < 0 or not self.has_item[i]:
+            raise KeyError("SEtree: " + repr(set))
+        self.has_item[i] = 0
+        self.items_[i] = None
+        self.dead += 1
+        while i >= 0:
+            self.live[i] -= 1
+            i = self.parent[i]
+
+    def __iter__(self):
+        for key, item in self.items():
+            yield key
+    def items(self):
+        """Iterate (set, item) pairs in lexicographic order."""
+        self.__flush()
+        live, first, nchildren, has_item = self.live, self.first, self.nchildren, self.has_item
+        stack = [0]
+        while len(stack) > 0:
+            i = stack.pop()
+            if has_item[i]:
+                yield (self.keys_[i], self.items_[i])
+            for c in range(first[i] + nchildren[i] - 1, first[i] - 1, -1):
+                if live[c] > 0:
+                    stack.append(c)
+
+    def iter_included(self, superset):
+        """Iterate all stored subsets of superset."""
+        self.__flush()
+        superset = sorted(set(superset))
+        label, live, first, nchildren = self.label, self.live, self.first, self.nchildren
+        has_item, keys = self.has_item, self.keys_
+        stack = [0]
+        while stack:
+            i = stack.pop()
+            if has_item[i]:
+                yield keys[i]
+            n = nchildren[i]
+            if n > 0:
+                lo = first[i]
+                hi = lo + n
+                last = label[hi - 1]
+                for x in superset:
+                    # labels and superset are sorted, continue from the
+                    # previous position
+                    if x > last:
+                        break
+                    if x >= label[lo]:
+                        lo = bisect_left(label, x, lo, hi)
+                        if label[lo] == x and live[lo] > 0:
+                            stack.append(lo)
+
+    def iter_one_not_in(self, superset):
+        """Iterate all subsets with exactly one element not in
+        superset.  Returns the set and the element not in superset.
+
+        Used for finding covers of attribute sets."""
+        self.__flush()
+        in_superset = frozenset(superset)
+        superset = sorted(in_superset)
+        label, live, first, nchildren = self.label, self.live, self.first, self.nchildren
+        has_item, keys = self.has_item, self.keys_
+        # subsets of superset, each child of which not in superset
+        # starts a branch with one element not in superset
+        stack = [0]
+        branch = []
+        while stack:
+            i = stack.pop()
+            for c in range(first[i], first[i] + nchildren[i]):
+                if live[c] == 0:
+                    continue
+                e = label[c]
+                if e in in_superset:
+                    stack.append(c)
+                    continue
+                branch.append(c)
+                while branch:
+                    j = branch.pop()
+                    if has_item[j]:
+                        yield keys[j], e
+                    n = nchildren[j]
+                    if n > 0:
+                        lo = first[j]
+                        hi = lo + n
+                        last = label[hi - 1]
+                        for x in superset:
+                            if x > last:
+                                break
+                            if x >= label[lo]:
+                                lo = bisect_left(label, x, lo, hi)
+                                if label[lo] == x and live[lo] > 0:
+                                    branch.append(lo)
+
+    def get(self, k, x = None):
+        if k in self:
+            return self[k]
+        return x
+    def setdefault(self, k, x = None):
+        if k not in self:
+            self[k] = x
+        return self[k]
+    def popitem(self):
+        if len(self) == 0:
+            raise KeyError("SEtree is empty")
+        item = next(self.items())
+        del self[item[0]]
+        return item
+    def keys(self):
+        return [k for k in self]
+    def values(self):
+        for item in self.items():
+            yield item[1]
+    def clear(self):
+        self.__build((), None)
+        self.pending = None
+    def copy(self):
+        items = list(self.items())
+        return FlatSEtree([k for k, x in items], [x for k, x in items])
+    def update(self, b):
+        for k in b.keys():
+            self[k] = b[k]
+    def __str__(self):
+        ret = "SE Tree:\n"
+        ret += "\n".join([str(k)+" --> "+str(item) for k, item in self.items()])
+        return ret
+
+    def __ensure_sorted(self, seq):
+        """Ensure that seq is sorted, raise KeyError otherwise"""
+        for i in range(len(seq) - 1):
+            if(seq[i] > seq[i+1]):
+                raise KeyError("key " + repr(seq) + " is not sorted")
+
+
 class SEtree_node(object):
     """Set Enumeration tree node"""
     def __init__(self):
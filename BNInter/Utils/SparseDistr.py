@@ -64,8 +64,10 @@ class SparseDistr():
         prior *= self.prior_factor
         prior[*[self.X[:,i] for i in range(self.nd)]] += (1-self.prior_factor) * self.p
         return prior
-    def sample(self, n):
-        rng = np.random.default_rng()
+    def sample(self, n, rng = None):
+        """Draw n samples using numpy Generator rng.  rng may also be
+        a seed (or None) for np.random.default_rng."""
+        rng = np.random.default_rng(rng)
         if self.X.shape[0] == 0:
             from_prior = np.ones(n, dtype=bool)
         else:
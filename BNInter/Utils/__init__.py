@@ -4,10 +4,13 @@ Like computing superset covers of attribute set collections,
 counting marginals from data, SETrees etc."""
 
 from .Counts import compute_counts_dict, compute_counts_array
+from .Counts import compute_counts_numpy
 from .Counts import dict_to_numpy, convert_counts_dicts2numpyarrays
 from .AttrSetCover import AttrSetCover
 from .SparseDistr import SparseDistr
+from .BitmapIndex import BitmapIndex
+from .ArrayCache import ArrayCache
 
-__all__ = (compute_counts_dict, compute_counts_array,
+__all__ = (compute_counts_dict, compute_counts_array, compute_counts_numpy,
            dict_to_numpy, convert_counts_dicts2numpyarrays,
-           AttrSetCover, SparseDistr)
+           AttrSetCover, SparseDistr, BitmapIndex, ArrayCache)
@@ -1,4 +1,5 @@
 from .sop import array_sop
+from ..Utils.ArrayCache import ArrayCache
 
 
 max_cached =     20000000
@@ -22,17 +23,13 @@ class cached_array_sop(array_sop):
             
         def compute(self, values):
             key = self.compute_key()
-            if key in self.sop.sum_cache:
-                #print "hit:", key
-                return self.sop.sum_cache[key]
+            array = self.sop.sum_cache.get(key)
+            if array is not None:
+                return array
+            # cost of recomputing, children cached now are free
+            cost = sum(array_sop.bucket.cost(self))
             array = array_sop.bucket.compute(self, values)
-            # avoid caching huge arrays
-            arrsize = array.nbytes
-            if arrsize < max_cached:
-                if self.sop.cached_size + arrsize > max_cache_size:
-                    self.sop.clear_cache()
-                self.sop.sum_cache[key] = array
-                self.sop.cached_size += arrsize
+            self.sop.sum_cache.put(key, array, cost)
             return array
         def compute_key(self):
             """Computes the key for memoization.
@@ -44,11 +41,11 @@ class cached_array_sop(array_sop):
                 key = key | p.compute_key()
             key = frozenset(key)
             return key
-    def __init__(self, n):
-        """Create an array sop with n variables"""
-        super().__init__(n)
-        self.sum_cache = {}
-        self.cached_size = 0
+    def __init__(self, n, fused = False, cache_size = max_cache_size):
+        """Create an array sop with n variables.  Partial sums are
+        kept in an ArrayCache of cache_size bytes, arrays larger than
+        max_cached bytes are not cached."""
+        super().__init__(n, fused)
+        self.sum_cache = ArrayCache(cache_size, min(max_cached, cache_size))
     def clear_cache(self):
         self.sum_cache.clear()
-        self.cached_size = 0
@@ -0,0 +1,89 @@
+"""Heuristics for ordering variable elimination in sums of products.
+
+Each heuristic eliminates variables greedily one at a time from the
+interaction graph of the factors (variables are adjacent if they
+appear in a common factor).  Eliminating a variable connects all its
+neighbours.  The score of a variable is computed on the current
+graph, the variable with the lowest score is eliminated first."""
+
+import random
+
+
+def interaction_graph(scopes, n):
+    """Adjacency sets of the graph of n variables in which variables
+    appearing in a common scope are connected."""
+    adj = [set() for i in range(n)]
+    for scope in scopes:
+        for v in scope:
+            adj[v].update(scope)
+    for v in range(n):
+        adj[v].discard(v)
+    return adj
+
+def min_degree_score(v, adj, dim):
+    """Number of neighbours."""
+    return len(adj[v])
+
+def min_fill_score(v, adj, dim):
+    """Number of edges added when v is eliminated."""
+    nb = list(adj[v])
+    fill = 0
+    for i, u in enumerate(nb):
+        for w in nb[i+1:]:
+            if w not in adj[u]:
+                fill += 1
+    return fill
+
+def min_weight_score(v, adj, dim):
+    """Size of the table created when v is eliminated: product of
+    domain sizes of v and its neighbours."""
+    weight = dim[v]
+    for u in adj[v]:
+        weight *= dim[u]
+    return weight
+
+scores = {"min_degree": min_degree_score,
+          "min_fill": min_fill_score,
+          "min_weight": min_weight_score}
+
+
+def greedy_elimination_order(scopes, elim_vars, dim, score, rng = None, k = 1,
+                             cliques = None):
+    """Return an elimination order of variables in elim_vars.
+
+    scopes - variable lists of factors
+    dim - domain sizes of all variables
+    score - function (v, adj, dim) -> score, lower is eliminated first
+    rng - if given, one of the k best variables is picked at random
+    cliques - if given, the clique formed by each eliminated variable
+              and its neighbours is appended to this list"""
+    adj = interaction_graph(scopes, len(dim))
+    remaining = set(elim_vars)
+    order = []
+    while remaining:
+        ranked = sorted((score(v, adj, dim), v) for v in remaining)
+        if rng is not None and k > 1:
+            v = rng.choice(ranked[:k])[1]
+        else:
+            v = ranked[0][1]
+        nb = adj[v]
+        if cliques is not None:
+            cliques.append(tuple(sorted(nb | set([v]))))
+        for u in nb:
+            adj[u].update(nb)
+            adj[u].discard(u)
+            adj[u].discard(v)
+        adj[v] = set()
+        remaining.remove(v)
+        order.append(v)
+    return order
+
+def random_greedy_orders(scopes, elim_vars, dim, restarts = 8, k = 3, seed = 0):
+    """Generate candidate elimination orders: the deterministic
+    min-fill and min-weight orders followed by randomized min-fill
+    orders picking among the k best variables."""
+    yield greedy_elimination_order(scopes, elim_vars, dim, min_fill_score)
+    yield greedy_elimination_order(scopes, elim_vars, dim, min_weight_score)
+    rng = random.Random(seed)
+    for i in range(restarts):
+        yield greedy_elimination_order(scopes, elim_vars, dim, min_fill_score, rng, k)
@@ -3,6 +3,7 @@ import numpy
 
 
 from .sop_base import sop_base
+from .ordering import scores, greedy_elimination_order, random_greedy_orders
 
 
 def sort_axes(variables, array):
@@ -92,7 +93,12 @@ class array_sop(sop_base):
 
     Implements the bucket elimination procedure described by Dechter.
     Memory consumption may be exponential, but certain sub-sums will
-    not be recomputed."""
+    not be recomputed.
+
+    If fused is true, the product in each bucket and the sum over the
+    bucket variable are computed by a single numpy.einsum call with a
+    contraction path found in prepare, so the full product over the
+    bucket's variables is never materialized."""
 
     class factor(sop_base.factor):
         def __init__(self, variables, array):
@@ -109,6 +115,8 @@ class array_sop(sop_base):
             return size
         def mem_cost(self):
             return self.array.nbytes
+        def prepare_einsum(self):
+            pass
     class bucket(sop_base.bucket):
         def __init__(self, var, sop, free_vars):
             """Create a new sop bucket, which sums over variable var.
@@ -116,8 +124,70 @@ class array_sop(sop_base):
             var=-1 means a dummy bucket without any variable.
             Used to represent the whole expression."""
             sop_base.bucket.__init__(self, var, sop)
+            self.einsum_args = None
+        def prepare_einsum(self):
+            """Precompute the arguments of the fused computation of
+            this bucket (and its children) by a single numpy.einsum
+            call: sublists of operands and the result with local
+            variable numbers, and the contraction path."""
+            for p in self.product:
+                p.prepare_einsum()
+            operand_vars = tuple(tuple(p.vars) for p in self.product)
+            key = (operand_vars, tuple(self.vars), self.var == -1)
+            if key not in self.sop.einsum_cache:
+                self.sop.einsum_cache[key] = self.__plan_einsum(operand_vars)
+            self.einsum_args, self.einsum_peak = self.sop.einsum_cache[key]
+        def __plan_einsum(self, operand_vars):
+            """Find the contraction path greedily: always contract the
+            pair of operands giving the smallest result.  Returns the
+            einsum arguments and the largest total size of
+            intermediate arrays alive at once."""
+            dim = self.sop.dim
+            all_vars = sorted(set(v for vars in operand_vars for v in vars))
+            if len(all_vars) > 52 or len(operand_vars) == 0 or self.var == -1:
+                # nothing to sum out or too many variables for
+                # einsum, compute unfused
+                return None, None
+            local = dict((v, i) for i, v in enumerate(all_vars))
+            sublists = [[local[v] for v in vars] for vars in operand_vars]
+            out = [local[v] for v in self.vars]
+            def size(vars):
+                s = 1
+                for v in vars:
+                    s *= dim[v]
+                return s
+            operands = [(frozenset(vars), False) for vars in operand_vars]
+            path = ["einsum_path"]
+            live = 0 # total size of intermediates
+            peak = size(self.vars)
+            if len(operands) == 1:
+                path.append((0,))
+            while len(operands) > 1:
+                best = None
+                for i in range(len(operands)):
+                    for j in range(i + 1, len(operands)):
+                        needed = set(self.vars)
+                        for k, (vars, inter) in enumerate(operands):
+                            if k != i and k != j:
+                                needed |= vars
+                        result = (operands[i][0] | operands[j][0]) & needed
+                        if best is None or size(result) < best[0]:
+                            best = (size(result), i, j, frozenset(result))
+                res_size, i, j, result = best
+                live += res_size
+                peak = max(peak, live)
+                for vars, inter in (operands[i], operands[j]):
+                    if inter:
+                        live -= size(vars)
+                path.append((i, j))
+                del operands[j]
+                del operands[i]
+                operands.append((result, True))
+            return (sublists, out, path), peak
         def compute(self, values):
             """Compute the value."""
+            if self.sop.fused and self.einsum_args is not None:
+                return self.compute_fused(values)
             prod = numpy.array(1)
             all_vars = []
             # sort products on size for faster mults
@@ -147,6 +217,15 @@ class array_sop(sop_base):
                 prod = numpy.sum(prod, all_vars.index(self.var))
             prod = numpy.array(prod) # force scalars to be returned as arrays
             return prod
+        def compute_fused(self, values):
+            """Multiply factors and sum out the bucket variable with
+            a single einsum call, without forming the full product."""
+            sublists, out, path = self.einsum_args
+            args = []
+            for p, sub in zip(self.product, sublists):
+                args.extend([p.compute(values), sub])
+            args.append(out)
+            return numpy.array(numpy.einsum(*args, optimize = path))
         def cost(self):
             """How many adds/muls are needed."""
             add_cost = 0
@@ -181,9 +260,13 @@ class array_sop(sop_base):
                 mem_cost += p.result_size() * 8 #TODO: don't use hard coded const
                 max_child = max(p.mem_cost(), max_child)
             # cost within this bucket
-            size = self.result_size()
-            if self.var != -1:
-                size *= dim[self.var]
+            if self.sop.fused and self.einsum_args is not None:
+                # intermediates along the einsum path, no full product
+                size = self.einsum_peak
+            else:
+                size = self.result_size()
+                if self.var != -1:
+                    size *= dim[self.var]
             mem_cost = mem_cost + size * 8 # TODO: get element size from array somehow
             return max(max_child, mem_cost)
             
@@ -197,18 +280,35 @@ class array_sop(sop_base):
                 complexity = max(complexity, p.complexity())
             return complexity
 
-    def __init__(self, n):
+    def __init__(self, n, fused = False):
         """Create an array sop with n variables"""
         sop_base.__init__(self, n)
         self.dim = [1] * n
+        self.fused = fused
+        self.einsum_cache = {} # einsum arguments for bucket structures
+        self.order_cache = {} # (ordering, frozenset(free_vars)) -> elimination order
     def add_factor(self, variables, array):
         """Add a factor to the sop."""
         sop_base.add_factor(self, variables, array)
         for v, d in zip(variables, array.shape):
             self.dim[v] = d
-    def prepare(self, free_vars):
+        self.einsum_cache.clear()
+        self.order_cache.clear()
+    def prepare(self, free_vars, ordering = None):
+        """Prepare computing the marginal over free_vars.
+
+        ordering selects the variable elimination order: None or
+        "factor_count" (variables in most factors are summed last),
+        "min_degree", "min_fill", "min_weight" (see ordering.py),
+        "random_greedy" (the best of several greedy orders according
+        to cost() and mem_cost()) or an explicit sequence of variables
+        in the order of elimination.  Orders found by heuristics are
+        memoized for each set of free variables."""
         self.free_vars = free_vars
+        self.ordering = ordering
         sop_base.prepare(self, free_vars)
+        if self.fused:
+            self.prepared.prepare_einsum()
     def compute(self):
         val = sop_base.compute(self)
         # reorder axes
@@ -222,6 +322,41 @@ class array_sop(sop_base):
         
     def order_variables(self, free_vars):
         """Heuristically order vairables to reduce computation cost"""
-        # sort variables by decreasing number of factors depending on them
-        sop_base.order_variables(self)
-        self.permutation = [x for x in self.permutation if x not in free_vars]
+        ordering = self.ordering
+        if ordering is None or ordering == "factor_count":
+            # sort variables by decreasing number of factors depending on them
+            sop_base.order_variables(self)
+            self.permutation = [x for x in self.permutation if x not in free_vars]
+            return
+        elim_vars = [v for v in range(self.n) if v not in free_vars]
+        if not isinstance(ordering, str):
+            if sorted(ordering) != elim_vars:
+                raise RuntimeError("elimination order must contain all non-free variables")
+            order = list(ordering)
+        else:
+            key = (ordering, frozenset(free_vars))
+            if key not in self.order_cache:
+                scopes = [f.vars for f in self.product]
+                if ordering == "random_greedy":
+                    candidates = random_greedy_orders(scopes, elim_vars, self.dim)
+                    self.order_cache[key] = self.best_order(free_vars, candidates)
+                elif ordering in scores:
+                    self.order_cache[key] = greedy_elimination_order(scopes, elim_vars, self.dim,
+                                                                     scores[ordering])
+                else:
+                    raise RuntimeError("unknown variable ordering: " + ordering)
+            order = self.order_cache[key]
+        # the bucket of the first variable in permutation is outermost
+        self.permutation = list(reversed(order))
+    def best_order(self, free_vars, orders):
+        """Return the elimination order with the smallest cost and
+        memory cost among orders."""
+        ordering = self.ordering
+        best = None
+        for order in orders:
+            self.prepare(free_vars, order)
+            score = (sum(self.cost()), self.mem_cost())
+            if best is None or score < best[0]:
+                best = (score, order)
+        self.ordering = ordering
+        return best[1]
@@ -6,11 +6,12 @@ import sys
 from os.path import basename, dirname
 import time
 
-from BNInter.DataAccess import Attr, create_arff_reader
+from BNInter.DataAccess import Attr, load_arff_cached
 from BNInter.BayesNet import BayesNet, read_Hugin_file, write_Hugin_file
 import BNInter.BayesNet.BayesNetLearn
 from BNInter.BayesNet import topSort
-from BNInter.BayesPrune.ExactInterestingness import BN_interestingness_exact
+from BNInter.BayesPrune.ExactInterestingness import BN_interestingness_incremental
+from BNInter.BayesPrune.MarginalStore import MarginalStore, store_suffix
 from BNInter.BayesPrune.SamplingInterestingness import BN_interestingness_sample
 
 from tkinter.messagebox import askokcancel, showerror
@@ -19,6 +20,7 @@ from tkinter import ttk
 import tkinter as tk
 
 from BNInter.Utils.tk_utils import tk_rounded_rect
+from BNInter.Utils import BitmapIndex
 
 global debug
 debug = 0
@@ -43,6 +45,9 @@ class PruneGUI(ttk.Frame):
         self.bn = None
         self.ds = None
         self.bn_interestingness = None
+        self.bitmap_index = None # built on first drill-down into cells
+        self.marginal_store = None # BN marginals reused between runs
+        self.session = None # exact computation kept between runs on the same data
 
         self.master = master
         ttk.Frame.__init__(self, self.master)
@@ -470,6 +475,7 @@ class PruneGUI(ttk.Frame):
                 self.listindex_to_attrset[listindex] = aset
                 listindex += 1
             if "maxcell" in mode:
+                bitmap_index = self.get_bitmap_index()
                 inter, distr, edistr = self.bn_interestingness.compute_attrset_interestingness(aset)
                 #diff = numpy.abs(distr - edistr)
                 diff = distr - edistr
@@ -478,11 +484,23 @@ class PruneGUI(ttk.Frame):
                     if abs(d) >= 0.9 * inter:
                         idomlist = [str(self.bn_interestingness.ds.attrset[a].domain[v]) for a, v in zip(aset, i)]
                         istr = ",".join(idomlist)
-                        self.attrset_list.insert(tk.END, ("    " + istr + " => " + str(d) + "  P^BN=" + str(edistr[i]) +"  P^D=" + str(distr[i])))
+                        cellstr = "    " + istr + " => " + str(d) + "  P^BN=" + str(edistr[i]) +"  P^D=" + str(distr[i])
+                        if bitmap_index is not None:
+                            cellstr += "  n^D=" + str(bitmap_index.support(aset, i))
+                        self.attrset_list.insert(tk.END, cellstr)
                         self.listindex_to_attrset[listindex] = aset
                         listindex += 1
         
         
+    def get_bitmap_index(self):
+        """Return the bitmap index of the dataset used to count
+        supports of individual cells (None if data is not array
+        based)."""
+        ds = self.bn_interestingness.ds
+        if self.bitmap_index is None and hasattr(ds, "as_array"):
+            self.bitmap_index = BitmapIndex(ds, [len(a.domain) for a in ds.attrset])
+        return self.bitmap_index
+
     def run(self):
         excluded_attrs = []
         selectionCond = None
@@ -506,14 +524,6 @@ class PruneGUI(ttk.Frame):
         ns = int(self.n.get())
         delta = float(self.delta.get())
 
-        ### learn conditional probabilities
-        self.status_bar.config(text="Learning CPTs from data")
-        self.status_bar.update()
-        self.master.update()
-
-        self.ds.rewind()
-        BNInter.BayesNet.BayesNetLearn.learnProbabilitiesFromData(self.bn, self.ds, priorN = 0)
-        self.ds.rewind()
         debug = 1
         t1 = time.time()
 
@@ -523,13 +533,20 @@ class PruneGUI(ttk.Frame):
         self.master.update()
 
         if self.method.get() == "Exact":
-            try:
-                self.bn_interestingness = BN_interestingness_exact(self.bn, self.ds)
-            except RuntimeError as e:
-                showerror(message=str(e))
-                return
-            self.attr_sets_w_inter = self.bn_interestingness.run(minsup = minsup, maxK = maxK, apriori_debug = debug)
+            # the session relearns CPTs of changed nodes only
+            if self.session is None or self.session.bn is not self.bn or self.session.ds is not self.ds:
+                try:
+                    self.session = BN_interestingness_incremental(self.bn, self.ds, priorN = 0)
+                except RuntimeError as e:
+                    showerror(message=str(e))
+                    return
+            self.bn_interestingness = self.session
+            self.attr_sets_w_inter = self.bn_interestingness.run(minsup = minsup, maxK = maxK, apriori_debug = debug,
+                                                                 marginal_store = self.marginal_store)
         elif self.method.get() == "Sampling":
+            self.ds.rewind()
+            BNInter.BayesNet.BayesNetLearn.learnProbabilitiesFromData(self.bn, self.ds, priorN = 0)
+            self.ds.rewind()
             try:
                 self.bn_interestingness = BN_interestingness_sample(self.bn, self.ds)
             except RuntimeError as e:
@@ -559,8 +576,10 @@ class PruneGUI(ttk.Frame):
         if fname == '' or fname == ():
             return
         try:
-            self.ds = create_arff_reader(fname)
-        except RuntimeError as e:
+            self.ds = load_arff_cached(fname)
+            self.bitmap_index = None
+            self.marginal_store = MarginalStore(fname + store_suffix)
+        except (RuntimeError, OSError) as e:
             showerror(message = "Error reading data file: " + str(e))
             self.data_file_name.set("")
             self.bn = None
@@ -0,0 +1,48 @@
+"""Compare serial and parallel counting on data/sachs.arff replicated
+to a large number of rows.
+
+usage: python examples/parallel_counting_benchmark.py [nrows [n_jobs [maxK]]]"""
+
+import itertools
+import os
+import sys
+import time
+
+import numpy as np
+
+from BNInter.DataAccess import load_arff_columnar
+from BNInter.Utils.Counts import compute_counts_numpy
+
+
+def replicate(X, nrows):
+    reps = -(-nrows // X.shape[0])
+    return np.asfortranarray(np.tile(X, (reps, 1))[:nrows])
+
+def timed_counts(asets, X, domainsizes, **kwargs):
+    t = time.time()
+    counts, N, missing_counts = compute_counts_numpy(asets, X, domainsizes, **kwargs)
+    return time.time() - t, counts, missing_counts
+
+
+if __name__ == "__main__":
+    nrows = int(sys.argv[1]) if len(sys.argv) > 1 else 10_000_000
+    n_jobs = int(sys.argv[2]) if len(sys.argv) > 2 else os.cpu_count()
+    maxK = int(sys.argv[3]) if len(sys.argv) > 3 else 3
+
+    ds = load_arff_columnar("data/sachs.arff")
+    domainsizes = [len(a.domain) for a in ds.attrset]
+    X = replicate(ds.as_array(), nrows)
+    asets = []
+    for k in range(1, maxK + 1):
+        asets.extend(itertools.combinations(range(len(domainsizes)), k))
+    print(X.shape[0], "rows,", len(asets), "attribute sets,", n_jobs, "jobs")
+
+    t_serial, counts, missing_counts = timed_counts(asets, X, domainsizes)
+    print("serial:        %8.2fs" % t_serial)
+    for parallel in ["rows", "covers"]:
+        t, pcounts, pmissing_counts = timed_counts(asets, X, domainsizes,
+                                                   n_jobs = n_jobs, parallel = parallel)
+        same = pmissing_counts == missing_counts and \
+               all(np.array_equal(counts[a], pcounts[a]) for a in asets)
+        print("%-7s        %8.2fs  speedup %5.2f  %s" % (parallel + ":", t, t_serial / t,
+                                                       "identical" if same else "DIFFERENT"))
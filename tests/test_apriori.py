@@ -0,0 +1,52 @@
+import itertools
+
+import numpy as np
+import pytest
+
+from BNInter.DataAccess import Attr, AttrSet, ColumnarReader
+from BNInter.Apriori.AprioriDistr import AprioriDistr
+from BNInter.Apriori.EclatDistr import EclatDistr
+from BNInter.Apriori.Candidates import generate_candidates, array_to_sets
+
+
+@pytest.fixture
+def reader():
+    rng = np.random.default_rng(2)
+    domainsizes = [2, 3, 2, 4, 2, 3]
+    X = np.column_stack([rng.integers(0, d, 300) for d in domainsizes]).astype(np.uint8)
+    # correlated attributes give frequent sets of different sizes
+    X[:, 2] = np.where(rng.random(300) < 0.9, X[:, 0], X[:, 2])
+    X[:, 4] = np.where(rng.random(300) < 0.8, X[:, 0], X[:, 4])
+    X[rng.random(X.shape) < 0.03] = 255
+    aset = AttrSet("test", [Attr("a" + str(i), "CATEG", [str(v) for v in range(d)])
+                            for i, d in enumerate(domainsizes)])
+    return ColumnarReader(aset, np.asfortranarray(X))
+
+def run_miner(cls, db, minsup, maxK):
+    miner = cls(db)
+    miner.minsup = minsup
+    miner.maxK = maxK
+    miner.run()
+    miner.computePositiveBorder()
+    return miner
+
+@pytest.mark.parametrize("minsup,maxK", [(10, 4), (40, 6), (60, 3), (1000, 3)])
+def test_eclat_same_as_apriori(reader, minsup, maxK):
+    a = run_miner(AprioriDistr, reader, minsup, maxK)
+    e = run_miner(EclatDistr, reader, minsup, maxK)
+    assert a.N == e.N == 300
+    assert a.freq == e.freq
+    assert a.negativeBorder == e.negativeBorder
+    assert a.positiveBorder == e.positiveBorder
+
+
+@pytest.mark.parametrize("k", [1, 2, 3])
+def test_generate_candidates(k):
+    rng = np.random.default_rng(k)
+    sets = [s for s in itertools.combinations(range(9), k) if rng.random() < 0.6]
+    frequent = set(sets)
+    expected = [c for c in itertools.combinations(range(9), k + 1)
+                if all(c[:i] + c[i+1:] in frequent for i in range(k + 1))]
+    C = generate_candidates(sets[::-1], k)
+    assert C.shape == (len(expected), k + 1)
+    assert array_to_sets(C) == expected
@@ -0,0 +1,43 @@
+import numpy as np
+import pytest
+
+from BNInter.Utils import ArrayCache
+from BNInter.sop.cached_sop import cached_array_sop
+
+
+def test_budget_and_stats():
+    cache = ArrayCache(max_bytes = 800, max_item_bytes = 400)
+    for i in range(4):
+        cache[i] = np.zeros(25) # 200 bytes each
+    assert cache.nbytes == 800 and len(cache) == 4
+    assert cache.get(0) is not None # 0 is now most recently used
+    cache[4] = np.zeros(25)
+    assert 1 not in cache and 0 in cache
+    assert cache.nbytes == 800
+    assert not cache.put(5, np.zeros(100)) # too large
+    assert cache.get(5) is None
+    assert cache.stats() == {"entries": 4, "nbytes": 800, "hits": 1,
+                             "misses": 1, "evictions": 1}
+
+def test_cost_aware_eviction():
+    cache = ArrayCache(max_bytes = 600)
+    cache.put("cheap", np.zeros(25), cost = 1)
+    cache.put("expensive", np.zeros(25), cost = 1000000)
+    cache.put("medium", np.zeros(25), cost = 200)
+    cache.put("new", np.zeros(25), cost = 200)
+    assert "cheap" not in cache
+    for i in range(3):
+        cache.put(i, np.zeros(25), cost = 200)
+    assert "expensive" in cache
+    assert cache.nbytes <= 600
+    cache.clear()
+    assert cache.L == 0.0 and cache.nbytes == 0
+
+def test_cached_sop_budget():
+    asop = cached_array_sop(3, cache_size = 100)
+    asop.add_factor([0, 1], np.full((3, 3), 1.0 / 9))
+    asop.add_factor([1, 2], np.full((3, 3), 1.0 / 3))
+    for free_vars in [[0], [1], [2], [0, 2], [0, 1]]:
+        asop.prepare(free_vars)
+        assert asop.compute().sum() == pytest.approx(1.0)
+        assert asop.sum_cache.nbytes <= 100
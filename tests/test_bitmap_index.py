@@ -0,0 +1,48 @@
+import itertools
+
+import numpy as np
+import pytest
+
+from BNInter.Utils import BitmapIndex
+from BNInter.Utils.BitmapIndex import pack_rows, unpack_rows, popcount
+from BNInter.Utils.Counts import compute_counts_numpy
+
+
+@pytest.fixture
+def random_data():
+    rng = np.random.default_rng(1)
+    domainsizes = [2, 3, 2, 4]
+    X = np.column_stack([rng.integers(0, d, 1000) for d in domainsizes])
+    X[rng.random(X.shape) < 0.05] = -1
+    return X, domainsizes
+
+def test_pack_rows():
+    mask = np.zeros(130, dtype = bool)
+    mask[[0, 63, 64, 129]] = True
+    bits = pack_rows(mask)
+    assert bits.dtype == np.uint64
+    assert len(bits) == 3
+    assert popcount(bits) == 4
+    assert unpack_rows(bits, 130).tolist() == [0, 63, 64, 129]
+
+def test_bitmap_index_counts(random_data):
+    X, domainsizes = random_data
+    bi = BitmapIndex(X, domainsizes)
+    asets = [()]
+    for k in range(1, 4):
+        asets.extend(itertools.combinations(range(len(domainsizes)), k))
+    asets.append((3, 0))
+    counts, N, missing = compute_counts_numpy(asets, X, domainsizes, use_cover = False)
+    bcounts, bN, bmissing = bi.compute_counts(asets)
+    assert bN == N
+    assert bmissing == missing
+    for aset in asets:
+        assert np.array_equal(counts[aset], bcounts[aset])
+
+def test_bitmap_index_support(random_data):
+    X, domainsizes = random_data
+    bi = BitmapIndex(X, domainsizes)
+    assert bi.support((), ()) == 1000
+    assert bi.support((1, 3), (2, 0)) == int(((X[:, 1] == 2) & (X[:, 3] == 0)).sum())
+    rows = unpack_rows(bi.rows((0,), (1,)), bi.N)
+    assert np.array_equal(rows, np.flatnonzero(X[:, 0] == 1))
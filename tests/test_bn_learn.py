@@ -5,6 +5,7 @@ from BNInter.BayesNet import BayesNet
 from BNInter.BayesNet.BayesNetLearn import learnProbabilitiesFromData
 from BNInter.BayesNet.BayesNetLearn import lnP_dataset_cond_network_structure
 from BNInter.BayesNet.BayesNetLearn import makeIndependentStructure
+from BNInter.BayesNet.BayesNetLearn import FamilyCounts, normalize_counts
 from BNInter.DataAccess import Attr
 
 @pytest.fixture
@@ -68,3 +69,30 @@ def test_bn_w_joint_learn(basic_bayes_net):
     learnProbabilitiesFromData(bn, [[0,0,1],[0,1,0],[1,1,2]], priorN=1)
     lnP2 = lnP_dataset_cond_network_structure(bn, [[0,0,0],[0,0,1],[1,1,1]], priorN=1)
     assert lnP2 <= 0
+
+def test_learn_changed_with_stats_cache(basic_bayes_net):
+    bn = basic_bayes_net
+    X = [(0,0,1),(0,1,0),(1,1,2),(1,0,2),(0,1,1)]
+    stats = FamilyCounts()
+    learnProbabilitiesFromData(bn, X, priorN = 1, stats_cache = stats)
+    assert len(stats.tables) == 3
+    py = bn['Y'].distr.copy()
+    # one new family table after adding an edge
+    bn.addEdge('A', 'Y')
+    learnProbabilitiesFromData(bn, X, priorN = 1, changed = [2], stats_cache = stats)
+    assert len(stats.tables) == 4
+    expected = np.ones((2, 2, 3)) / 3
+    for a, b, y in X:
+        expected[a, b, y] += 1
+    expected /= expected.sum(axis = -1, keepdims = True)
+    assert np.allclose(bn['Y'].distr, expected)
+    # the old family table is reused after removing the edge
+    bn.delEdge('A', 'Y')
+    learnProbabilitiesFromData(bn, X, priorN = 1, changed = [2], stats_cache = stats)
+    assert len(stats.tables) == 4
+    assert np.allclose(bn['Y'].distr, py)
+
+def test_normalize_counts():
+    counts = np.array([[2, 0, 2], [0, 0, 0]])
+    assert np.allclose(normalize_counts(counts, 0), [[0.5, 0, 0.5], [1/3, 1/3, 1/3]])
+    assert np.allclose(normalize_counts(counts, 3), [[3/7, 1/7, 3/7], [1/3, 1/3, 1/3]])
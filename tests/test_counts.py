@@ -0,0 +1,177 @@
+import itertools
+import os
+
+import numpy as np
+import pytest
+
+from BNInter.Utils.Counts import compute_counts_dict, compute_counts_array
+from BNInter.Utils.Counts import compute_counts_array_cover, compute_counts_dict_cover
+from BNInter.Utils.Counts import compute_counts_numpy, count_dtype, add_counts
+from BNInter.Utils import ParallelCounts
+
+
+@pytest.fixture
+def random_data():
+    """Random data with missing values as list of lists and as an
+    integer coded array."""
+    rng = np.random.default_rng(0)
+    domainsizes = [2, 3, 2, 4, 3]
+    X = np.column_stack([rng.integers(0, d, 500) for d in domainsizes])
+    X[rng.random(X.shape) < 0.05] = -1
+    rows = [[None if v < 0 else v for v in row] for row in X.tolist()]
+    return X, rows, domainsizes
+
+def all_asets(n, k):
+    asets = []
+    for i in range(1, k + 1):
+        asets.extend(itertools.combinations(range(n), i))
+    return asets
+
+def test_counts_array_cover_numpy(random_data):
+    X, rows, domainsizes = random_data
+    asets = all_asets(len(domainsizes), 3)
+    counts, N, missing = compute_counts_array_cover(asets, rows, len(domainsizes), domainsizes)
+    ncounts, nN, nmissing = compute_counts_array_cover(asets, X, len(domainsizes), domainsizes)
+    assert N == nN == 500
+    assert missing == nmissing
+    for aset in asets:
+        assert ncounts[aset].shape == tuple(domainsizes[a] for a in aset)
+        assert np.array_equal(counts[aset], ncounts[aset])
+        assert ncounts[aset].sum() + nmissing[aset] == N
+        assert ncounts[aset].dtype == counts[aset].dtype == np.uint32
+
+def test_count_dtype():
+    assert count_dtype(2**32 - 1) == np.uint32
+    assert count_dtype(2**32) == np.uint64
+    counts = np.array([2**32 - 10, 5], dtype = np.uint32)
+    assert add_counts(counts, [5, 5], 2**32 - 1) is counts
+    counts = add_counts(counts, [20, 0], 2**32 + 19)
+    assert counts.dtype == np.uint64 and counts[0] == 2**32 + 15
+
+def test_counts_dict_cover_numpy(random_data):
+    X, rows, domainsizes = random_data
+    asets = all_asets(len(domainsizes), 2)
+    counts, N, missing = compute_counts_dict(asets, rows)
+    ncounts, nN, nmissing = compute_counts_dict_cover(asets, X, len(domainsizes), domainsizes)
+    assert N == nN
+    assert counts == ncounts
+    assert missing == nmissing
+
+def test_counts_dict_numpy(random_data):
+    X, rows, domainsizes = random_data
+    asets = [(0, 1), (4,), (3, 1, 2), ()]
+    assert compute_counts_dict(asets, rows, maxN = 100) == compute_counts_dict(asets, X, maxN = 100)
+
+def test_counts_missing_sentinel(random_data):
+    X, rows, domainsizes = random_data
+    # the largest value of an unsigned type codes missing values
+    U = np.where(X < 0, 255, X).astype(np.uint8)
+    asets = [(0, 1), (4,), (3, 1, 2)]
+    counts, N, missing = compute_counts_dict(asets, U)
+    acounts, aN, amissing = compute_counts_array(asets, domainsizes, U)
+    assert (counts, N, missing) == compute_counts_dict(asets, rows)
+    assert missing == amissing
+
+def test_counts_array_numpy_unsorted(random_data):
+    X, rows, domainsizes = random_data
+    # family attribute sets (parents + node) are not sorted
+    asets = [(2, 0), (3, 1, 4), (1,)]
+    counts, N, missing = compute_counts_array(asets, domainsizes, rows)
+    ncounts, nN, nmissing = compute_counts_array(asets, domainsizes, X)
+    assert missing == nmissing
+    for aset in asets:
+        assert np.array_equal(counts[aset], ncounts[aset])
+
+def test_counts_numpy_no_cover(random_data):
+    X, rows, domainsizes = random_data
+    asets = all_asets(len(domainsizes), 2)
+    c1, N1, m1 = compute_counts_numpy(asets, X, domainsizes)
+    c2, N2, m2 = compute_counts_numpy(asets, X, domainsizes, use_cover = False)
+    assert m1 == m2
+    for aset in asets:
+        assert np.array_equal(c1[aset], c2[aset])
+
+@pytest.mark.parametrize("block_size", [1, 64, 10000])
+def test_counts_streaming(random_data, block_size):
+    X, rows, domainsizes = random_data
+    asets = all_asets(len(domainsizes), 3) + [()]
+    counts, N, missing = compute_counts_array_cover(asets, rows, len(domainsizes), domainsizes)
+    for db in (iter(rows), X):
+        scounts, sN, smissing = compute_counts_array_cover(asets, db, len(domainsizes),
+                                                           domainsizes, block_size = block_size)
+        assert sN == N
+        assert smissing == missing
+        for aset in asets:
+            assert np.array_equal(counts[aset], scounts[aset])
+    dcounts = compute_counts_dict_cover(asets, X, len(domainsizes), domainsizes, maxN = 100)
+    sdcounts = compute_counts_dict_cover(asets, iter(rows), len(domainsizes), domainsizes,
+                                         maxN = 100, block_size = block_size)
+    assert dcounts == sdcounts
+
+@pytest.mark.parametrize("n_jobs", [1, 2, 3])
+def test_counts_parallel(random_data, monkeypatch, n_jobs):
+    monkeypatch.setattr(ParallelCounts, "min_rows_per_job", 10)
+    X, rows, domainsizes = random_data
+    asets = all_asets(len(domainsizes), 3) + [()]
+    counts, N, missing = compute_counts_array_cover(asets, rows, len(domainsizes), domainsizes)
+    for db in (iter(rows), X):
+        pcounts, pN, pmissing = compute_counts_array_cover(asets, db, len(domainsizes),
+                                                           domainsizes, maxN = 400, n_jobs = n_jobs)
+        assert pN == 400
+        for aset in asets:
+            assert pcounts[aset].sum() + pmissing[aset] == 400
+    pcounts, pN, pmissing = compute_counts_array_cover(asets, X, len(domainsizes),
+                                                       domainsizes, n_jobs = n_jobs)
+    assert pN == N
+    assert pmissing == missing
+    for aset in asets:
+        assert np.array_equal(counts[aset], pcounts[aset])
+
+def test_counts_parallel_memmap(random_data, monkeypatch, tmp_path):
+    monkeypatch.setattr(ParallelCounts, "min_rows_per_job", 10)
+    X, rows, domainsizes = random_data
+    M = np.memmap(tmp_path / "codes", dtype = np.int8, mode = "w+", shape = X.shape, order = "F")
+    M[...] = X
+    M.flush()
+    assert str(ParallelCounts.share_array(M)[0]) == str(tmp_path / "codes")
+    asets = all_asets(len(domainsizes), 2)
+    assert compute_counts_dict_cover(asets, M, len(domainsizes), domainsizes, n_jobs = 2) == \
+           compute_counts_dict(asets, rows)
+
+def test_share_array_readonly(random_data):
+    X, rows, domainsizes = random_data
+    X = X.copy()
+    spec = ParallelCounts.share_array(X)
+    assert not X.flags.writeable
+    assert ParallelCounts.share_array(X) == spec
+    assert np.array_equal(ParallelCounts.open_shared_array(spec), X)
+    with pytest.raises(ValueError):
+        X[0, 0] = 1
+    # a modified array is copied again
+    ParallelCounts.unshare_array(X)
+    assert X.flags.writeable and not os.path.exists(spec[0])
+    X[0, 0] = 1
+    spec = ParallelCounts.share_array(X)
+    assert ParallelCounts.open_shared_array(spec)[0, 0] == 1
+    fname = spec[0]
+    del X
+    assert not os.path.exists(fname)
+
+@pytest.mark.parametrize("n_jobs", [1, 2, 3])
+def test_counts_parallel_covers(random_data, n_jobs):
+    X, rows, domainsizes = random_data
+    asets = all_asets(len(domainsizes), 3) + [()]
+    counts, N, missing = compute_counts_array_cover(asets, X, len(domainsizes), domainsizes)
+    pcounts, pN, pmissing = compute_counts_array_cover(asets, X, len(domainsizes), domainsizes,
+                                                       n_jobs = n_jobs, parallel = "covers")
+    assert pN == N
+    assert pmissing == missing
+    assert set(pcounts) == set(counts)
+    for aset in asets:
+        assert np.array_equal(counts[aset], pcounts[aset])
+
+def test_schedule_covers():
+    groups = ParallelCounts.schedule_covers(list("abcdef"), [7, 5, 4, 3, 3, 2], 2)
+    assert len(groups) == 2
+    assert sorted(sum(groups, [])) == list("abcdef")
+    assert groups[0] == ["a", "d", "f"] or groups[0] == ["b", "c", "e"]
@@ -0,0 +1,136 @@
+import os
+import numpy as np
+import pytest
+
+from BNInter.DataAccess import create_arff_reader, load_arff_columnar
+from BNInter.DataAccess import read_arff_attrset, read_delimited_columnar
+from BNInter.DataAccess import ColumnarReader, create_columnar_reader
+from BNInter.DataAccess import write_binary_cache, open_binary_cache, load_arff_cached
+from BNInter.Utils.Counts import compute_counts_array_cover, compute_counts_dict
+
+
+ARFF_WITH_MISSING = """@relation test
+@attribute a {x,y}
+@attribute b {0,1,2}
+@attribute c {'p','q'}
+@data
+x,0,'p'
+y,?,'q'
+% a comment
+?,2,'p'
+y,1,?
+x,1,'q'
+"""
+
+@pytest.fixture
+def arff_file(tmp_path):
+    p = tmp_path / "test.arff"
+    p.write_text(ARFF_WITH_MISSING)
+    return str(p)
+
+def test_columnar_reader_rows(arff_file):
+    ds = create_arff_reader(arff_file)
+    rows = list(ds)
+    cr = create_columnar_reader(ds)
+    assert isinstance(cr, ColumnarReader)
+    assert len(cr) == 5
+    assert cr.filename == arff_file
+    assert list(cr) == rows
+    cr.rewind()
+    assert next(cr) == [0, 0, 0]
+    assert next(cr) == [1, None, 1]
+
+def test_columnar_reader_storage(arff_file):
+    cr = create_columnar_reader(create_arff_reader(arff_file))
+    X = cr.as_array()
+    assert X.dtype == np.uint8
+    assert X.flags.f_contiguous
+    assert X is cr.as_array()
+    assert np.shares_memory(cr.column(1), X)
+    assert X[1, 1] == cr.missing_code == 255
+
+def test_columnar_reader_next_block(arff_file):
+    cr = create_columnar_reader(create_arff_reader(arff_file))
+    assert next(cr) == [0, 0, 0]
+    block = cr.next_block(2)
+    assert block.tolist() == [[1, 255, 1], [255, 2, 0]]
+    assert next(cr) == [1, 1, None]
+
+def test_columnar_reader_counts(arff_file):
+    ds = create_arff_reader(arff_file)
+    rows = list(ds)
+    cr = create_columnar_reader(ds)
+    asets = [(0,), (1,), (2,), (0, 1), (0, 2), (1, 2)]
+    counts, N, missing = compute_counts_array_cover(asets, rows, 3, [2, 3, 2])
+    ccounts, cN, cmissing = compute_counts_array_cover(asets, cr, 3, [2, 3, 2])
+    assert N == cN
+    assert missing == cmissing
+    for aset in asets:
+        assert np.array_equal(counts[aset], ccounts[aset])
+    assert compute_counts_dict(asets, rows) == compute_counts_dict(asets, cr)
+
+def test_load_arff_columnar(arff_file):
+    rows = list(create_arff_reader(arff_file))
+    cr = load_arff_columnar(arff_file)
+    assert cr.filename == arff_file
+    assert cr.relname == "test"
+    assert list(cr) == rows
+
+@pytest.mark.parametrize("chunk_size", [1, 7, 1 << 20])
+def test_load_arff_columnar_chunks(chunk_size):
+    fname = "data/ksl_discr.arff"
+    rows = list(create_arff_reader(fname))
+    cr = load_arff_columnar(fname, chunk_size = chunk_size)
+    assert len(cr) == len(rows)
+    assert list(cr) == rows
+
+def test_read_delimited_columnar(tmp_path):
+    aset, offset = read_arff_attrset("data/ksl_discr.arff")
+    p = tmp_path / "test.tsv"
+    p.write_text("Male\t1967\n Female \t?\n\nFemale\n")
+    aset.attrs = aset.attrs[-2:]
+    cr = read_delimited_columnar(aset, str(p), sep = "\t")
+    assert list(cr) == [[0, 0], [1, None], [1, None]]
+    p.write_text("Male\tmale\n")
+    with pytest.raises(RuntimeError):
+        read_delimited_columnar(aset, str(p), sep = "\t")
+
+def test_binary_cache(arff_file):
+    rows = list(create_arff_reader(arff_file))
+    cr = load_arff_cached(arff_file)
+    assert not isinstance(cr.as_array(), np.memmap)
+    assert os.path.exists(arff_file + ".bncache")
+    cr = load_arff_cached(arff_file)
+    assert isinstance(cr.as_array(), np.memmap)
+    assert cr.filename == arff_file
+    assert cr.relname == "test"
+    assert [a.domain for a in cr.attrset] == [["x", "y"], ["0", "1", "2"], ["p", "q"]]
+    assert list(cr) == rows
+
+def test_binary_cache_invalidation(arff_file):
+    cachefile = arff_file + ".bncache"
+    write_binary_cache(load_arff_columnar(arff_file), cachefile, arff_file)
+    # new mtime, same contents
+    st = os.stat(arff_file)
+    os.utime(arff_file, ns = (st.st_atime_ns, st.st_mtime_ns + 10**9))
+    assert open_binary_cache(cachefile, arff_file) is not None
+    with open(arff_file, "a") as f:
+        f.write("y,2,'p'\n")
+    assert open_binary_cache(cachefile, arff_file) is None
+    cr = load_arff_cached(arff_file)
+    assert len(cr) == 6
+    assert len(open_binary_cache(cachefile, arff_file)) == 6
+
+def test_binary_cache_mtime_refreshed(arff_file, monkeypatch):
+    from BNInter.DataAccess import BinaryCache
+    cachefile = arff_file + ".bncache"
+    write_binary_cache(load_arff_columnar(arff_file), cachefile, arff_file)
+    st = os.stat(arff_file)
+    os.utime(arff_file, ns = (st.st_atime_ns, st.st_mtime_ns + 10**9))
+    rows = list(open_binary_cache(cachefile, arff_file))
+    header, offset = BinaryCache.read_cache_header(cachefile)
+    assert header["source"]["mtime"] == st.st_mtime_ns + 10**9
+    def no_hash(fname):
+        raise AssertionError("source file hashed")
+    monkeypatch.setattr(BinaryCache, "file_hash", no_hash)
+    assert list(open_binary_cache(cachefile, arff_file)) == rows
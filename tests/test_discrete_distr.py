@@ -0,0 +1,21 @@
+import itertools
+
+import numpy as np
+
+from BNInter.BayesNet import read_Hugin_file
+from BNInter.BayesPrune.ExactInterestingness import create_joint
+
+
+def test_get_marginals_batch(capsys):
+    bn = read_Hugin_file("data/sachs.net")
+    n = len(bn)
+    queries = list(itertools.combinations(range(n), 3)) + [(4, 1), (2,)]
+    single = create_joint(bn)
+    for seed in [None, 1]:
+        joint = create_joint(bn)
+        marginals = joint.get_marginals(queries, seed = seed)
+        assert set(marginals) == set(queries)
+        for q in queries:
+            assert np.allclose(marginals[q], single.get_marginal(q))
+    # batch is planned in a single pass and quiet
+    assert capsys.readouterr().out == ""
@@ -0,0 +1,64 @@
+import itertools
+import os
+
+import numpy as np
+
+from BNInter.BayesPrune.HypothesisStore import HypothesisStore
+from BNInter.BayesPrune.SamplingInterestingness import attr_set
+
+
+def test_hypothesis_store(tmp_path, monkeypatch):
+    domainsizes = [2, 3, 4, 2]
+    monkeypatch.setattr(attr_set, "domainsizes", domainsizes)
+    store = HypothesisStore(domainsizes, str(tmp_path), capacity = 16)
+    keys = [k for r in (1, 2, 3) for k in itertools.combinations(range(4), r)]
+    rng = np.random.default_rng(0)
+    expected = {}
+    for key in keys:
+        h = attr_set(key)
+        h.update_model_counts(rng.integers(0, 10, h.shape), 100)
+        h.update_data_counts(rng.integers(0, 10, h.shape), 50)
+        store.add(h)
+        expected[key] = (h.counts_model.astype(np.int64), h.counts_data.astype(np.int64))
+    assert store.capacity > 16 and len(store) == len(keys)
+
+    # counts are updated in place
+    h = attr_set.from_store(store, (0, 2))
+    h.update_model_counts(np.ones(h.shape), 10)
+    store.update(h)
+    expected[(0, 2)][0][...] += 1
+    N_model, N_data, counts_model, counts_data = store.get((0, 2))
+    assert (N_model, N_data) == (110, 50)
+    assert counts_model.dtype == np.uint32
+
+    # removed slots are tombstones until the file is compacted
+    kept = [key for key in keys if len(key) == 3]
+    store.retain(kept + [(0, 2)])
+    assert len(store) == len(kept) + 1
+    store.compact()
+    assert store.end == sum(2 * store.domsize(key) for key in kept + [(0, 2)])
+    for key in kept + [(0, 2)]:
+        N_model, N_data, counts_model, counts_data = store.get(key)
+        assert np.array_equal(counts_model, expected[key][0])
+        assert np.array_equal(counts_data, expected[key][1])
+
+    # counts are widened when they could overflow, into a new file
+    old_filename = store.filename
+    h = attr_set.from_store(store, (0, 1, 2))
+    h.update_model_counts(np.full(h.shape, 2**32), 2**32)
+    store.update(h)
+    expected[(0, 1, 2)][0][...] += 2**32
+    N_model, N_data, counts_model, counts_data = store.get((0, 1, 2))
+    assert counts_model.dtype == np.uint64 and N_model == 100 + 2**32
+    for key in kept + [(0, 2)]:
+        N_model, N_data, counts_model, counts_data = store.get(key)
+        assert np.array_equal(counts_model, expected[key][0])
+        assert np.array_equal(counts_data, expected[key][1])
+
+    # the old file is removed once nothing maps it, the new one with
+    # the store
+    assert store.filename != old_filename
+    del h, counts_model, counts_data
+    assert sorted(os.listdir(tmp_path)) == [os.path.basename(store.filename)]
+    del store
+    assert os.listdir(tmp_path) == []
@@ -0,0 +1,33 @@
+import pytest
+
+from BNInter.BayesNet import read_Hugin_file
+from BNInter.BayesNet.BayesNetLearn import learnProbabilitiesFromData
+from BNInter.BayesPrune.ExactInterestingness import BN_interestingness_exact
+from BNInter.BayesPrune.ExactInterestingness import BN_interestingness_incremental
+from BNInter.DataAccess import create_arff_reader
+
+
+def fresh_run(edges):
+    ds = create_arff_reader("data/ksl_discr.arff")
+    bn = read_Hugin_file("data/ksl_discr.net")
+    for src, dst in edges:
+        bn.addEdge(src, dst)
+    learnProbabilitiesFromData(bn, ds, priorN = 0)
+    ds.rewind()
+    return dict(BN_interestingness_exact(bn, ds).run(minsup = 10, maxK = 3, apriori_debug = 0))
+
+def test_incremental_matches_exact():
+    ds = create_arff_reader("data/ksl_discr.arff")
+    bn = read_Hugin_file("data/ksl_discr.net")
+    session = BN_interestingness_incremental(bn, ds)
+    edges = []
+    for edge in [None, ("Kol", "FEV"), ("Sex", "Kol")]:
+        if edge is not None:
+            bn.addEdge(*edge)
+            edges.append(edge)
+            assert session.changed_nodes() == set(bn.names_to_numbers([edge[1]]))
+        result = dict(session.run(minsup = 10, maxK = 3, apriori_debug = 0))
+        expected = fresh_run(edges)
+        for aset in set(result) | set(expected):
+            assert result.get(aset, 0) == pytest.approx(expected.get(aset, 0), abs = 1e-12)
+    assert session.changed_nodes() == set()
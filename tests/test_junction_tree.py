@@ -0,0 +1,52 @@
+import itertools
+
+import numpy as np
+import pytest
+
+from BNInter.BayesNet import BayesNet, read_Hugin_file
+from BNInter.BayesPrune.DiscreteDistr import DiscreteDistrJT
+from BNInter.BayesPrune.ExactInterestingness import bn_factors, create_joint
+from BNInter.DataAccess import Attr
+from BNInter.Utils import SparseDistr
+
+
+def check_marginals(bn, asets):
+    sop_joint = create_joint(bn, "sop")
+    jt_joint = create_joint(bn, "jt")
+    for aset in asets:
+        assert np.allclose(jt_joint.get_marginal(aset), sop_joint.get_marginal(aset))
+
+@pytest.mark.parametrize("name", ["ksl_discr", "sachs"])
+def test_jt_matches_sop(name):
+    bn = read_Hugin_file("data/" + name + ".net")
+    n = len(bn)
+    asets = [()] + list(itertools.combinations(range(n), 1)) \
+            + list(itertools.combinations(range(n), 2)) \
+            + list(itertools.combinations(range(n), 3))[::7]
+    # unordered variables
+    asets += [(3, 0), (n - 1, 1, 0)]
+    check_marginals(bn, asets)
+
+def test_jt_joint_nodes():
+    bn = BayesNet("testNet", [Attr('A', "CATEG", [0,1,2]),
+                              Attr('B', "CATEG", [0,1]),
+                              Attr('Y', "CATEG", [0,1]),
+                              Attr('Z', "CATEG", [0,1])])
+    bn.addEdge('A', 'Y')
+    bn.addEdge('B', 'Y')
+    bn.addEdge('Y', 'Z')
+    bn.addJointDistr(["A", "B"], SparseDistr((3,2), {(2,0):0.4, (1,1):0.6}, prior_factor=0.1))
+    joint = DiscreteDistrJT(bn_factors(bn), len(bn))
+    P = bn.jointP()
+    assert joint.get_marginal((0, 1, 2, 3)) == pytest.approx(P)
+    assert joint.get_marginal((3, 0)) == pytest.approx(P.sum(axis = (1, 2)).T)
+    assert float(joint.get_marginal(())) == pytest.approx(1.0)
+
+def test_jt_disconnected():
+    factors = [([0], np.array([0.3, 0.7])),
+               ([1], np.array([0.5, 0.25, 0.25])),
+               ([1, 2], np.array([[0.0, 1.0], [0.5, 0.5], [1.0, 0.0]]))]
+    joint = DiscreteDistrJT(factors, 3)
+    expected = np.einsum("a,b,bc->abc", factors[0][1], factors[1][1], factors[2][1])
+    assert joint.get_marginal((0, 1, 2)) == pytest.approx(expected)
+    assert joint.get_marginal((2, 0)) == pytest.approx(expected.sum(axis = 1).T)
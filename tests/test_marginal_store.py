@@ -0,0 +1,57 @@
+import numpy as np
+
+from BNInter.BayesNet import read_Hugin_file
+from BNInter.BayesPrune.ExactInterestingness import create_joint
+from BNInter.BayesPrune.MarginalStore import MarginalStore
+
+
+def test_marginals_reused_after_edit(tmp_path):
+    bn = read_Hugin_file("data/ksl_discr.net")
+    n = len(bn)
+    queries = [(i, j) for i in range(n) for j in range(i + 1, n)]
+    store = MarginalStore(str(tmp_path))
+    store.attach(bn)
+    joint = create_joint(bn)
+    joint.store = store
+    joint.get_marginals(queries)
+    assert store.saved == len(queries)
+
+    # add an edge into the last node, only sets containing its
+    # descendants have changed marginals
+    names = bn.get_attr_names()
+    bn.addEdge(names[0], names[-1])
+    store = MarginalStore(str(tmp_path))
+    store.attach(bn)
+    joint = create_joint(bn)
+    joint.store = store
+    marginals = joint.get_marginals(queries)
+    assert 0 < store.hits < len(queries)
+    fresh = create_joint(bn)
+    for q in queries:
+        assert np.allclose(marginals[q], fresh.get_marginal(q))
+
+def test_store_directory_and_limit(tmp_path, monkeypatch):
+    bn = read_Hugin_file("data/ksl_discr.net")
+    queries = [(0, i) for i in range(1, len(bn))]
+    directory = tmp_path / "data.arff.bnmarginals"
+    store = MarginalStore(str(directory), max_bytes = 1000)
+    store.attach(bn)
+    assert not directory.exists()
+    joint = create_joint(bn)
+    joint.store = store
+    joint.get_marginals(queries)
+    # least recently used marginals are removed beyond the limit
+    sizes = [f.stat().st_size for f in directory.iterdir()]
+    assert store.saved >= len(queries) and 0 < sum(sizes) <= 1000
+    assert store.nbytes == sum(sizes)
+
+    # unwritable directories fall back to the user cache
+    monkeypatch.setenv("XDG_CACHE_HOME", str(tmp_path / "cache"))
+    (tmp_path / "file").write_text("")
+    store = MarginalStore(str(tmp_path / "file" / "store"))
+    store.attach(bn)
+    store.save((0, 1), np.ones((2, 2)))
+    assert store.directory.startswith(str(tmp_path / "cache"))
+    store = MarginalStore(str(tmp_path / "file" / "store"))
+    store.attach(bn)
+    assert np.array_equal(store.load((0, 1)), np.ones((2, 2)))
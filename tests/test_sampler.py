@@ -0,0 +1,71 @@
+import numpy as np
+import pytest
+
+from BNInter.BayesNet import BayesNet, BayesSampler, ParallelSampler
+from BNInter.DataAccess import Attr
+from BNInter.Utils import SparseDistr
+
+
+@pytest.fixture
+def sampler_bayes_net():
+    """Network with two joint distributions and a node with a large
+    domain."""
+    bn = BayesNet("testNet", [Attr('A', "CATEG", [0,1]),
+                              Attr('B', "CATEG", [0,1,2]),
+                              Attr('C', "CATEG", [0,1]),
+                              Attr('D', "CATEG", [0,1]),
+                              Attr('Y', "CATEG", list(range(40)))])
+    bn.addEdge('B', 'Y')
+    bn.addEdge('D', 'Y')
+    rng = np.random.default_rng(0)
+    bn['Y'].distr = rng.dirichlet(np.ones(40), (2, 3)) # parents D, B
+    bn.addJointDistr(["A", "B"], SparseDistr((2,3), {(0,2):0.7, (1,0):0.3}))
+    bn.addJointDistr(["C", "D"], SparseDistr((2,2), {(1,0):0.6, (0,1):0.4}))
+    return bn
+
+def test_draw_n_samples(sampler_bayes_net):
+    bn = sampler_bayes_net
+    X = BayesSampler(bn, seed = 3).draw_n_samples(200000)
+    assert X.dtype == np.uint8 and X.shape == (200000, 5)
+    assert np.array_equal(X, BayesSampler(bn, seed = 3).draw_n_samples(200000))
+    freq = np.zeros((2, 3, 2, 2, 40))
+    np.add.at(freq, tuple(X.T), 1)
+    assert np.abs(freq / len(X) - bn.jointP()).max() < 0.005
+    s1, s2 = BayesSampler(bn, seed = 2), BayesSampler(bn, seed = 2)
+    assert [s1.next() for i in range(20)] == [s2.next() for i in range(20)]
+    # the plan follows relearned distributions
+    sampler = BayesSampler(bn, seed = 1)
+    sampler.draw_n_samples(10)
+    bn['Y'].distr = np.zeros((2, 3, 40))
+    bn['Y'].distr[..., 7] = 1
+    assert (sampler.draw_n_samples(1000)[:, 4] == 7).all()
+
+def test_sampler_follows_structure():
+    bn = BayesNet("testNet", [Attr('A', "CATEG", [0,1]), Attr('B', "CATEG", [0,1])])
+    bn['A'].distr = np.array([0.5, 0.5])
+    bn['B'].distr = np.array([0.5, 0.5])
+    sampler = BayesSampler(bn, seed = 1)
+    sampler.draw_n_samples(10)
+    sampler.next()
+    # B becomes a parent of A against the previous topological order
+    bn.addEdge('B', 'A')
+    bn['A'].distr = np.eye(2)
+    X = sampler.draw_n_samples(1000)
+    assert np.array_equal(X[:, 0], X[:, 1]) and 0 < X[:, 1].sum() < 1000
+    for i in range(20):
+        a, b = sampler.next()
+        assert a == b
+
+def test_parallel_sampler(sampler_bayes_net):
+    bn = sampler_bayes_net
+    X = ParallelSampler(bn, seed = 3, block_size = 50000).draw_n_samples(300000)
+    # samples don't depend on the number of workers or on chunking
+    Xp = ParallelSampler(bn, seed = 3, n_jobs = 2, block_size = 50000).draw_n_samples(300000)
+    assert isinstance(Xp, np.memmap)
+    assert np.array_equal(X, Xp)
+    chunks = list(ParallelSampler(bn, seed = 3, block_size = 50000).iter_samples(300000, 120000))
+    assert [len(c) for c in chunks] == [100000, 100000, 100000]
+    assert np.array_equal(X, np.concatenate(chunks))
+    freq = np.zeros((2, 3, 2, 2, 40))
+    np.add.at(freq, tuple(Xp.T), 1)
+    assert np.abs(freq / len(Xp) - bn.jointP()).max() < 0.005
@@ -0,0 +1,54 @@
+import math
+
+import numpy as np
+
+from BNInter.BayesNet import read_Hugin_file
+from BNInter.BayesNet.BayesNetLearn import learnProbabilitiesFromData
+from BNInter.BayesPrune.SamplingInterestingness import BN_interestingness_sample
+from BNInter.BayesPrune.SamplingInterestingness import attr_set, attr_set_batch
+from BNInter.DataAccess import create_arff_reader
+from BNInter.Utils import ParallelCounts
+from BNInter.Utils.gaussinv import cdf_ugaussian_Pinv
+
+
+def sample_run(seed, n_jobs = 1, disk_storage = True):
+    ds = create_arff_reader("data/ksl_discr.arff")
+    bn = read_Hugin_file("data/ksl_discr.net")
+    learnProbabilitiesFromData(bn, ds, priorN = 0)
+    ds.rewind()
+    return BN_interestingness_sample(bn, ds).run(n = 5, maxK = 3, n_jobs = n_jobs, seed = seed,
+                                                 disk_storage = disk_storage)
+
+def test_sampling_reproducible(monkeypatch):
+    # small blocks and shards, so that workers sample and count the
+    # first batches
+    monkeypatch.setattr(ParallelCounts, "min_rows_per_job", 100)
+    monkeypatch.setattr(BN_interestingness_sample, "sample_block_size", 250)
+    result = sample_run(7)
+    assert len(result) > 0
+    assert sample_run(7) == result
+    assert sample_run(7, n_jobs = 2) == result
+    assert sample_run(7, disk_storage = False) == result
+
+def test_attr_set_batch(monkeypatch):
+    monkeypatch.setattr(attr_set, "domainsizes", [2, 3, 4])
+    monkeypatch.setattr(attr_set, "sample_from_data", False)
+    rng = np.random.default_rng(0)
+    hyp = []
+    for key in [(0,), (1, 2), (0, 1, 2), (2,)]:
+        h = attr_set(key)
+        h.update_model_counts(rng.integers(0, 50, h.shape), 1000)
+        h.update_data_counts(rng.integers(0, 50, h.shape), 800)
+        hyp.append(h)
+    batch = attr_set_batch(hyp)
+    inter, inter_ci = batch.interestingness(0.01)
+    supp, supp_ci = batch.support(0.01)
+    for i, h in enumerate(hyp):
+        pM = h.counts_model / h.N_model
+        pD = h.counts_data / h.N_data
+        assert inter[i] == np.abs(pM - pD).max()
+        assert supp[i] == max(pM.max(), pD.max())
+        z = cdf_ugaussian_Pinv(1.0 - 0.5 * 0.01 / h.domsize)
+        assert math.isclose(inter_ci[i], z * math.sqrt((pM * (1 - pM)).max() / h.N_model))
+    # the current intervals need the current number of samples
+    assert np.allclose(batch.n_samples_required_inter(inter_ci, 0.01), 1000)
@@ -0,0 +1,49 @@
+import random
+
+import pytest
+
+from BNInter.Utils.SEtree import SEtree, FlatSEtree
+
+
+def random_set(rng, n):
+    return tuple(sorted(rng.sample(range(n), rng.randint(0, n))))
+
+@pytest.mark.parametrize("seed", range(5))
+def test_flat_setree_same_as_setree(seed):
+    rng = random.Random(seed)
+    n = 8
+    keys = sorted(set(random_set(rng, n) for _ in range(150)))
+    tree = SEtree()
+    for k in keys:
+        tree[k] = k
+    flat = FlatSEtree(keys, keys)
+    for step in range(300):
+        assert len(flat) == len(tree)
+        assert list(flat.items()) == list(tree.items())
+        superset = random_set(rng, n)
+        assert sorted(flat.iter_included(superset)) == sorted(tree.iter_included(superset))
+        assert sorted(flat.iter_one_not_in(superset)) == sorted(tree.iter_one_not_in(superset))
+        k = random_set(rng, n)
+        op = rng.random()
+        if op < 0.5:
+            if k in tree:
+                del tree[k]
+                del flat[k]
+            else:
+                with pytest.raises(KeyError):
+                    del flat[k]
+        elif op < 0.7:
+            tree[k] = step
+            flat[k] = step
+        elif len(tree) > 0:
+            assert flat.popitem() == tree.popitem()
+        assert flat.get(k) == tree.get(k)
+
+def test_flat_setree_keys_sorted():
+    with pytest.raises(KeyError):
+        FlatSEtree([(0, 2), (0, 1)])
+    with pytest.raises(KeyError):
+        FlatSEtree([(1, 0)])
+    flat = FlatSEtree([(), (0,), (0, 1)])
+    assert flat.keys() == [(), (0,), (0, 1)]
+    assert sorted(flat.iter_one_not_in((1,))) == [((0,), 0), ((0, 1), 0)]
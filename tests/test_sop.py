@@ -106,3 +106,80 @@ def test_array_sop_computations(array_sop_instance):
     assert asop.complexity() == 2
     assert asop.cost() == (6, 27)
     assert asop.mem_cost() == 168
+
+@pytest.mark.parametrize("free_vars", [[1], [], [0, 1, 2], [2, 0], [0]])
+def test_array_sop_fused(array_sop_instance, free_vars):
+    """Fused einsum buckets give the same results as the unfused ones."""
+    asop = array_sop_instance
+    asop.prepare(free_vars)
+    expected = asop.compute()
+    mem_cost = asop.mem_cost()
+    asop.fused = True
+    asop.prepare(free_vars)
+    assert asop.compute() == pytest.approx(expected)
+    assert asop.mem_cost() <= mem_cost
+
+def test_array_sop_fused_chain():
+    """A chain of factors where the fused bucket avoids forming the
+    full product."""
+    rng = numpy.random.default_rng(0)
+    factors = [([i, i + 1], rng.random((4, 4))) for i in range(6)]
+    asop = sop.array_sop(7)
+    fsop = sop.cached_array_sop(7, fused = True)
+    for vars, array in factors:
+        asop.add_factor(vars, array)
+        fsop.add_factor(vars, array)
+    for free_vars in [[0, 6], [3], [5, 1, 2]]:
+        asop.prepare(free_vars)
+        fsop.prepare(free_vars)
+        assert fsop.compute() == pytest.approx(asop.compute())
+        assert fsop.mem_cost() <= asop.mem_cost()
+
+@pytest.fixture
+def grid_sop():
+    """Pairwise factors on a 3x4 grid of variables with domain
+    sizes 2 and 3."""
+    rng = numpy.random.default_rng(1)
+    dims = [2 + (v % 2) for v in range(12)]
+    asop = sop.cached_array_sop(12)
+    for r in range(3):
+        for c in range(4):
+            v = 4 * r + c
+            if c < 3:
+                asop.add_factor([v, v + 1], rng.random((dims[v], dims[v + 1])))
+            if r < 2:
+                asop.add_factor([v, v + 4], rng.random((dims[v], dims[v + 4])))
+    return asop
+
+@pytest.mark.parametrize("ordering", ["factor_count", "min_degree", "min_fill",
+                                      "min_weight", "random_greedy"])
+def test_array_sop_orderings(grid_sop, ordering):
+    for free_vars in [[0], [5, 2], [11, 0, 6], []]:
+        grid_sop.prepare(free_vars)
+        grid_sop.clear_cache()
+        expected = grid_sop.compute()
+        grid_sop.prepare(free_vars, ordering)
+        grid_sop.clear_cache()
+        assert grid_sop.compute() == pytest.approx(expected)
+        assert len(grid_sop.permutation) == 12 - len(free_vars)
+    if ordering != "factor_count":
+        assert (ordering, frozenset([11, 0, 6])) in grid_sop.order_cache
+
+def test_array_sop_explicit_ordering(grid_sop):
+    grid_sop.prepare([3], "min_fill")
+    order = list(reversed(grid_sop.permutation))
+    grid_sop.prepare([3], order)
+    assert list(reversed(grid_sop.permutation)) == order
+    with pytest.raises(RuntimeError):
+        grid_sop.prepare([3], order[1:])
+    with pytest.raises(RuntimeError):
+        grid_sop.prepare([3], "no_such_heuristic")
+
+def test_random_greedy_not_worse(grid_sop):
+    for free_vars in [[0], [5, 2]]:
+        costs = {}
+        for ordering in ["factor_count", "min_fill", "min_weight", "random_greedy"]:
+            grid_sop.clear_cache()
+            grid_sop.prepare(free_vars, ordering)
+            costs[ordering] = sum(grid_sop.cost())
+        assert costs["random_greedy"] <= min(costs["min_fill"], costs["min_weight"])